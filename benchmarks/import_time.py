@@ -0,0 +1,92 @@
+"""
+Cold import-time benchmark for the modules the Streamlit pages load.
+
+Each module is imported in a fresh interpreter with `-X importtime`, after streamlit itself,
+so the numbers are what a page adds to a container's cold start.
+
+Usage:
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --runs 5 --max-ms 300
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Optional, Tuple
+
+PAGE_MODULES = (
+    "services.evaluation_service",
+    "services.custom_checklist_service",
+    "services.prompt_service",
+)
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _parse_importtime(stderr: str) -> List[Tuple[str, int, int]]:
+    """Returns (module, self_us, cumulative_us) rows from -X importtime output."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        # Drop the separator space; the remaining indentation shows the nesting depth
+        rows.append((name[1:].rstrip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def measure_module(module: str) -> Tuple[float, List[Tuple[str, float]]]:
+    """
+    Imports module in a fresh interpreter, after streamlit.
+
+    Returns:
+        The module's cumulative import time in ms and its five heaviest nested imports.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import streamlit; import {module}"],
+        cwd=REPO_ROOT, capture_output=True, text=True, check=True,
+    )
+    rows = _parse_importtime(result.stderr)
+    start = max(i for i, (name, _, _) in enumerate(rows) if name == "streamlit") + 1
+    own_rows = rows[start:]
+    total_us = next(cumulative for name, _, cumulative in reversed(own_rows) if name == module)
+    # Direct children of the module are indented by exactly two spaces
+    nested = sorted(((name.strip(), cumulative / 1000) for name, _, cumulative in own_rows
+                     if name.startswith("  ") and not name.startswith("   ")), key=lambda row: -row[1])
+    return total_us / 1000, nested[:5]
+
+
+def run(modules=PAGE_MODULES, runs: int = 3) -> Dict[str, Dict[str, object]]:
+    """Measures each module `runs` times and returns the median and heaviest nested imports."""
+    results = {}
+    for module in modules:
+        samples, heaviest = [], []
+        for _ in range(runs):
+            total_ms, heaviest = measure_module(module)
+            samples.append(total_ms)
+        results[module] = {"median_ms": round(statistics.median(samples), 1), "heaviest": heaviest}
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.import_time", description="Measure cold import time of the page modules.")
+    parser.add_argument("modules", nargs="*", default=list(PAGE_MODULES), help="Modules to measure.")
+    parser.add_argument("--runs", type=int, default=3, help="Fresh interpreters per module; the median is reported.")
+    parser.add_argument("--max-ms", type=float, default=0.0, help="Exit with status 1 if any module's median exceeds this (0 = no budget).")
+    args = parser.parse_args(argv)
+
+    results = run(args.modules, args.runs)
+    over_budget = False
+    for module, result in results.items():
+        print(f"{module}: {result['median_ms']} ms")
+        for name, ms in result["heaviest"]:
+            print(f"    {name}: {ms:.1f} ms")
+        if args.max_ms and result["median_ms"] > args.max_ms:
+            over_budget = True
+    return 1 if over_budget else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
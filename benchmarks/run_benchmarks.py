@@ -0,0 +1,160 @@
+"""
+Offline benchmarks for the service layer against the local stub LLM server.
+
+Measures throughput, p50/p95/p99 latency and allocations per call for generate_safe_text,
+evaluate_text and ChecklistService.evaluate_text_against_checklist.
+
+Usage:
+    python -m benchmarks.run_benchmarks
+    python -m benchmarks.run_benchmarks --calls 200 --concurrency 16 --latency-ms 200 --error-rate 0.05 --json results.json
+"""
+
+import argparse
+import json
+import math
+import os
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from benchmarks.stub_llm_server import StubConfig, start_stub_server
+
+
+def _percentile(samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile, as used by the hedging latency window."""
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(pct / 100.0 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def _configure_environment(base_url: str) -> None:
+    """Points the services at the stub server. Must run before the services are imported."""
+    os.environ["GEMINI_API_ENDPOINT"] = base_url
+    os.environ["HF_API_BASE_URL"] = base_url
+    os.environ.setdefault("GEMINI_API_TOKEN", "stub-key")
+    os.environ.setdefault("HUGGINGFACE_API_TOKEN", "stub-key")
+    # Measure the service itself rather than the provider quota; set these to benchmark the queue
+    os.environ.setdefault("GEMINI_RATE_PER_MINUTE", "0")
+    os.environ.setdefault("MISTRAL_RATE_PER_MINUTE", "0")
+
+
+def _measure_allocations(call: Callable[[int], object], samples: int = 5) -> Dict[str, float]:
+    """Runs a few calls sequentially under tracemalloc and returns the mean allocation per call."""
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        start, _ = tracemalloc.get_traced_memory()
+        peak_total = 0
+        for index in range(samples):
+            call(-1 - index)
+            _, peak = tracemalloc.get_traced_memory()
+            peak_total += peak - start
+            tracemalloc.reset_peak()
+        current, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"alloc_peak_kib_per_call": round(peak_total / samples / 1024, 1),
+            "retained_kib_per_call": round((current - start) / samples / 1024, 1)}
+
+
+def run_case(name: str, call: Callable[[int], object], calls: int, concurrency: int,
+             reset: Optional[Callable[[], None]] = None) -> Dict[str, object]:
+    """Runs `calls` invocations of call(index) on `concurrency` threads and summarises them."""
+    def timed(index: int) -> float:
+        start = time.perf_counter()
+        call(index)
+        return time.perf_counter() - start
+
+    if reset:
+        reset()
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(timed, range(calls)))
+    wall = time.perf_counter() - wall_start
+
+    if reset:
+        reset()
+    result = {
+        "case": name,
+        "calls": calls,
+        "concurrency": concurrency,
+        "throughput_per_s": round(calls / wall, 2) if wall else 0.0,
+        "p50_ms": round(_percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(_percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(_percentile(latencies, 99) * 1000, 1),
+    }
+    result.update(_measure_allocations(call))
+    return result
+
+
+def run_benchmarks(calls: int = 50, concurrency: int = 8, config: Optional[StubConfig] = None) -> List[Dict[str, object]]:
+    """Starts the stub server, runs every benchmark case and returns one summary per case."""
+    server, base_url = start_stub_server(config or StubConfig())
+    _configure_environment(base_url)
+    try:
+        # Imported late so the module-level endpoint settings see the stub server
+        from services import evaluation_service
+        from services.circuit_breaker import reset_circuit_breakers
+        from services.rate_limiter import reset_rate_limiters
+        from services.custom_checklist_service import ChecklistService
+
+        checklist_service = ChecklistService()
+        checklist = checklist_service.compile_checklist([
+            "Includes a real-world example",
+            "Ends with a practice question",
+            "Avoids jargon without explanation",
+        ])
+        principles = list(evaluation_service.DEFAULT_PRINCIPLES.keys())
+        sample = "Photosynthesis lets plants make food from sunlight. Practice question: what do leaves need?"
+
+        def reset() -> None:
+            evaluation_service.clear_response_cache()
+            reset_circuit_breakers()
+            reset_rate_limiters()
+
+        # Unique inputs per call so the response cache does not hide provider latency
+        cases = [
+            ("generate_safe_text", lambda i: evaluation_service.generate_safe_text(f"Explain photosynthesis (variant {i})")),
+            ("evaluate_text", lambda i: evaluation_service.evaluate_text(f"{sample} [{i}]", principles)),
+            ("evaluate_text_against_checklist",
+             lambda i: checklist_service.evaluate_text_against_checklist(f"{sample} [{i}]", checklist)),
+        ]
+        return [run_case(name, call, calls, concurrency, reset) for name, call in cases]
+    finally:
+        server.shutdown()
+
+
+def _format_table(results: List[Dict[str, object]]) -> str:
+    columns = ["case", "calls", "concurrency", "throughput_per_s", "p50_ms", "p95_ms", "p99_ms",
+               "alloc_peak_kib_per_call", "retained_kib_per_call"]
+    widths = {c: max(len(c), *(len(str(r[c])) for r in results)) for c in columns}
+    lines = ["  ".join(c.ljust(widths[c]) for c in columns)]
+    lines += ["  ".join(str(r[c]).ljust(widths[c]) for c in columns) for r in results]
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run_benchmarks", description="Benchmark the service layer offline.")
+    parser.add_argument("--calls", type=int, default=50, help="Calls per benchmark case.")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent callers per case.")
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="Mean stub latency.")
+    parser.add_argument("--jitter-ms", type=float, default=100.0, help="Stub latency standard deviation (or +/- range for uniform).")
+    parser.add_argument("--distribution", choices=("fixed", "uniform", "lognormal"), default="lognormal")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of stub responses that are HTTP 500.")
+    parser.add_argument("--loading-rate", type=float, default=0.0, help="Fraction of Hugging Face responses that are 503 loading.")
+    parser.add_argument("--json", dest="json_path", help="Also write the results to this JSON file.")
+    args = parser.parse_args(argv)
+
+    config = StubConfig(args.latency_ms, args.jitter_ms, args.distribution, args.error_rate, args.loading_rate)
+    results = run_benchmarks(args.calls, args.concurrency, config)
+    print(_format_table(results))
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,196 @@
+"""
+Local stand-in for the Gemini REST API and the Hugging Face inference API.
+
+Latency, error rate and the Hugging Face 503 "model is loading" rate are configurable, so
+the service layer can be benchmarked offline.
+
+Usage:
+    python -m benchmarks.stub_llm_server --port 8765 --latency-ms 400 --jitter-ms 150 --error-rate 0.02
+Then point the app at it:
+    GEMINI_API_ENDPOINT=http://127.0.0.1:8765 HF_API_BASE_URL=http://127.0.0.1:8765 \\
+    GEMINI_API_TOKEN=stub HUGGINGFACE_API_TOKEN=stub streamlit run streamlit_app.py
+"""
+
+import argparse
+import json
+import math
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Tuple
+
+STUB_TEXT = (
+    "Photosynthesis is how plants turn sunlight, water and carbon dioxide into sugar and oxygen. "
+    "For example, a leaf in the sun is like a tiny kitchen making food. "
+    "Practice question: what gas do plants release during photosynthesis?"
+)
+
+
+@dataclass
+class StubConfig:
+    """Behaviour of the stub server."""
+    latency_ms: float = 300.0
+    jitter_ms: float = 100.0
+    distribution: str = "lognormal"  # fixed | uniform | lognormal
+    error_rate: float = 0.0  # fraction of requests answered with HTTP 500
+    loading_rate: float = 0.0  # fraction of Hugging Face requests answered with 503 "loading"
+    stream_chunks: int = 4
+    seed: int = 0
+
+
+class _LatencyModel:
+    def __init__(self, config: StubConfig):
+        self.config = config
+        self._rng = random.Random(config.seed)
+        self._lock = threading.Lock()
+
+    def sample_seconds(self) -> float:
+        mean, jitter = self.config.latency_ms, self.config.jitter_ms
+        with self._lock:
+            if self.config.distribution == "fixed" or jitter <= 0:
+                value = mean
+            elif self.config.distribution == "uniform":
+                value = self._rng.uniform(mean - jitter, mean + jitter)
+            else:
+                # Lognormal with the given mean and standard deviation, giving a realistic long tail
+                sigma2 = math.log(1 + (jitter / mean) ** 2) if mean > 0 else 0.0
+                mu = math.log(mean) - sigma2 / 2 if mean > 0 else 0.0
+                value = self._rng.lognormvariate(mu, math.sqrt(sigma2))
+            return max(0.0, value) / 1000.0
+
+    def roll(self, rate: float) -> bool:
+        with self._lock:
+            return self._rng.random() < rate
+
+
+def _prompt_text(body: Dict) -> str:
+    parts = []
+    for content in body.get("contents", []):
+        for part in content.get("parts", []):
+            parts.append(part.get("text", ""))
+    return "\n".join(parts)
+
+
+def _gemini_answer(body: Dict) -> str:
+    """Builds a plausible answer: JSON for evaluation prompts, prose otherwise."""
+    prompt = _prompt_text(body)
+    if '"Custom Educator Checklist"' in prompt:
+        return json.dumps({"Custom Educator Checklist": ["No issues detected."]})
+    match = re.search(r"The principles to check are: (.*?)\.\s*\n", prompt)
+    if match:
+        principles = [p.strip() for p in match.group(1).split(",") if p.strip()]
+        if "one key per text id" in prompt:
+            ids = re.findall(r'"id": "(t\d+)"', prompt)
+            return json.dumps({i: {p: ["No issues detected."] for p in principles} for i in ids})
+        return json.dumps({p: ["No issues detected."] for p in principles})
+    return STUB_TEXT
+
+
+def _gemini_payload(text: str) -> Dict:
+    return {
+        "candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": "STOP", "index": 0}],
+        "usageMetadata": {"promptTokenCount": 50, "candidatesTokenCount": len(text) // 4, "totalTokenCount": 50 + len(text) // 4},
+    }
+
+
+def _split_chunks(text: str, count: int) -> List[str]:
+    size = max(1, len(text) // max(1, count))
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency: _LatencyModel
+    config: StubConfig
+
+    def log_message(self, format, *args):  # keep benchmark output clean
+        pass
+
+    def _send_json(self, status: int, payload, headers: Dict[str, str] = None) -> None:
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_sse(self, events: List[Tuple[float, Dict]]) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        for delay, event in events:
+            time.sleep(delay)
+            self.wfile.write(b"data: " + json.dumps(event).encode("utf-8") + b"\n\n")
+            self.wfile.flush()
+        self.close_connection = True
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", "0") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        latency = self.latency.sample_seconds()
+
+        if self.latency.roll(self.config.error_rate):
+            time.sleep(latency)
+            self._send_json(500, {"error": {"code": 500, "message": "stub internal error"}})
+            return
+
+        if ":streamGenerateContent" in self.path:
+            chunks = _split_chunks(_gemini_answer(body), self.config.stream_chunks)
+            first, rest = latency * 0.3, latency * 0.7 / max(1, len(chunks) - 1)
+            self._send_sse([(first if i == 0 else rest, _gemini_payload(chunk)) for i, chunk in enumerate(chunks)])
+        elif ":generateContent" in self.path:
+            time.sleep(latency)
+            self._send_json(200, _gemini_payload(_gemini_answer(body)))
+        elif self.path.startswith("/models/"):
+            if self.latency.roll(self.config.loading_rate):
+                self._send_json(503, {"error": "Model is currently loading", "estimated_time": 0.2})
+                return
+            inputs = body.get("inputs", "")
+            if body.get("stream"):
+                chunks = _split_chunks(STUB_TEXT, self.config.stream_chunks)
+                step = latency / max(1, len(chunks))
+                self._send_sse([(step, {"token": {"text": chunk, "special": False}}) for chunk in chunks])
+            else:
+                time.sleep(latency)
+                self._send_json(200, [{"generated_text": inputs + STUB_TEXT}])
+        else:
+            self._send_json(404, {"error": f"Unknown path {self.path}"})
+
+
+def start_stub_server(config: StubConfig = None, host: str = "127.0.0.1", port: int = 0) -> Tuple[ThreadingHTTPServer, str]:
+    """Starts the stub server on a background thread and returns (server, base_url)."""
+    config = config or StubConfig()
+    handler = type("ConfiguredStubHandler", (StubHandler,), {"config": config, "latency": _LatencyModel(config)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="stub-llm-server", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local Gemini / Hugging Face stub server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=300.0)
+    parser.add_argument("--jitter-ms", type=float, default=100.0)
+    parser.add_argument("--distribution", choices=("fixed", "uniform", "lognormal"), default="lognormal")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--loading-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    config = StubConfig(args.latency_ms, args.jitter_ms, args.distribution, args.error_rate, args.loading_rate)
+    server, url = start_stub_server(config, args.host, args.port)
+    print(f"Stub LLM server listening on {url} (Ctrl+C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
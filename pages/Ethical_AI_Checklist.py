@@ -2,6 +2,7 @@
 
 import streamlit as st
 from services.custom_checklist_service import ChecklistService
+from services.job_service import get_job, job_poll_interval, render_job_status, submit_checklist_evaluation
 
 # Page configuration
 st.set_page_config(page_title="Ethical AI Checklist", page_icon="📋", layout="wide")
@@ -39,7 +40,10 @@ with col1:
         st.info("Create a `.txt` file where each line is a separate rule or guideline you want to check for.")
         uploaded_file = st.file_uploader("Upload your checklist file.", type=["txt"])
         if uploaded_file:
-            st.session_state.custom_checklist = checklist_service.load_checklist_from_file(uploaded_file)
+            # Only parse a newly uploaded file; reruns keep the compiled checklist from session state
+            if st.session_state.get("checklist_file_id") != uploaded_file.file_id:
+                st.session_state.custom_checklist = checklist_service.load_compiled_checklist_from_file(uploaded_file)
+                st.session_state.checklist_file_id = uploaded_file.file_id
             if st.session_state.custom_checklist:
                 st.success(f"Checklist with {len(st.session_state.custom_checklist)} items uploaded successfully!")
             else:
@@ -47,7 +51,7 @@ with col1:
     else:
         manual_checklist = st.text_area("Enter each guideline on a new line:", height=150)
         if manual_checklist:
-            st.session_state.custom_checklist = [line.strip() for line in manual_checklist.split('\n') if line.strip()]
+            st.session_state.custom_checklist = checklist_service.compile_checklist(manual_checklist.split('\n'))
 
 
     if st.session_state.custom_checklist:
@@ -65,32 +69,44 @@ with col2:
         elif not st.session_state.custom_checklist:
             st.warning("Please provide a checklist first.")
         else:
-            with st.spinner("Analyzing text against your custom checklist..."):
-                feedback = checklist_service.evaluate_text_against_checklist(
-                    text_to_evaluate,
-                    custom_checklist=st.session_state.custom_checklist
-                )
-                
-                st.subheader("Evaluation Results")
-                
-                if "Custom Educator Checklist" in feedback and feedback["Custom Educator Checklist"]:
-                    with st.container():
-                        issues_found = []
-                        safe_messages = []
-                        for issue in feedback["Custom Educator Checklist"]:
-                            if "no issues detected" in issue.lower():
-                                safe_messages.append(issue)
-                            else:
-                                issues_found.append(issue)
-                        
-                        if not issues_found:
-                             st.success(f"✅ **Safe:** {safe_messages[0] if safe_messages else 'No issues detected.'}")
-                        else:
-                            st.error(f"⚠️ **Issues Found:** {len(issues_found)} potential violation(s) detected.")
-                            for issue in issues_found:
-                                st.warning(issue)
-
-                elif "API Error" in feedback:
-                     st.error(f"An error occurred during evaluation: {feedback['API Error'][0]}")
+            # The evaluation runs in the background; reruns find it again through session state
+            st.session_state.checklist_job_id = submit_checklist_evaluation(
+                text_to_evaluate,
+                st.session_state.custom_checklist
+            ).id
+
+    @st.fragment(run_every=job_poll_interval(st.session_state.get("checklist_job_id")))
+    def show_checklist_results():
+        job = get_job(st.session_state.get("checklist_job_id"))
+        if job is None:
+            return
+        if job.done:
+            st.subheader("Evaluation Results")
+        render_job_status(job, "checklist_job_id", "⏳ Analyzing text against your custom checklist...")
+        if not job.done:
+            return
+        feedback = job.result or {"API Error": [job.error or "The evaluation was cancelled."]}
+
+        if "Custom Educator Checklist" in feedback and feedback["Custom Educator Checklist"]:
+            with st.container():
+                issues_found = []
+                safe_messages = []
+                for issue in feedback["Custom Educator Checklist"]:
+                    if "no issues detected" in issue.lower():
+                        safe_messages.append(issue)
+                    else:
+                        issues_found.append(issue)
+
+                if not issues_found:
+                     st.success(f"✅ **Safe:** {safe_messages[0] if safe_messages else 'No issues detected.'}")
                 else:
-                     st.info("No specific feedback was returned for the custom checklist.")
+                    st.error(f"⚠️ **Issues Found:** {len(issues_found)} potential violation(s) detected.")
+                    for issue in issues_found:
+                        st.warning(issue)
+
+        elif "API Error" in feedback:
+             st.error(f"An error occurred during evaluation: {feedback['API Error'][0]}")
+        else:
+             st.info("No specific feedback was returned for the custom checklist.")
+
+    show_checklist_results()
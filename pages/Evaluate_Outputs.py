@@ -2,7 +2,8 @@
 
 import streamlit as st
 import os
-from services.evaluation_service import evaluate_text, DEFAULT_PRINCIPLES
+from services.evaluation_service import DEFAULT_PRINCIPLES
+from services.job_service import get_job, job_poll_interval, render_job_status, submit_evaluation
 
 # Load custom CSS
 def load_css():
@@ -27,17 +28,29 @@ principles = st.multiselect(
 
 if st.button("Evaluate Text", type="primary"):
     if text_to_evaluate and principles:
-        with st.spinner("Evaluating text..."):
-            feedback = evaluate_text(text_to_evaluate, principles)
-            st.divider()
-            st.subheader("Evaluation Results:")
-            for principle, issues in feedback.items():
-                with st.expander(f"**{principle}**", expanded=True):
-                    is_safe = "No specific issues" in issues[0]
-                    if is_safe:
-                         st.success(f"✅ {issues[0]}")
-                    else:
-                        for issue in issues:
-                            st.warning(f"⚠️ {issue}")
+        # The evaluation runs in the background; reruns find it again through session state
+        st.session_state.evaluation_job_id = submit_evaluation(text_to_evaluate, principles).id
     else:
-        st.warning("Please provide text and select at least one principle.")
\ No newline at end of file
+        st.warning("Please provide text and select at least one principle.")
+
+
+@st.fragment(run_every=job_poll_interval(st.session_state.get("evaluation_job_id")))
+def show_evaluation():
+    job = get_job(st.session_state.get("evaluation_job_id"))
+    if job is None:
+        return
+    st.divider()
+    st.subheader("Evaluation Results:")
+    # Each principle's expander is drawn as soon as its findings arrive
+    for principle, issues in list(job.partial):
+        with st.expander(f"**{principle}**", expanded=True):
+            is_safe = "No specific issues" in issues[0]
+            if is_safe:
+                 st.success(f"✅ {issues[0]}")
+            else:
+                for issue in issues:
+                    st.warning(f"⚠️ {issue}")
+    render_job_status(job, "evaluation_job_id", "⏳ Evaluating text...", "An error occurred during evaluation")
+
+
+show_evaluation()
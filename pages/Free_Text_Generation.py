@@ -2,7 +2,7 @@
 
 import streamlit as st
 import os
-from services.evaluation_service import generate_safe_text,generate_safe_free_text
+from services.job_service import get_job, job_poll_interval, render_job_status, submit_generation
 
 # Load custom CSS
 def load_css():
@@ -22,13 +22,28 @@ prompt = st.text_area("What do you want to write about?", height=150)
 
 if st.button("Generate Text", type="primary"):
     if prompt:
-        with st.spinner("Generating text..."):
-            is_safe, response = generate_safe_free_text(prompt)
-            st.divider()
-            st.subheader("Generated Response:")
-            if is_safe:
-                st.info(response)
-            else:
-                st.error(f"⚠️ **Content Flagged:** {response}")
+        # Generation runs in the background; reruns find it again through session state
+        st.session_state.free_text_job_id = submit_generation(prompt, free_text=True).id
     else:
-        st.warning("Please enter a prompt.")
\ No newline at end of file
+        st.warning("Please enter a prompt.")
+
+
+@st.fragment(run_every=job_poll_interval(st.session_state.get("free_text_job_id")))
+def show_response():
+    job = get_job(st.session_state.get("free_text_job_id"))
+    if job is None:
+        return
+    st.divider()
+    st.subheader("Generated Response:")
+    result = job.result or {}
+    if result.get("is_safe", True):
+        # Chunks already received are shown while the rest is generated
+        text = result.get("text") or "".join(job.partial)
+        with st.container(border=True):
+            st.markdown(text)
+    else:
+        st.error(f"⚠️ **Content Flagged:** {result['text']}")
+    render_job_status(job, "free_text_job_id", "⏳ Generating text...", "An error occurred while generating")
+
+
+show_response()
@@ -2,7 +2,7 @@
 
 import streamlit as st
 import os
-from services.evaluation_service import generate_safe_text
+from services.job_service import get_job, job_poll_interval, render_job_status, submit_generation
 
 # Load custom CSS
 def load_css():
@@ -22,13 +22,27 @@ topic = st.text_input("Enter a topic or concept:", placeholder="e.g., Photosynth
 
 if st.button("Generate Explanation", type="primary"):
     if topic:
-        with st.spinner("Generating explanation..."):
-            is_safe, response = generate_safe_text(topic)
-            st.divider()
-            st.subheader("Generated Response:")
-            if is_safe:
-                st.markdown(response)
-            else:
-                st.error(f"⚠️ **Content Flagged:** {response}")
+        # Generation runs in the background; reruns find it again through session state
+        st.session_state.explanation_job_id = submit_generation(topic).id
     else:
-        st.warning("Please enter a topic.")
\ No newline at end of file
+        st.warning("Please enter a topic.")
+
+
+@st.fragment(run_every=job_poll_interval(st.session_state.get("explanation_job_id")))
+def show_response():
+    job = get_job(st.session_state.get("explanation_job_id"))
+    if job is None:
+        return
+    st.divider()
+    st.subheader("Generated Response:")
+    result = job.result or {}
+    if result.get("is_safe", True):
+        # Chunks already received are shown while the rest is generated
+        text = result.get("text") or "".join(job.partial)
+        st.markdown(text)
+    else:
+        st.error(f"⚠️ **Content Flagged:** {result['text']}")
+    render_job_status(job, "explanation_job_id", "⏳ Generating explanation...", "An error occurred while generating")
+
+
+show_response()
@@ -26,24 +26,24 @@ selected_key = st.selectbox(
 
 if selected_key:
     current_scenario = get_scenario(selected_key)
+    # Feedback is recomputed on every edit of the prompt; scoring is local and takes well under a millisecond
     user_prompt = st.text_area("Write your prompt here:", height=100, key=f"prompt_{selected_key}")
 
-    if st.button("Get AI Response & Feedback", type="primary"):
-        if user_prompt:
-            simulated_response = get_simulated_response(user_prompt, selected_key)
-            feedback_list, quality_score = analyze_prompt_quality(user_prompt, current_scenario)
-
-            st.subheader("Simulated AI Response:")
-            st.info(simulated_response)
-
-            st.subheader("Feedback on Your Prompt:")
-            for item in feedback_list:
-                if "**Good!**" in item:
-                    st.success(f"✅ {item}")
-                else:
-                    st.warning(f"💡 {item}")
-            
-            st.progress(quality_score / 10.0)  # Updated for new max score of 10
-            st.caption(f"Prompt Quality Score: {quality_score}/10")
-        else:
-            st.error("Please write a prompt first.")
\ No newline at end of file
+    if user_prompt.strip():
+        simulated_response = get_simulated_response(user_prompt, selected_key)
+        feedback_list, quality_score = analyze_prompt_quality(user_prompt, current_scenario)
+
+        st.subheader("Simulated AI Response:")
+        st.info(simulated_response)
+
+        st.subheader("Feedback on Your Prompt:")
+        for item in feedback_list:
+            if "**Good!**" in item:
+                st.success(f"✅ {item}")
+            else:
+                st.warning(f"💡 {item}")
+        
+        st.progress(quality_score / 10.0)  # Updated for new max score of 10
+        st.caption(f"Prompt Quality Score: {quality_score}/10")
+    else:
+        st.caption("Feedback on your prompt appears here as you write it.")
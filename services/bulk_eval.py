@@ -0,0 +1,166 @@
+"""
+Bulk offline evaluation of archived AI outputs.
+
+Streams a JSONL file of texts through evaluate_text and/or ChecklistService and writes one
+JSONL result per input line, in input order. Memory use is bounded by the number of in-flight
+texts, and an interrupted run continues from the last completed line with --resume.
+
+Usage:
+    python -m services.bulk_eval outputs.jsonl results.jsonl --workers 8 --rate 5 --resume
+    python -m services.bulk_eval outputs.jsonl results.jsonl --principles Bias,Misinformation --checklist services/custom_checklist.txt
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, TextIO, Tuple
+
+from services.custom_checklist_service import ChecklistService, CompiledChecklist, compile_checklist
+from services.evaluation_service import DEFAULT_PRINCIPLES, evaluate_text
+from services.rate_limiter import PROVIDER_LIMITS, configure_rate_limiter, session_scope
+
+logger = logging.getLogger(__name__)
+
+# Bytes read at a time while counting the lines of an existing output file
+_COUNT_BUFFER_SIZE = 1 << 20
+
+
+def count_completed_lines(output_path: str) -> int:
+    """
+    Returns how many results the output file already holds, reading it in fixed-size blocks.
+    A trailing partial line from an interrupted write is truncated first.
+    """
+    if not os.path.exists(output_path):
+        return 0
+    lines, complete, offset = 0, 0, 0
+    with open(output_path, "rb+") as f:
+        for block in iter(lambda: f.read(_COUNT_BUFFER_SIZE), b""):
+            newlines = block.count(b"\n")
+            if newlines:
+                lines += newlines
+                complete = offset + block.rfind(b"\n") + 1
+            offset += len(block)
+        if complete < offset:
+            f.truncate(complete)
+    return lines
+
+
+def _read_records(input_file: TextIO, skip: int) -> Iterator[Tuple[int, str]]:
+    """Yields (line number, raw line) lazily, skipping lines that are already done."""
+    for line_number, line in enumerate(input_file, start=1):
+        if line_number <= skip:
+            continue
+        yield line_number, line
+
+
+def evaluate_record(line_number: int, raw_line: str, principles: List[str], checklist: Optional[CompiledChecklist],
+                    text_field: str, checklist_service: ChecklistService) -> Dict:
+    """Evaluates one JSONL input line and returns its output record."""
+    record: Dict = {"line": line_number}
+    try:
+        item = json.loads(raw_line)
+        text = item[text_field] if isinstance(item, dict) else item
+        if not isinstance(text, str):
+            raise ValueError(f"'{text_field}' is not a string")
+        if isinstance(item, dict) and "id" in item:
+            record["id"] = item["id"]
+    except (ValueError, KeyError, TypeError) as e:
+        record["error"] = f"Invalid input line: {e}"
+        return record
+
+    # The workers queue as one session in this process's provider rate limiters
+    try:
+        with session_scope("bulk_eval"):
+            if principles:
+                record["evaluation"] = evaluate_text(text, principles)
+            if checklist:
+                record["checklist"] = checklist_service.evaluate_text_against_checklist(text, checklist)
+    except Exception as e:
+        # One failing text must not stop an overnight run; its line records the error instead
+        logger.exception("Evaluating line %d failed", line_number)
+        record["error"] = f"Evaluation failed: {e}"
+    return record
+
+
+def run_bulk_evaluation(input_path: str, output_path: str, principles: List[str], checklist: Optional[CompiledChecklist] = None,
+                        workers: int = 4, rate_per_second: float = 0.0, resume: bool = False, text_field: str = "text") -> int:
+    """
+    Evaluates every line of input_path and appends results to output_path in input order.
+
+    Provider calls are paced by the shared per-provider rate limiters, which also count fallbacks,
+    retries and long-text chunks; rate_per_second > 0 overrides their configured rate for this process.
+
+    Returns:
+        The number of lines evaluated in this run.
+    """
+    skip = count_completed_lines(output_path) if resume else 0
+    if rate_per_second > 0:
+        for provider in PROVIDER_LIMITS:
+            configure_rate_limiter(provider, rate_per_second)
+    checklist_service = ChecklistService()
+    max_in_flight = max(1, workers) * 2
+    processed = 0
+
+    with open(input_path, "r", encoding="utf-8") as input_file, \
+            open(output_path, "a" if resume else "w", encoding="utf-8") as output_file, \
+            ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="bulk-eval") as pool:
+        in_flight: "deque[Future]" = deque()
+
+        def write_oldest() -> None:
+            output_file.write(json.dumps(in_flight.popleft().result(), ensure_ascii=False) + "\n")
+            output_file.flush()
+
+        for line_number, raw_line in _read_records(input_file, skip):
+            if not raw_line.strip():
+                # Blank lines still get a record so line counts stay aligned for --resume
+                future: Future = Future()
+                future.set_result({"line": line_number, "error": "Empty line"})
+            else:
+                future = pool.submit(evaluate_record, line_number, raw_line, principles, checklist, text_field, checklist_service)
+            in_flight.append(future)
+            processed += 1
+            if len(in_flight) >= max_in_flight:
+                write_oldest()
+        while in_flight:
+            write_oldest()
+    return processed
+
+
+def _parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m services.bulk_eval", description="Evaluate a JSONL file of texts in bulk.")
+    parser.add_argument("input", help="JSONL file; each line is an object with a text field (and optional id) or a JSON string.")
+    parser.add_argument("output", help="JSONL file results are written to, one line per input line.")
+    parser.add_argument("--principles", default=",".join(DEFAULT_PRINCIPLES.keys()),
+                        help="Comma-separated principles for evaluate_text; empty to skip. Defaults to all default principles.")
+    parser.add_argument("--checklist", help="Checklist .txt file to also evaluate each text against.")
+    parser.add_argument("--text-field", default="text", help="Name of the text field in each input object.")
+    parser.add_argument("--workers", type=int, default=4, help="Number of concurrent evaluations.")
+    parser.add_argument("--rate", type=float, default=0.0, help="Maximum requests per second to each LLM provider across workers "
+                             "(0 = the GEMINI_RATE_PER_MINUTE / MISTRAL_RATE_PER_MINUTE limits).")
+    parser.add_argument("--resume", action="store_true", help="Continue after the last completed line of an existing output file.")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = _parse_args(argv)
+    principles = [p.strip() for p in args.principles.split(",") if p.strip()]
+    checklist = None
+    if args.checklist:
+        with open(args.checklist, "r", encoding="utf-8") as f:
+            checklist = compile_checklist(f.read().splitlines())
+    if not principles and not checklist:
+        print("Nothing to evaluate: pass --principles and/or --checklist.", file=sys.stderr)
+        return 2
+
+    processed = run_bulk_evaluation(args.input, args.output, principles, checklist, workers=args.workers,
+                                    rate_per_second=args.rate, resume=args.resume, text_field=args.text_field)
+    print(f"Evaluated {processed} lines into {args.output}.", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
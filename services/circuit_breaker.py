@@ -0,0 +1,190 @@
+"""Per-provider circuit breakers so known-down LLM providers are skipped."""
+
+import asyncio
+import os
+import re
+import threading
+import time
+from typing import Awaitable, Callable, Dict, Tuple
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "3"))
+RECOVERY_TIMEOUT = float(os.getenv("CIRCUIT_RECOVERY_SECONDS", "30"))
+HALF_OPEN_MAX_CALLS = int(os.getenv("CIRCUIT_HALF_OPEN_MAX_CALLS", "1"))
+
+# The provider answered, but with an empty, safety-blocked or rejected (4xx other than auth/timeout/quota) response
+_REQUEST_FAILURE_MARKERS = ("no valid content", "no valid response")
+_CLIENT_ERROR = re.compile(r"(?:error \(|: )4(?!01|03|08|29)\d\d\b")
+# A missing, invalid or revoked key fails every request, so it must still open the circuit
+_AUTH_FAILURE_MARKERS = ("api key", "api_key", "permission", "unauthorized", "forbidden", "unauthenticated")
+
+
+def is_request_failure(message: str) -> bool:
+    """True for failures caused by the request rather than the provider, which retrying cannot fix."""
+    message = message.lower()
+    if any(marker in message for marker in _AUTH_FAILURE_MARKERS):
+        return False
+    return any(marker in message for marker in _REQUEST_FAILURE_MARKERS) or bool(_CLIENT_ERROR.search(message))
+
+
+class CircuitBreaker:
+    """
+    Closed: calls pass and consecutive failures are counted.
+    Open: calls are rejected until the recovery timeout has passed.
+    Half-open: a limited number of probe calls decide whether to close or re-open.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = FAILURE_THRESHOLD, recovery_timeout: float = RECOVERY_TIMEOUT,
+                 half_open_max_calls: int = HALF_OPEN_MAX_CALLS, clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = max(1, half_open_max_calls)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+        self.total_failures = 0
+        self.total_successes = 0
+        self.rejected_calls = 0
+        self.last_error = ""
+
+    def _refresh_state(self) -> None:
+        """Moves an open circuit to half-open once the recovery timeout has passed."""
+        if self._state == OPEN and self._clock() - self._opened_at >= self.recovery_timeout:
+            self._state = HALF_OPEN
+            self._half_open_calls = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._refresh_state()
+            return self._state
+
+    def allow_request(self) -> bool:
+        """Returns True if a call may go to the provider now."""
+        with self._lock:
+            self._refresh_state()
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and self._half_open_calls < self.half_open_max_calls:
+                self._half_open_calls += 1
+                return True
+            self.rejected_calls += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.total_successes += 1
+            self._consecutive_failures = 0
+            self._state = CLOSED
+
+    def record_failure(self, error: str = "") -> None:
+        with self._lock:
+            self.total_failures += 1
+            self._consecutive_failures += 1
+            self.last_error = error
+            if self._state == HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+                self._state = OPEN
+                self._opened_at = self._clock()
+
+    def record_outcome(self, is_successful: bool, response: str = "") -> None:
+        """
+        Records the (is_successful, response) of a call. A failure caused by the request itself says
+        nothing about the provider's health, so it only returns the probe slot.
+        """
+        if is_successful:
+            self.record_success()
+        elif is_request_failure(response):
+            self.release()
+        else:
+            self.record_failure(response)
+
+    def release(self) -> None:
+        """Returns an unused half-open probe slot, e.g. when the probe call was cancelled."""
+        with self._lock:
+            if self._state == HALF_OPEN and self._half_open_calls > 0:
+                self._half_open_calls -= 1
+
+    def reset(self) -> None:
+        with self._lock:
+            self._state = CLOSED
+            self._consecutive_failures = 0
+            self._half_open_calls = 0
+
+    def snapshot(self) -> Dict[str, object]:
+        """Returns the breaker state and counters for inspection."""
+        with self._lock:
+            self._refresh_state()
+            retry_in = max(0.0, self.recovery_timeout - (self._clock() - self._opened_at)) if self._state == OPEN else 0.0
+            return {
+                "state": self._state,
+                "consecutive_failures": self._consecutive_failures,
+                "total_failures": self.total_failures,
+                "total_successes": self.total_successes,
+                "rejected_calls": self.rejected_calls,
+                "retry_in_seconds": round(retry_in, 3),
+                "last_error": self.last_error,
+            }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(name: str) -> CircuitBreaker:
+    """Returns the process-wide breaker for a provider, creating it on first use."""
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = _breakers[name] = CircuitBreaker(name)
+        return breaker
+
+
+def get_circuit_states() -> Dict[str, Dict[str, object]]:
+    """Returns a snapshot of every provider breaker."""
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.name: breaker.snapshot() for breaker in breakers}
+
+
+def reset_circuit_breakers() -> None:
+    """Closes every breaker, e.g. after fixing a provider's configuration."""
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    for breaker in breakers:
+        breaker.reset()
+
+
+def _open_circuit_message(name: str) -> str:
+    return f"{name} is temporarily skipped after repeated failures (circuit open)."
+
+
+def call_with_breaker(name: str, call: Callable[..., Tuple[bool, str]], *args) -> Tuple[bool, str]:
+    """Runs a provider call returning (is_successful, response) through the provider's breaker."""
+    breaker = get_circuit_breaker(name)
+    if not breaker.allow_request():
+        return (False, _open_circuit_message(name))
+    is_successful, response = call(*args)
+    breaker.record_outcome(is_successful, response)
+    return (is_successful, response)
+
+
+async def call_with_breaker_async(name: str, call: Callable[..., Awaitable[Tuple[bool, str]]], *args) -> Tuple[bool, str]:
+    """Async counterpart of call_with_breaker."""
+    breaker = get_circuit_breaker(name)
+    if not breaker.allow_request():
+        return (False, _open_circuit_message(name))
+    try:
+        is_successful, response = await call(*args)
+    except asyncio.CancelledError:
+        # A cancelled hedge loser says nothing about the provider's health
+        breaker.release()
+        raise
+    breaker.record_outcome(is_successful, response)
+    return (is_successful, response)
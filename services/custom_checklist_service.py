@@ -1,10 +1,99 @@
 """Service for handling custom ethical AI checklists."""
 
-from typing import Dict, List, Tuple
-import google.generativeai as genai
+import asyncio
+import contextvars
+import hashlib
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
 import streamlit as st
-import json
+from services import instrumentation
+from services.json_stream import parse_json_object
+from services.deadline import deadline_scope
+from services.keyword_matcher import KeywordMatcher, get_keyword_matcher
+from services.llm_clients import gemini_request_options, get_gemini_model
+from services.model_router import RoutingDecision, get_model_router, record_model_outcome, route_model
+from services.prompt_builder import (CHECKLIST_INPUT_TOKEN_BUDGET, LONG_TEXT_CHUNK_TOKENS, LONG_TEXT_THRESHOLD_TOKENS, compact_guidelines,
+                                     compact_prompt, estimate_tokens, split_by_budget, split_text)
+from services.rate_limiter import PRIORITY_EVALUATION, call_provider_with_retries, call_provider_with_retries_async
+from services.response_cache import ResponseCache
+from services.result_store import content_hash, load_result, save_result
+from services.single_flight import SingleFlight
+
+# Used when model routing is off; otherwise light checklists go to the router's smaller model
+CHECKLIST_MODEL = "gemini-1.5-flash"
+CHECKLIST_GENERATION_CONFIG = {"response_mime_type": "application/json", "temperature": 0.1}
+UNEXPECTED_FORMAT_MESSAGE = "The LLM evaluation did not return the expected result format."
+# Guideline tokens sent per call when a checklist is split, even if the budget barely covers the prompt template
+MIN_CHECKLIST_PART_TOKENS = 200
+CHECKLIST_MAX_PARALLEL = int(os.getenv("CHECKLIST_MAX_PARALLEL", "4"))
+
+
+def _render_system_prompt(items: Tuple[str, ...]) -> str:
+    """Renders the checklist evaluation system prompt for the given guidelines."""
+    # FIX: Create the checklist string outside the f-string to avoid backslash error.
+    checklist_str = "\n- ".join(items)
+    
+    return compact_prompt(f"""You are an expert AI content safety evaluator. Your task is to analyze the user-provided text based on a custom checklist of guidelines.
+                    The custom checklist is:
+                    - {checklist_str}
+                    Your response MUST be a valid JSON object.
+                    The JSON object should have one key: "Custom Educator Checklist".
+                    The value for this key should be a list of strings.
+                    - If you find specific issues where the text violates a guideline from the checklist, each string in the list should describe the violation and which guideline it relates to.
+                    - If you find no issues, the list should contain a single string: "No issues detected."
+                    Do not include any text outside of the JSON object itself.
+                    """)
+
+
+@dataclass(frozen=True)
+class CompiledChecklist:
+    """
+    Immutable, content-hashed checklist with everything an evaluation needs precomputed.
+
+    Attributes:
+        digest: SHA-256 of the normalized items; equal checklists share a digest.
+        items: The stripped, non-empty guidelines in their original order, without (near-)duplicates.
+        system_prompt: The pre-rendered Gemini system prompt.
+        matcher: Compiled keyword matcher used by the API fallback.
+    """
+    digest: str
+    items: Tuple[str, ...]
+    system_prompt: str = field(repr=False, compare=False)
+    matcher: KeywordMatcher = field(repr=False, compare=False)
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.items)
+
+
+ChecklistInput = Union[List[str], CompiledChecklist]
+
+# Shared by every ChecklistService instance, so all sessions reuse compiled checklists
+_compiled_checklists = ResponseCache(maxsize=256, ttl_seconds=24 * 3600)
+_checklists_by_source = ResponseCache(maxsize=256, ttl_seconds=24 * 3600)
+# Identical checklist evaluations already in flight share one Gemini call
+_checklist_flights = SingleFlight("checklist")
+
+
+def compile_checklist(lines: Iterable[str]) -> CompiledChecklist:
+    """Normalizes and de-duplicates guidelines and returns the cached CompiledChecklist for their content."""
+    items = compact_guidelines(lines)
+    digest = hashlib.sha256("\n".join(items).encode("utf-8")).hexdigest()
+    compiled = _compiled_checklists.get(digest)
+    if compiled is None:
+        compiled = CompiledChecklist(
+            digest=digest,
+            items=items,
+            system_prompt=_render_system_prompt(items),
+            matcher=get_keyword_matcher(items),
+        )
+        _compiled_checklists.put(digest, compiled)
+    return compiled
 
 class ChecklistService:
     """Manages loading and evaluating custom checklists."""
@@ -30,95 +119,354 @@ class ChecklistService:
             st.error(f"Error reading checklist file: {e}")
             return []
 
-    def _call_gemini_for_checklist_evaluation(self, text_to_evaluate: str, custom_checklist: List[str]) -> Tuple[bool, str]:
+    def load_compiled_checklist_from_file(self, uploaded_file) -> CompiledChecklist:
         """
-        Calls the Google Gemini 1.5 Flash API for custom checklist evaluation.
+        Reads a .txt file into a CompiledChecklist, reusing the cached result for identical file contents.
+
+        Args:
+            uploaded_file: The file-like object from a Streamlit file uploader.
+
+        Returns:
+            The compiled checklist; it is empty if the file could not be read.
+        """
+        if not uploaded_file:
+            return compile_checklist([])
+        try:
+            raw = uploaded_file.getvalue()
+            source_digest = hashlib.sha256(raw).hexdigest()
+            compiled = _checklists_by_source.get(source_digest)
+            if compiled is None:
+                compiled = compile_checklist(raw.decode("utf-8").splitlines())
+                _checklists_by_source.put(source_digest, compiled)
+            return compiled
+        except Exception as e:
+            st.error(f"Error reading checklist file: {e}")
+            return compile_checklist([])
+
+    def compile_checklist(self, custom_checklist: ChecklistInput) -> CompiledChecklist:
+        """
+        Returns the cached CompiledChecklist for a list of guidelines.
+
+        Args:
+            custom_checklist: A list of guidelines, or an already compiled checklist.
+
+        Returns:
+            The compiled checklist.
+        """
+        if isinstance(custom_checklist, CompiledChecklist):
+            return custom_checklist
+        return compile_checklist(custom_checklist)
+
+    def _checklist_messages(self, text_to_evaluate: str, custom_checklist: CompiledChecklist) -> List[Dict]:
+        """
+        Builds the Gemini messages for a custom checklist evaluation.
 
         Args:
             text_to_evaluate: The text to be analyzed.
-            custom_checklist: A list of custom guidelines.
+            custom_checklist: The compiled checklist holding the pre-rendered system prompt.
 
         Returns:
-            A tuple containing a success boolean and the API response as a string.
+            The role-based message list for generate_content.
         """
-        gemini_api_key = getattr(st.secrets, 'GEMINI_API_TOKEN', os.getenv('GEMINI_API_TOKEN', ''))
-        if not gemini_api_key:
-            return (False, "Gemini API key not found. Please set 'GEMINI_API_TOKEN' in your environment or Streamlit secrets.")
+        return [
+            {"role": "user", "parts": [custom_checklist.system_prompt]},
+            {"role": "model", "parts": ["Okay, I will analyze the text against the provided custom checklist and return a single JSON object with the results."]},
+            {"role": "user", "parts": [text_to_evaluate]}
+        ]
 
-        genai.configure(api_key=gemini_api_key)
+    def _extract_response_text(self, response) -> Tuple[bool, str]:
+        """
+        Extracts the first text part from a Gemini response.
 
-        try:
-            model = genai.GenerativeModel('gemini-1.5-flash')
-
-            # FIX: Create the checklist string outside the f-string to avoid backslash error.
-            checklist_str = "\n- ".join(custom_checklist)
-            
-            system_prompt = f"""You are an expert AI content safety evaluator. Your task is to analyze the user-provided text based on a custom checklist of guidelines.
-                            The custom checklist is:
-                            - {checklist_str}
-                            Your response MUST be a valid JSON object.
-                            The JSON object should have one key: "Custom Educator Checklist".
-                            The value for this key should be a list of strings.
-                            - If you find specific issues where the text violates a guideline from the checklist, each string in the list should describe the violation and which guideline it relates to.
-                            - If you find no issues, the list should contain a single string: "No issues detected."
-                            Do not include any text outside of the JSON object itself.
-                            """
-            messages = [
-                {"role": "user", "parts": [system_prompt]},
-                {"role": "model", "parts": ["Okay, I will analyze the text against the provided custom checklist and return a single JSON object with the results."]},
-                {"role": "user", "parts": [text_to_evaluate]}
-            ]
-
-            response = model.generate_content(
-                messages,
-                generation_config=genai.types.GenerationConfig(
-                    response_mime_type="application/json",
-                    temperature=0.1,
-                ),
-            )
-
-            if response.parts:
-                return (True, response.parts[0].text)
-            elif response.candidates:
-                for candidate in response.candidates:
-                    if candidate.content and candidate.content.parts:
-                        return (True, candidate.content.parts[0].text)
-
-            return (False, "No valid content found in Gemini API response.")
-        except Exception as e:
-            return (False, f"Error calling Gemini API for checklist evaluation: {e}")
+        Args:
+            response: The Gemini generate_content response.
+
+        Returns:
+            A tuple containing a success boolean and the response text or an error message.
+        """
+        if response.parts:
+            return (True, response.parts[0].text)
+        elif response.candidates:
+            for candidate in response.candidates:
+                if candidate.content and candidate.content.parts:
+                    return (True, candidate.content.parts[0].text)
+
+        return (False, "No valid content found in Gemini API response.")
 
+    def _route(self, text_to_evaluate: str, custom_checklist: CompiledChecklist) -> RoutingDecision:
+        """Asks the model router for a model sized to the text and the number of checklist items."""
+        return route_model("checklist", text_to_evaluate + "\n".join(custom_checklist.items), len(custom_checklist.items),
+                           default_model=CHECKLIST_MODEL)
 
-    def evaluate_text_against_checklist(self, text_to_evaluate: str, custom_checklist: List[str]) -> Dict[str, List[str]]:
+    def _call_gemini_for_checklist_evaluation(self, text_to_evaluate: str, custom_checklist: CompiledChecklist) -> Tuple[bool, str]:
         """
-        Evaluates text against a custom checklist using the Gemini API.
-        Falls back to simple keyword matching if the API fails.
+        Calls the Gemini model chosen by the model router for custom checklist evaluation.
 
         Args:
             text_to_evaluate: The text to be analyzed.
-            custom_checklist: The list of guidelines to check against.
+            custom_checklist: The compiled checklist to evaluate against.
 
         Returns:
-            A dictionary containing the evaluation feedback.
+            A tuple containing a success boolean and the API response as a string.
         """
-        if not custom_checklist:
-            return {"Custom Educator Checklist": ["No checklist was provided for evaluation."]}
+        decision = self._route(text_to_evaluate, custom_checklist)
+        has_model, model = get_gemini_model(decision.model, CHECKLIST_GENERATION_CONFIG)
+        if not has_model:
+            return (False, model)
 
-        is_successful, response_str = self._call_gemini_for_checklist_evaluation(text_to_evaluate, custom_checklist)
+        with instrumentation.span("llm_call", provider="gemini", purpose="checklist", model=decision.model) as span:
+            start = time.perf_counter()
+            try:
+                response = model.generate_content(self._checklist_messages(text_to_evaluate, custom_checklist),
+                                                  request_options=gemini_request_options())
+                span.record_usage(response)
+                result = self._extract_response_text(response)
+            except Exception as e:
+                result = (False, f"Error calling Gemini API for checklist evaluation: {e}")
+            record_model_outcome(decision.model, time.perf_counter() - start, *result)
+            return span.record_result(result)
 
-        if is_successful:
+    async def _call_gemini_for_checklist_evaluation_async(self, text_to_evaluate: str, custom_checklist: CompiledChecklist) -> Tuple[bool, str]:
+        """
+        Async counterpart of _call_gemini_for_checklist_evaluation.
+
+        Args:
+            text_to_evaluate: The text to be analyzed.
+            custom_checklist: The compiled checklist to evaluate against.
+
+        Returns:
+            A tuple containing a success boolean and the API response as a string.
+        """
+        decision = self._route(text_to_evaluate, custom_checklist)
+        has_model, model = get_gemini_model(decision.model, CHECKLIST_GENERATION_CONFIG)
+        if not has_model:
+            return (False, model)
+
+        with instrumentation.span("llm_call", provider="gemini", purpose="checklist", mode="async", model=decision.model) as span:
+            start = time.perf_counter()
             try:
-                feedback = json.loads(response_str)
-                if "Custom Educator Checklist" not in feedback:
-                    feedback = {"Custom Educator Checklist": ["The LLM evaluation did not return the expected result format."]}
-                return feedback
-            except json.JSONDecodeError:
-                return {"API Error": [f"Failed to decode the API's JSON response: {response_str}"]}
+                response = await model.generate_content_async(self._checklist_messages(text_to_evaluate, custom_checklist),
+                                                              request_options=gemini_request_options())
+                span.record_usage(response)
+                result = self._extract_response_text(response)
+            except Exception as e:
+                result = (False, f"Error calling Gemini API for checklist evaluation: {e}")
+            record_model_outcome(decision.model, time.perf_counter() - start, *result)
+            return span.record_result(result)
+
+    def _parse_checklist_response(self, is_successful: bool, response_str: str, text_to_evaluate: str, custom_checklist: CompiledChecklist) -> Dict[str, List[str]]:
+        """
+        Turns a checklist evaluation call result into feedback, falling back to keyword matching on failure.
+
+        Args:
+            is_successful: Whether the API call succeeded.
+            response_str: The API response, or the error message.
+            text_to_evaluate: The text that was analyzed.
+            custom_checklist: The compiled checklist that was evaluated.
+
+        Returns:
+            A dictionary containing the evaluation feedback.
+        """
+        if is_successful:
+            with instrumentation.span("parse", kind="checklist") as span:
+                try:
+                    feedback = parse_json_object(response_str)
+                    if "Custom Educator Checklist" not in feedback:
+                        span.set(status="error")
+                        feedback = {"Custom Educator Checklist": [UNEXPECTED_FORMAT_MESSAGE]}
+                    return feedback
+                except ValueError:
+                    span.set(status="error")
+                    return {"API Error": [f"Failed to decode the API's JSON response: {response_str}"]}
         else:
             # Fallback to simple keyword matching if API fails
-            print(f"Debug - Gemini checklist evaluation failed with error: {response_str}. Falling back to keyword matching.")
-            text_lower = text_to_evaluate.lower()
-            custom_issues = [f"Detected text that potentially matches custom checklist item: '{item}'." for item in custom_checklist if item.lower() in text_lower]
+            instrumentation.count("llm_fallback", provider="keyword_matching", purpose="checklist",
+                                  reason="circuit_open" if "circuit open" in response_str else "provider_error")
+            with instrumentation.span("keyword_scan", kind="checklist_fallback"):
+                matched_items = custom_checklist.matcher.matched_keywords(text_to_evaluate)
+            custom_issues = [f"Detected text that potentially matches custom checklist item: '{item}'." for item in matched_items]
             if not custom_issues:
                 custom_issues = ["No issues detected based on keyword matching (API fallback)."]
             return {"Custom Educator Checklist": custom_issues}
+
+    def _split_checklist(self, custom_checklist: CompiledChecklist) -> List[CompiledChecklist]:
+        """
+        Splits a checklist whose prompt would exceed CHECKLIST_INPUT_TOKEN_BUDGET into parts that fit.
+        Only the guidelines are budgeted: the evaluated text is resent with every part, so counting it
+        would make a long text cost more calls instead of fewer. Long texts are chunked separately.
+
+        Args:
+            custom_checklist: The compiled checklist to check against.
+
+        Returns:
+            The compiled parts, in guideline order; just the checklist itself if it fits.
+        """
+        if estimate_tokens(custom_checklist.system_prompt) <= CHECKLIST_INPUT_TOKEN_BUDGET:
+            return [custom_checklist]
+        overhead = estimate_tokens(compile_checklist([]).system_prompt)
+        groups = split_by_budget(custom_checklist.items, max(MIN_CHECKLIST_PART_TOKENS, CHECKLIST_INPUT_TOKEN_BUDGET - overhead))
+        if len(groups) < 2:
+            return [custom_checklist]
+        instrumentation.count("checklist_split", parts=len(groups))
+        return [compile_checklist(group) for group in groups]
+
+    def _evaluation_units(self, text_to_evaluate: str, custom_checklist: CompiledChecklist) -> List[Tuple[str, CompiledChecklist]]:
+        """
+        Pairs every piece of the text with every part of the checklist, one pair per Gemini call.
+
+        Args:
+            text_to_evaluate: The text to be analyzed; texts above LONG_TEXT_THRESHOLD_TOKENS are split into
+                chunks of LONG_TEXT_CHUNK_TOKENS, as in evaluate_long_text.
+            custom_checklist: The compiled checklist to check against.
+
+        Returns:
+            (text, checklist) pairs; a single pair of the whole text and checklist if both fit one call.
+        """
+        parts = self._split_checklist(custom_checklist)
+        texts = [text_to_evaluate]
+        if estimate_tokens(text_to_evaluate) > LONG_TEXT_THRESHOLD_TOKENS:
+            texts = [text_to_evaluate[start:end] for start, end in split_text(text_to_evaluate, LONG_TEXT_CHUNK_TOKENS)] or texts
+            instrumentation.count("checklist_long_text", chunks=len(texts))
+        return [(text, part) for text in texts for part in parts]
+
+    def _evaluate_part(self, text_to_evaluate: str, custom_checklist: CompiledChecklist) -> Tuple[bool, Dict[str, List[str]]]:
+        """Evaluates the text against one compiled checklist (or part of one) and parses the result."""
+        (is_successful, response_str), _ = _checklist_flights.do(
+            (text_to_evaluate, custom_checklist.digest),
+            lambda: call_provider_with_retries("gemini", self._call_gemini_for_checklist_evaluation, text_to_evaluate,
+                                               custom_checklist, priority=PRIORITY_EVALUATION),
+        )
+        return (is_successful, self._parse_checklist_response(is_successful, response_str, text_to_evaluate, custom_checklist))
+
+    async def _evaluate_part_async(self, text_to_evaluate: str, custom_checklist: CompiledChecklist) -> Tuple[bool, Dict[str, List[str]]]:
+        """Async counterpart of _evaluate_part."""
+        (is_successful, response_str), _ = await _checklist_flights.do_async(
+            (text_to_evaluate, custom_checklist.digest),
+            lambda: call_provider_with_retries_async("gemini", self._call_gemini_for_checklist_evaluation_async,
+                                                     text_to_evaluate, custom_checklist, priority=PRIORITY_EVALUATION),
+        )
+        return (is_successful, self._parse_checklist_response(is_successful, response_str, text_to_evaluate, custom_checklist))
+
+    def _merge_part_feedback(self, results: List[Tuple[bool, Dict[str, List[str]]]]) -> Tuple[bool, Dict[str, List[str]]]:
+        """
+        Combines the feedback of the parts of a split checklist, or the chunks of a long text, into one result.
+
+        Args:
+            results: (is_successful, feedback) of each part, in guideline and text order.
+
+        Returns:
+            Whether every part was answered by the LLM, and the de-duplicated findings of all parts;
+            an "API Error" of any part is returned as is.
+        """
+        findings: List[str] = []
+        no_issues = "No issues detected."
+        for is_successful, feedback in results:
+            if "API Error" in feedback:
+                return (False, feedback)
+            for finding in feedback.get("Custom Educator Checklist", []):
+                if "no issues detected" not in finding.lower():
+                    if finding not in findings:
+                        findings.append(finding)
+                elif not is_successful:
+                    # Keep the keyword-matching fallback note if any part had to use it
+                    no_issues = finding
+        return (all(is_successful for is_successful, _ in results), {"Custom Educator Checklist": findings or [no_issues]})
+
+    def _result_store_key(self, text_to_evaluate: str, custom_checklist: CompiledChecklist) -> str:
+        """
+        Builds the persistent result store key for a checklist evaluation.
+
+        Args:
+            text_to_evaluate: The text to be analyzed.
+            custom_checklist: The compiled checklist to check against.
+
+        Returns:
+            A hash of the text, the checklist digest and the model settings.
+        """
+        return content_hash("checklist", text_to_evaluate, custom_checklist.digest, get_model_router().label(CHECKLIST_MODEL),
+                            CHECKLIST_GENERATION_CONFIG)
+
+    def _load_stored_result(self, store_key: str) -> Optional[Dict[str, List[str]]]:
+        feedback = load_result(store_key)
+        if feedback is not None:
+            instrumentation.count("result_store", status="hit", kind="checklist")
+        return feedback
+
+    def _store_result(self, store_key: str, is_successful: bool, feedback: Dict[str, List[str]], text_to_evaluate: str,
+                      custom_checklist: CompiledChecklist) -> None:
+        """Stores LLM results only; keyword-matching fallbacks and malformed responses are retried next time."""
+        findings = feedback.get("Custom Educator Checklist")
+        if is_successful and findings and UNEXPECTED_FORMAT_MESSAGE not in findings:
+            save_result(store_key, feedback, "checklist", get_model_router().label(CHECKLIST_MODEL), text_to_evaluate,
+                        list(custom_checklist.items))
+
+    def evaluate_text_against_checklist(self, text_to_evaluate: str, custom_checklist: ChecklistInput) -> Dict[str, List[str]]:
+        """
+        Evaluates text against a custom checklist using the Gemini API.
+        Checklists too long for one call's token budget are evaluated in parts, and long texts in chunks,
+        whose findings are merged.
+        Falls back to simple keyword matching if the API fails.
+
+        Args:
+            text_to_evaluate: The text to be analyzed.
+            custom_checklist: The list of guidelines, or a compiled checklist, to check against.
+
+        Returns:
+            A dictionary containing the evaluation feedback.
+        """
+        custom_checklist = self.compile_checklist(custom_checklist)
+        if not custom_checklist:
+            return {"Custom Educator Checklist": ["No checklist was provided for evaluation."]}
+
+        store_key = self._result_store_key(text_to_evaluate, custom_checklist)
+        stored = self._load_stored_result(store_key)
+        if stored is not None:
+            return stored
+
+        units = self._evaluation_units(text_to_evaluate, custom_checklist)
+        with deadline_scope():
+            if len(units) == 1:
+                is_successful, feedback = self._evaluate_part(text_to_evaluate, custom_checklist)
+            else:
+                with ThreadPoolExecutor(max_workers=min(CHECKLIST_MAX_PARALLEL, len(units)), thread_name_prefix="checklist-part") as pool:
+                    # Parts run in copies of the caller's context, so they share its deadline and session id
+                    futures = [pool.submit(contextvars.copy_context().run, self._evaluate_part, text, part) for text, part in units]
+                    is_successful, feedback = self._merge_part_feedback([future.result() for future in futures])
+        self._store_result(store_key, is_successful, feedback, text_to_evaluate, custom_checklist)
+        return feedback
+
+    async def evaluate_text_against_checklist_async(self, text_to_evaluate: str, custom_checklist: ChecklistInput) -> Dict[str, List[str]]:
+        """
+        Async counterpart of evaluate_text_against_checklist.
+
+        Args:
+            text_to_evaluate: The text to be analyzed.
+            custom_checklist: The list of guidelines, or a compiled checklist, to check against.
+
+        Returns:
+            A dictionary containing the evaluation feedback.
+        """
+        custom_checklist = self.compile_checklist(custom_checklist)
+        if not custom_checklist:
+            return {"Custom Educator Checklist": ["No checklist was provided for evaluation."]}
+
+        store_key = self._result_store_key(text_to_evaluate, custom_checklist)
+        stored = self._load_stored_result(store_key)
+        if stored is not None:
+            return stored
+
+        units = self._evaluation_units(text_to_evaluate, custom_checklist)
+        with deadline_scope():
+            if len(units) == 1:
+                is_successful, feedback = await self._evaluate_part_async(text_to_evaluate, custom_checklist)
+            else:
+                limit = asyncio.Semaphore(max(1, CHECKLIST_MAX_PARALLEL))
+
+                async def evaluate_unit(text: str, part: CompiledChecklist) -> Tuple[bool, Dict[str, List[str]]]:
+                    async with limit:
+                        return await self._evaluate_part_async(text, part)
+
+                results = await asyncio.gather(*(evaluate_unit(text, part) for text, part in units))
+                is_successful, feedback = self._merge_part_feedback(list(results))
+        self._store_result(store_key, is_successful, feedback, text_to_evaluate, custom_checklist)
+        return feedback
@@ -0,0 +1,184 @@
+"""
+Request-level deadlines and jittered exponential backoff for provider calls.
+
+A page-facing call opens a deadline_scope; everything below it (rate limiter queueing, each provider
+attempt and the retries between them) takes its timeout from the budget that is left, and once the
+budget is spent the provider chain fails fast so the caller can serve its predefined response.
+The deadline is held in a context variable, like the rate limiter's session id, so it reaches nested
+calls without changing their signatures; work handed to other threads must run in a copied context.
+"""
+
+import asyncio
+import contextvars
+import os
+import random
+import time
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Iterable, Iterator, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+# Total time a page request may spend on LLM calls before falling back
+LLM_REQUEST_DEADLINE_SECONDS = float(os.getenv("LLM_REQUEST_DEADLINE_SECONDS", "25"))
+# Attempts per provider for transient errors, including the first one
+LLM_RETRY_ATTEMPTS = int(os.getenv("LLM_RETRY_ATTEMPTS", "3"))
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.25"))
+LLM_RETRY_MAX_DELAY = float(os.getenv("LLM_RETRY_MAX_DELAY", "4"))
+# An attempt is not started with less budget than this, as it could not finish anyway
+MIN_ATTEMPT_SECONDS = float(os.getenv("LLM_MIN_ATTEMPT_SECONDS", "0.5"))
+
+DEADLINE_EXCEEDED_MESSAGE = "Request deadline exceeded before the provider could answer."
+
+
+class Deadline:
+    """A point in time by which a request must be answered."""
+
+    def __init__(self, seconds: float, clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            seconds: Budget from now.
+            clock: Monotonic time source, injectable for tests.
+        """
+        self._clock = clock
+        self.expires_at = clock() + seconds
+
+    def remaining(self) -> float:
+        """Seconds left, never negative."""
+        return max(0.0, self.expires_at - self._clock())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def timeout(self, cap: Optional[float] = None) -> float:
+        """Returns the time left, bounded by cap (e.g. a provider's own timeout)."""
+        remaining = self.remaining()
+        return remaining if cap is None else min(cap, remaining)
+
+
+_deadline: contextvars.ContextVar[Optional[Deadline]] = contextvars.ContextVar("request_deadline", default=None)
+
+
+def current_deadline() -> Optional[Deadline]:
+    """Returns the deadline of the enclosing deadline_scope, or None outside of one."""
+    return _deadline.get()
+
+
+@contextmanager
+def deadline_scope(seconds: float = LLM_REQUEST_DEADLINE_SECONDS, clock: Callable[[], float] = time.monotonic) -> Iterator[Deadline]:
+    """
+    Bounds the provider calls made in the block to seconds in total.
+    Nested scopes can only shorten the budget, so an inner call never outlives its caller.
+    """
+    deadline = Deadline(seconds, clock)
+    outer = _deadline.get()
+    if outer is not None and outer.expires_at <= deadline.expires_at:
+        deadline = outer
+    with _bound_to(deadline):
+        yield deadline
+
+
+@contextmanager
+def _bound_to(deadline: Deadline) -> Iterator[Deadline]:
+    token = _deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _deadline.reset(token)
+
+
+def iterate_within_deadline(iterable: Iterable[T], seconds: float = LLM_REQUEST_DEADLINE_SECONDS,
+                            clock: Callable[[], float] = time.monotonic) -> Iterator[T]:
+    """
+    Yields from iterable under one deadline_scope that starts with the first item.
+    The deadline is only set while the iterable produces its next item, not while the consumer
+    holds one, so a streaming generator is bounded end to end without leaking the deadline to its caller.
+    """
+    iterator = iter(iterable)
+    deadline = None
+    try:
+        while True:
+            with (deadline_scope(seconds, clock) if deadline is None else _bound_to(deadline)) as deadline:
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+    finally:
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            close()
+
+
+def deadline_expired() -> bool:
+    """True inside a deadline_scope whose budget is spent."""
+    deadline = _deadline.get()
+    return deadline is not None and deadline.expired
+
+
+def time_left(cap: Optional[float] = None) -> Optional[float]:
+    """Returns the current budget bounded by cap, or cap itself when no deadline is set."""
+    deadline = _deadline.get()
+    return cap if deadline is None else deadline.timeout(cap)
+
+
+def backoff_delay(attempt: int, base: float = LLM_RETRY_BASE_DELAY, cap: float = LLM_RETRY_MAX_DELAY,
+                  rng: Callable[[], float] = random.random) -> float:
+    """Full-jitter exponential backoff: a random wait up to base * 2**attempt, capped."""
+    return rng() * min(cap, base * (2 ** attempt))
+
+
+def _next_delay(attempt: int, attempts: int, rng: Callable[[], float]) -> Optional[float]:
+    """Returns the wait before the next attempt, or None if there is no attempt or budget left for one."""
+    if attempt + 1 >= attempts:
+        return None
+    delay = backoff_delay(attempt, rng=rng)
+    budget = time_left()
+    if budget is not None and budget - delay < MIN_ATTEMPT_SECONDS:
+        return None
+    return delay
+
+
+def retry_with_backoff(call: Callable[..., Tuple[bool, str]], *args, is_transient: Callable[[str], bool],
+                       attempts: int = LLM_RETRY_ATTEMPTS, sleep: Callable[[float], None] = time.sleep,
+                       rng: Callable[[], float] = random.random) -> Tuple[bool, str]:
+    """
+    Calls a provider function returning (is_successful, response), retrying transient failures
+    with jittered exponential backoff while the deadline leaves room for another attempt.
+
+    Args:
+        call: The provider call.
+        *args: Arguments for call.
+        is_transient: Tells from the error message whether retrying can help.
+        attempts: Maximum number of calls.
+        sleep: Sleep function, injectable for tests.
+        rng: Uniform [0, 1) source for the jitter, injectable for tests.
+
+    Returns:
+        The first successful result, or the last failure.
+    """
+    attempt = 0
+    while True:
+        is_successful, response = call(*args)
+        if is_successful or not is_transient(response):
+            return (is_successful, response)
+        delay = _next_delay(attempt, attempts, rng)
+        if delay is None:
+            return (is_successful, response)
+        sleep(delay)
+        attempt += 1
+
+
+async def retry_with_backoff_async(call: Callable[..., Awaitable[Tuple[bool, str]]], *args, is_transient: Callable[[str], bool],
+                                   attempts: int = LLM_RETRY_ATTEMPTS, rng: Callable[[], float] = random.random) -> Tuple[bool, str]:
+    """Async counterpart of retry_with_backoff."""
+    attempt = 0
+    while True:
+        is_successful, response = await call(*args)
+        if is_successful or not is_transient(response):
+            return (is_successful, response)
+        delay = _next_delay(attempt, attempts, rng)
+        if delay is None:
+            return (is_successful, response)
+        await asyncio.sleep(delay)
+        attempt += 1
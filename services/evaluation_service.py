@@ -1,12 +1,33 @@
 """Evaluation service for responsible AI content analysis."""
 
+import logging
 import os
-from typing import Dict, List, Optional, Tuple
-import streamlit as st
-import requests
+from typing import Callable, Dict, Generator, Iterator, List, Optional, Tuple
 #from huggingface_hub import InferenceClient
-import google.generativeai as genai # Import the Google Generative AI library
+import asyncio
+import contextvars
 import json
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from services import instrumentation
+from services.circuit_breaker import get_circuit_breaker, get_circuit_states
+from services.deadline import DEADLINE_EXCEEDED_MESSAGE, deadline_expired, deadline_scope, iterate_within_deadline
+from services.json_stream import IncrementalObjectParser, strip_code_fence
+from services.hedging import LatencyWindow, hedged_call, hedged_call_async
+from services.keyword_matcher import get_keyword_matcher
+from services.model_router import get_model_router, record_model_outcome, route_model
+from services.prompt_builder import LONG_TEXT_CHUNK_TOKENS, LONG_TEXT_THRESHOLD_TOKENS, compact_prompt, estimate_tokens, split_text
+from services.llm_clients import gemini_request_options, get_gemini_model, get_secret, post_with_retries, post_with_retries_async
+from services.rate_limiter import (PRIORITY_BATCH, PRIORITY_EVALUATION, acquire_provider_slot, call_provider, call_provider_async,
+                                   call_provider_with_retries, call_provider_with_retries_async, get_rate_limiter_states)
+from services.response_cache import ResponseCache
+from services.result_store import content_hash, load_result, save_result
+from services.similarity_index import SimilarityIndex
+from services.single_flight import SingleFlight, SingleFlightStreams
+
+logger = logging.getLogger(__name__)
 
 # Load environment variables from .env file if available
 try:
@@ -25,65 +46,170 @@ DEFAULT_PRINCIPLES = {
     "Lack of Clarity": ["vague", "unclear", "ambiguous"]
 }
 
-def _call_gemini_api(prompt: str) -> Tuple[bool, str]:
-    """Call Google Gemini 1.5 Flash API."""
-    # Retrieve Gemini API key from environment variables or Streamlit secrets
-    gemini_api_key = getattr(st.secrets, 'GEMINI_API_TOKEN', os.getenv('GEMINI_API_TOKEN', ''))
+_UNSAFE_MATCHER = get_keyword_matcher(UNSAFE_KEYWORDS)
 
-    if not gemini_api_key:
-        return (False, "Gemini API key not found. Please set 'GEMINI_API_TOKEN' in your environment or Streamlit secrets.")
+# Generation settings, also part of the response cache key; the model applies when model routing is off
+GEMINI_GENERATION_MODEL = "gemini-1.5-flash-8b"
+GEMINI_GENERATION_CONFIG = {"max_output_tokens": 256, "temperature": 0.7, "top_p": 0.9}
+HF_API_BASE_URL = os.getenv("HF_API_BASE_URL", "https://api-inference.huggingface.co")
+MISTRAL_API_URL = f"{HF_API_BASE_URL.rstrip('/')}/models/mistralai/Mistral-7B-Instruct-v0.1"
+MISTRAL_GENERATION_PARAMS = {"max_new_tokens": 250, "temperature": 0.7}
+# Evaluation model when model routing is off; batch evaluation always uses it
+GEMINI_EVALUATION_MODEL = "gemini-1.5-flash-8b"
+GEMINI_EVALUATION_CONFIG = {"max_output_tokens": 1024, "temperature": 0.1}
 
-    # Configure the Google Generative AI library with your API key
-    genai.configure(api_key=gemini_api_key)
+# Batch evaluation: texts per request are bounded by the expected JSON output size
+GEMINI_BATCH_EVALUATION_CONFIG = {"max_output_tokens": 8192, "temperature": 0.1, "response_mime_type": "application/json"}
+BATCH_OUTPUT_TOKENS_PER_PRINCIPLE = 80
+BATCH_OUTPUT_TOKENS_PER_TEXT = 16
+BATCH_MAX_TEXTS = int(os.getenv("EVALUATION_BATCH_MAX_TEXTS", "25"))
+BATCH_MAX_INPUT_TOKENS = int(os.getenv("EVALUATION_BATCH_MAX_INPUT_TOKENS", "100000"))
 
-    try:
-        # Initialize the GenerativeModel for Gemini 1.5 Flash
-        model = genai.GenerativeModel('gemini-1.5-flash-8b')#.gemini-1.5-flash
-
-        system_prompt = "You are a helpful educational assistant. Provide clear, accurate explanations suitable for students."
-        user_prompt = f"Explain {prompt} in simple terms with an example and include a practice question at the end."
-
-        # Construct the content for the Gemini API call
-        # Gemini API typically takes messages in a specific role-based format
-        messages = [
-            {"role": "user", "parts": [system_prompt]}, # System prompt can be part of the user's initial message
-            {"role": "model", "parts": ["Okay, I understand. I will provide clear, accurate explanations suitable for students, including an example and a practice question."]}, # Example model response to establish role
-            {"role": "user", "parts": [user_prompt]}
-        ]
-
-        # Generate content using the Gemini model
-        response = model.generate_content(
-            messages,
-            generation_config=genai.types.GenerationConfig(
-                max_output_tokens=256,  # Use max_output_tokens for Gemini
-                temperature=0.7,
-                top_p=0.9,
-            ),
-        )
-        print(f"Debug - Gemini API response: {response}")
-        # Extract the text from the response
-        if response.parts:
-            return (True, response.parts[0].text)
-        elif response.candidates:
-            # Fallback for older response structures or different candidate access
-            for candidate in response.candidates:
-                if candidate.content and candidate.content.parts:
-                    return (True, candidate.content.parts[0].text)
-        return (False, "No valid content found in Gemini API response.")
+# Long-document mode: texts above LONG_TEXT_THRESHOLD_TOKENS are evaluated as concurrent chunks
+LONG_TEXT_MAX_PARALLEL = int(os.getenv("LONG_TEXT_MAX_PARALLEL", "4"))
+
+# Response cache in front of _call_llm_safely
+_response_cache = ResponseCache(
+    maxsize=int(os.getenv("RESPONSE_CACHE_MAXSIZE", "512")),
+    ttl_seconds=float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "900")),
+)
+
+# Near-duplicate lookup behind the exact cache, so reworded repeat prompts reuse a response
+SIMILARITY_CACHE_ENABLED = os.getenv("SIMILARITY_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+_similar_prompts = SimilarityIndex(
+    maxsize=int(os.getenv("SIMILARITY_CACHE_MAXSIZE", "512")),
+    ttl_seconds=float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "900")),
+    threshold=float(os.getenv("SIMILARITY_CACHE_THRESHOLD", "0.85")),
+)
+
+# Hedged mode: start Mistral in parallel when Gemini is slower than its usual latency percentile
+LLM_HEDGING_ENABLED = os.getenv("LLM_HEDGING_ENABLED", "false").lower() in ("1", "true", "yes")
+HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+HEDGE_DEFAULT_DELAY = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY", "2.0"))
+HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "0.3"))
+
+# Identical requests already in flight are joined rather than sent to the provider again
+_generation_flights = SingleFlight("generation")
+_evaluation_flights = SingleFlight("evaluation")
+_stream_flights = SingleFlightStreams()
+
+_gemini_latency = LatencyWindow()
+_hedge_executor = ThreadPoolExecutor(max_workers=int(os.getenv("LLM_HEDGE_MAX_WORKERS", "16")), thread_name_prefix="llm-hedge")
+
+def _generation_messages(prompt: str) -> List[Dict]:
+    """Builds the role-based Gemini messages for an educational explanation."""
+    system_prompt = "You are a helpful educational assistant. Provide clear, accurate explanations suitable for students."
+    user_prompt = f"Explain {prompt} in simple terms with an example and include a practice question at the end."
+
+    # Gemini API typically takes messages in a specific role-based format
+    return [
+        {"role": "user", "parts": [system_prompt]}, # System prompt can be part of the user's initial message
+        {"role": "model", "parts": ["Okay, I understand. I will provide clear, accurate explanations suitable for students, including an example and a practice question."]}, # Example model response to establish role
+        {"role": "user", "parts": [user_prompt]}
+    ]
+
+def _extract_gemini_text(response) -> Tuple[bool, str]:
+    """Extracts the first text part from a Gemini response."""
+    if response.parts:
+        return (True, response.parts[0].text)
+    elif response.candidates:
+        # Fallback for older response structures or different candidate access
+        for candidate in response.candidates:
+            if candidate.content and candidate.content.parts:
+                return (True, candidate.content.parts[0].text)
+    return (False, "No valid content found in Gemini API response.")
+
+# Gemini requests are built once by a shared core and sent by thin sync, async and streaming transports
+
+@dataclass(frozen=True)
+class _GeminiRequest:
+    """A routed Gemini request: the model, its generation config, the messages and how to read the answer."""
+    purpose: str
+    model: str
+    config: Dict
+    messages: List[Dict]
+    error_prefix: str
+    clean: Callable[[str], str] = lambda text: text
+    # Reported instead of the client registry's message when no API key is configured
+    missing_key_message: Optional[str] = None
 
+def _generation_request(prompt: str) -> _GeminiRequest:
+    decision = route_model("generation", prompt, default_model=GEMINI_GENERATION_MODEL)
+    return _GeminiRequest("generation", decision.model, GEMINI_GENERATION_CONFIG, _generation_messages(prompt), "Error calling Gemini API")
+
+def _evaluation_request(text_to_evaluate: str, principles_to_check: List[str]) -> _GeminiRequest:
+    decision = route_model("evaluation", text_to_evaluate, len(principles_to_check), default_model=GEMINI_EVALUATION_MODEL)
+    return _GeminiRequest("evaluation", decision.model, GEMINI_EVALUATION_CONFIG, _evaluation_messages(text_to_evaluate, principles_to_check),
+                          "Error calling Gemini API for evaluation", _clean_json_text, "Gemini API key not found.")
+
+def _gemini_outcome(request: _GeminiRequest, span, start: float, response=None, error: Optional[Exception] = None) -> Tuple[bool, str]:
+    """Turns a Gemini response (or the exception raised instead) into (is_successful, text) and records it."""
+    if error is None:
+        span.record_usage(response)
+        is_successful, text = _extract_gemini_text(response)
+        result = (True, request.clean(text)) if is_successful else (False, text)
+    else:
+        result = (False, f"{request.error_prefix}: {error}")
+    record_model_outcome(request.model, time.perf_counter() - start, *result)
+    return span.record_result(result)
+
+def _send_gemini(request: _GeminiRequest) -> Tuple[bool, str]:
+    """Sync transport: one generate_content call on the shared model client."""
+    has_model, model = get_gemini_model(request.model, request.config)
+    if not has_model:
+        return (False, request.missing_key_message or model)
+    with instrumentation.span("llm_call", provider="gemini", purpose=request.purpose, model=request.model) as span:
+        start = time.perf_counter()
+        try:
+            response = model.generate_content(request.messages, request_options=gemini_request_options())
+        except Exception as e:
+            return _gemini_outcome(request, span, start, error=e)
+        return _gemini_outcome(request, span, start, response)
+
+async def _send_gemini_async(request: _GeminiRequest) -> Tuple[bool, str]:
+    """Async transport: one generate_content_async call."""
+    has_model, model = get_gemini_model(request.model, request.config)
+    if not has_model:
+        return (False, request.missing_key_message or model)
+    with instrumentation.span("llm_call", provider="gemini", purpose=request.purpose, mode="async", model=request.model) as span:
+        start = time.perf_counter()
+        try:
+            response = await model.generate_content_async(request.messages, request_options=gemini_request_options())
+        except Exception as e:
+            return _gemini_outcome(request, span, start, error=e)
+        return _gemini_outcome(request, span, start, response)
+
+def _stream_gemini(request: _GeminiRequest) -> Iterator[str]:
+    """Streaming transport: yields text chunks from generate_content(stream=True)."""
+    has_model, model = get_gemini_model(request.model, request.config)
+    if not has_model:
+        raise _StreamUnavailable(request.missing_key_message or model)
+    start = time.perf_counter()
+    try:
+        response = model.generate_content(request.messages, stream=True, request_options=gemini_request_options())
     except Exception as e:
-        return (False, f"Error calling Gemini API: {e}")
+        error = f"{request.error_prefix}: {e}"
+        record_model_outcome(request.model, time.perf_counter() - start, False, error)
+        raise _StreamUnavailable(error)
+    for chunk in response:
+        if chunk.parts:
+            yield chunk.parts[0].text
+    record_model_outcome(request.model, time.perf_counter() - start, True)
 
-def _call_mistral_api(prompt: str) -> Tuple[bool, str]:
-    """Call Mistral via Hugging Face API as a fallback."""
-    api_url = "https://api-inference.huggingface.co/models/mistralai/Mistral-7B-Instruct-v0.1"
-    token = getattr(st.secrets, 'HUGGINGFACE_API_TOKEN', os.getenv('HUGGINGFACE_API_TOKEN', ''))
-    
-    if not token:
-        return (False, "Hugging Face API token not found.")
+def _call_gemini_api(prompt: str) -> Tuple[bool, str]:
+    """Call the Gemini model chosen by the model router."""
+    return _send_gemini(_generation_request(prompt))
 
-    headers = {"Authorization": f"Bearer {token}"}
-    
+MISTRAL_TOKEN_MISSING_MESSAGE = "Hugging Face API token not found."
+
+def _mistral_headers() -> Optional[Dict[str, str]]:
+    """Authorization headers for Hugging Face, or None if no token is configured."""
+    token = get_secret('HUGGINGFACE_API_TOKEN')
+    return {"Authorization": f"Bearer {token}"} if token else None
+
+def _mistral_request(prompt: str) -> Tuple[str, Dict]:
+    """Returns the instruction-formatted prompt and the request payload for Mistral."""
     safe_prompt = f"""<s>[INST] You are an educational AI assistant. Provide a safe, accurate explanation about: {prompt}
 Guidelines:
 - Keep explanations clear and educational
@@ -92,70 +218,215 @@ Guidelines:
     
     payload = {
         "inputs": safe_prompt,
-        "parameters": {"max_new_tokens": 250, "temperature": 0.7}
+        "parameters": dict(MISTRAL_GENERATION_PARAMS)
     }
+    return safe_prompt, payload
 
-    try:
-        print("Debug - Calling Mistral API...")
-        response = requests.post(api_url, headers=headers, json=payload, timeout=20)
-        print(f"Debug - Mistral API Status: {response.status_code}")
-        
-        if response.status_code == 200:
-            result = response.json()
-            if isinstance(result, list) and len(result) > 0 and 'generated_text' in result[0]:
-                generated_text = result[0]['generated_text'].replace(safe_prompt, '').strip()
-                return (True, generated_text)
-        elif response.status_code == 503:
-            return (False, "Mistral model is loading, please try again shortly.")
-        else:
-            print(f"Debug - Mistral API Error: {response.text}")
-            return (False, f"Mistral API error ({response.status_code})")
+def _request_errors():
+    """Exception type of the pooled requests session; requests is imported on first provider call."""
+    import requests
+    return requests.exceptions.RequestException
 
-    except requests.exceptions.RequestException as e:
-        print(f"Debug - Mistral API request exception: {str(e)}")
-        return (False, f"Mistral API connection error: {e}")
+def _async_request_errors():
+    """Exception type of the async httpx client."""
+    import httpx
+    return httpx.HTTPError
+
+def _parse_mistral_response(response, safe_prompt: str) -> Tuple[bool, str]:
+    """Turns a requests or httpx response from Hugging Face into (is_successful, text)."""
+    if response.status_code == 200:
+        result = response.json()
+        if isinstance(result, list) and len(result) > 0 and 'generated_text' in result[0]:
+            generated_text = result[0]['generated_text'].replace(safe_prompt, '').strip()
+            return (True, generated_text)
+    elif response.status_code == 503:
+        return (False, "Mistral model is loading, please try again shortly.")
+    else:
+        logger.debug("Mistral API error %s: %s", response.status_code, response.text)
+        return (False, f"Mistral API error ({response.status_code})")
 
     return (False, "No valid response from Mistral.")
 
+def _call_mistral_api(prompt: str) -> Tuple[bool, str]:
+    """Call Mistral via Hugging Face API as a fallback."""
+    headers = _mistral_headers()
+    if headers is None:
+        return (False, MISTRAL_TOKEN_MISSING_MESSAGE)
+    safe_prompt, payload = _mistral_request(prompt)
+    if deadline_expired():
+        # A slot granted right at the deadline leaves no time to send the request
+        return (False, DEADLINE_EXCEEDED_MESSAGE)
+
+    with instrumentation.span("llm_call", provider="mistral", purpose="generation") as span:
+        try:
+            # Pooled keep-alive session; 503 "loading" and transient errors are retried with backoff
+            response = post_with_retries(MISTRAL_API_URL, headers=headers, json=payload)
+            return span.record_result(_parse_mistral_response(response, safe_prompt))
+
+        except _request_errors() as e:
+            return span.record_result((False, f"Mistral API connection error: {e}"))
+
+def _call_gemini_timed(prompt: str) -> Tuple[bool, str]:
+    """Calls Gemini and records the latency of successful answers for the hedge delay."""
+    start = time.perf_counter()
+    is_successful, response = call_provider("gemini", _call_gemini_api, prompt)
+    if is_successful:
+        _gemini_latency.record(time.perf_counter() - start)
+    return (is_successful, response)
+
+def _hedge_delay() -> float:
+    """Seconds to wait for Gemini before hedging, from its observed latency percentile."""
+    observed = _gemini_latency.percentile(HEDGE_PERCENTILE) if len(_gemini_latency) >= HEDGE_MIN_SAMPLES else None
+    return max(HEDGE_MIN_DELAY, observed if observed is not None else HEDGE_DEFAULT_DELAY)
+
+def _call_llm_hedged(prompt: str) -> Tuple[bool, str]:
+    """Call Gemini, racing Mistral against it once Gemini exceeds the hedge delay."""
+    # Each call gets its own copy of the context, so the deadline and session id reach the executor threads
+    primary_context, secondary_context = contextvars.copy_context(), contextvars.copy_context()
+    return hedged_call(
+        lambda: primary_context.run(_call_gemini_timed, prompt),
+        lambda: secondary_context.run(call_provider_with_retries, "mistral", _call_mistral_api, prompt),
+        _hedge_delay(),
+        _hedge_executor,
+    )
+
+def _failure_reason(message: str) -> str:
+    """Classifies a provider error message into a low-cardinality fallback reason."""
+    message = message.lower()
+    if "deadline exceeded" in message:
+        return "deadline_exceeded"
+    if "circuit open" in message:
+        return "circuit_open"
+    if "not found" in message:
+        return "missing_credentials"
+    if "loading" in message:
+        return "model_loading"
+    if "connection error" in message:
+        return "connection_error"
+    return "provider_error"
+
 def _call_llm_safely(prompt: str) -> Tuple[bool, str]:
-    """Call Gemini with fallback to Mistral."""
-    # 1. Try Llama 2 API first
-    is_successful, response = _call_gemini_api(prompt)
+    """
+    Call Gemini with fallback to Mistral.
+    Gemini failures go straight to Mistral; only Mistral, the last provider, is retried within the deadline.
+    """
+    if LLM_HEDGING_ENABLED:
+        return _call_llm_hedged(prompt)
+
+    # 1. Try Gemini API first
+    is_successful, response = _call_gemini_timed(prompt)
     if is_successful:
         return (True, response)
     
-    # 2. If Llama fails, fall back to Mistral API
-    print("Debug - Gemini API failed or was unavailable. Falling back to Mistral API.")
-    is_successful, response = _call_mistral_api(prompt)
+    # 2. If Gemini fails, fall back to Mistral API
+    instrumentation.count("llm_fallback", provider="mistral", reason=_failure_reason(response))
+    is_successful, response = call_provider_with_retries("mistral", _call_mistral_api, prompt)
     if is_successful:
         return (True, response)
     
     # 3. If both fail, return the last error message
-    print("Debug - All API fallbacks failed.")
+    instrumentation.count("llm_fallback", provider="none", reason=_failure_reason(response))
     return (False, response) # Return the final error from Mistral
 
-def generate_safe_text(prompt: str, custom_guidelines: Optional[List[str]] = None) -> Tuple[bool, str]:
-    """
-    Generates safe educational content using LLMs with fallbacks.
-    Returns a tuple: (is_safe, response_text).
-    """
-    prompt_lower = prompt.lower()
-    
-    # Check for unsafe content before calling any API
-    if any(keyword in prompt_lower for keyword in UNSAFE_KEYWORDS):
-        return (False, "I am unable to generate a response to this prompt as it may violate safety guidelines.")
-    
-    # Check against custom guidelines
-    if custom_guidelines and any(keyword.lower() in prompt_lower for keyword in custom_guidelines):
-        return (False, "I am unable to generate a response as it conflicts with the provided ethical checklist.")
-    
-    # Try LLM with fallback logic
-    is_successful, llm_response = _call_llm_safely(prompt)
+def _normalize_prompt(prompt: str) -> str:
+    """Lowercases the prompt and collapses whitespace so trivial variants share a cache entry."""
+    return re.sub(r"\s+", " ", prompt).strip().lower()
+
+def _response_cache_key(prompt: str) -> tuple:
+    """Builds the cache key from the normalized prompt, the provider chain and its generation config."""
+    return (
+        _normalize_prompt(prompt),
+        ("gemini", get_model_router().label(GEMINI_GENERATION_MODEL), tuple(sorted(GEMINI_GENERATION_CONFIG.items()))),
+        ("mistral", tuple(sorted(MISTRAL_GENERATION_PARAMS.items()))),
+    )
+
+def _cached_response(prompt: str, key: tuple, **attrs) -> Optional[str]:
+    """Looks the prompt up in the exact cache, then among similar recent prompts."""
+    cached = _response_cache.get(key)
+    if cached is not None:
+        instrumentation.count("response_cache", status="hit", **attrs)
+        return cached
+    if SIMILARITY_CACHE_ENABLED:
+        # The generation settings part of the key keeps responses from other configs apart
+        cached = _similar_prompts.get(prompt, scope=key[1:])
+        if cached is not None:
+            instrumentation.count("response_cache", status="near_hit", **attrs)
+            return cached
+    instrumentation.count("response_cache", status="miss", **attrs)
+    return None
+
+def _store_response(prompt: str, key: tuple, response: str) -> None:
+    _response_cache.put(key, response)
+    if SIMILARITY_CACHE_ENABLED:
+        _similar_prompts.put(prompt, response, scope=key[1:])
+
+def _call_llm_cached(prompt: str) -> Tuple[bool, str]:
+    """Serves repeat and reworded prompts from the response caches, calling the LLM chain on a miss."""
+    key = _response_cache_key(prompt)
+    cached = _cached_response(prompt, key)
+    if cached is not None:
+        return (True, cached)
+
+    (is_successful, response), shared = _generation_flights.do(key, _call_llm_and_cache, prompt, key)
+    if shared:
+        instrumentation.count("single_flight", path="generation", role="follower")
+    return (is_successful, response)
+
+def _call_llm_and_cache(prompt: str, key: tuple) -> Tuple[bool, str]:
+    is_successful, response = _call_llm_safely(prompt)
     if is_successful:
-        return (True, llm_response)
-            
-    # Fallback to predefined responses if all APIs fail
-    print("Debug - All LLM services failed. Using predefined fallback responses.")
+        # Only successful responses are cached so outages are retried on the next request
+        _store_response(prompt, key, response)
+    return (is_successful, response)
+
+def get_response_cache_stats() -> Dict[str, int]:
+    """Returns hit/miss/eviction counters of the generation response cache."""
+    return _response_cache.stats()
+
+def get_similarity_cache_stats() -> Dict[str, int]:
+    """Returns hit/miss/eviction counters of the near-duplicate prompt index."""
+    return _similar_prompts.stats()
+
+def get_provider_health() -> Dict[str, Dict[str, object]]:
+    """Returns the circuit breaker state of each LLM provider."""
+    return get_circuit_states()
+
+def get_single_flight_stats() -> Dict[str, Dict[str, int]]:
+    """Returns how many generation, evaluation and streaming requests joined an identical in-flight call."""
+    return {
+        "generation": _generation_flights.stats(),
+        "evaluation": _evaluation_flights.stats(),
+        "stream": _stream_flights.stats(),
+    }
+
+def get_rate_limit_stats() -> Dict[str, Dict[str, object]]:
+    """Returns the rate limiter queue depth and wait times of each LLM provider."""
+    return get_rate_limiter_states()
+
+def clear_response_cache() -> None:
+    """Empties the generation response cache and the near-duplicate prompt index."""
+    _response_cache.clear()
+    _similar_prompts.clear()
+
+def _check_prompt_safety(prompt: str, custom_guidelines: Optional[List[str]] = None) -> Optional[Tuple[bool, str]]:
+    """Returns a (False, reason) rejection if the prompt is unsafe, otherwise None."""
+    with instrumentation.span("keyword_scan", kind="prompt_safety") as span:
+        # Check for unsafe content before calling any API
+        if _UNSAFE_MATCHER.contains_any(prompt):
+            span.set(result="unsafe")
+            return (False, "I am unable to generate a response to this prompt as it may violate safety guidelines.")
+        
+        # Check against custom guidelines
+        if custom_guidelines and get_keyword_matcher(custom_guidelines).contains_any(prompt):
+            span.set(result="checklist_conflict")
+            return (False, "I am unable to generate a response as it conflicts with the provided ethical checklist.")
+        span.set(result="safe")
+        return None
+
+def _predefined_explanation(prompt: str) -> Tuple[bool, str]:
+    """Predefined responses for the Q&A page when all LLM services fail."""
+    instrumentation.count("predefined_fallback", page="qa")
+    prompt_lower = prompt.lower()
     topic_responses = {
         "photosynthesis": "**Photosynthesis Explained:**\n\nPhotosynthesis is the process plants use to convert light energy into chemical energy...\n\n**Practice Question:** What are the three main 'ingredients' a plant needs for photosynthesis?",
         "gravity": "**Understanding Gravity:**\n\nGravity is the invisible force that pulls objects toward each other...\n\n**Practice Question:** Why do you fall back to the ground when you jump?",
@@ -169,97 +440,337 @@ def generate_safe_text(prompt: str, custom_guidelines: Optional[List[str]] = Non
     # Generic fallback if no specific topic matches
     return (False, f"LLM services are currently unavailable. Unable to generate a response for '{prompt.title()}'.")
 
+def _predefined_free_text(prompt: str) -> Tuple[bool, str]:
+    """Predefined responses for free text generation when all LLM services fail."""
+    instrumentation.count("predefined_fallback", page="free_text")
+    prompt_lower = prompt.lower()
+    for topic in ["photosynthesis", "gravity", "machine learning"]:
+        if topic in prompt_lower:
+            return (True, f"Here's information about {topic}...")
+    
+    # Generic fallback
+    return (False, f"LLM services are currently unavailable. Unable to generate a response for '{prompt.title()}'.")
+
+def generate_safe_text(prompt: str, custom_guidelines: Optional[List[str]] = None) -> Tuple[bool, str]:
+    """
+    Generates safe educational content using LLMs with fallbacks.
+    Returns a tuple: (is_safe, response_text).
+    """
+    rejection = _check_prompt_safety(prompt, custom_guidelines)
+    if rejection:
+        return rejection
+    
+    # Try LLM with fallback logic, serving repeat prompts from the cache, within the request deadline
+    with deadline_scope():
+        is_successful, llm_response = _call_llm_cached(prompt)
+    if is_successful:
+        return (True, llm_response)
+            
+    # Fallback to predefined responses if all APIs fail
+    return _predefined_explanation(prompt)
+
 def generate_safe_free_text(prompt: str, custom_guidelines: Optional[List[str]] = None) -> Tuple[bool, str]:
     """
     Generates safe educational content using LLMs with fallbacks.
     Returns a tuple: (is_safe, response_text).
     """
     # First check if the prompt itself is safe
-    prompt_lower = prompt.lower()
-    
-    # Check for unsafe content in prompt before calling any API
-    if any(keyword in prompt_lower for keyword in UNSAFE_KEYWORDS):
-        return (False, "I am unable to generate a response to this prompt as it may violate safety guidelines.")
-    
-    # Check against custom guidelines
-    if custom_guidelines and any(keyword.lower() in prompt_lower for keyword in custom_guidelines):
-        return (False, "I am unable to generate a response as it conflicts with the provided ethical checklist.")
+    rejection = _check_prompt_safety(prompt, custom_guidelines)
+    if rejection:
+        return rejection
     
-    # If prompt is safe, generate content
-    is_successful, llm_response = _call_llm_safely(prompt)
+    # If prompt is safe, generate content, serving repeat prompts from the cache, within the request deadline
+    with deadline_scope():
+        is_successful, llm_response = _call_llm_cached(prompt)
     if is_successful:
         return (True, llm_response)
     
     # Fallback to predefined responses if API fails
-    for topic in ["photosynthesis", "gravity", "machine learning"]:
-        if topic in prompt_lower:
-            return (True, f"Here's information about {topic}...")
-    
-    # Generic fallback
-    return (False, f"LLM services are currently unavailable. Unable to generate a response for '{prompt.title()}'.")
+    return _predefined_free_text(prompt)
 
-def _call_gemini_for_evaluation(text_to_evaluate: str, principles_to_check: List[str]) -> Tuple[bool, str]:
-    """Call Google Gemini 1.5 Flash API for content evaluation."""
-    gemini_api_key = getattr(st.secrets, 'GEMINI_API_TOKEN', os.getenv('GEMINI_API_TOKEN', ''))
-    if not gemini_api_key:
-        return (False, "Gemini API key not found.")
+# Streaming generation: chunks are yielded as the provider produces them
+
+class _StreamUnavailable(Exception):
+    """Raised by a streaming provider that fails before producing any text."""
+
+_ttft_window = LatencyWindow()
+
+class TextStream:
+    """
+    Iterable of generated text chunks, e.g. for st.write_stream.
+    is_safe, text and time_to_first_token are final once iteration has finished.
+    """
+
+    def __init__(self, chunks: Iterator[str], is_safe: bool = True, text: str = ""):
+        self._chunks = chunks
+        self.is_safe = is_safe
+        self.text = text
+        self.time_to_first_token: Optional[float] = None
+
+    def __iter__(self) -> Iterator[str]:
+        start = time.perf_counter()
+        try:
+            for chunk in self._chunks:
+                if not chunk:
+                    continue
+                if self.time_to_first_token is None:
+                    self.time_to_first_token = time.perf_counter() - start
+                    _ttft_window.record(self.time_to_first_token)
+                self.text += chunk
+                yield chunk
+        finally:
+            # A consumer that stops early closes the provider stream now rather than when it is garbage collected
+            close = getattr(self._chunks, "close", None)
+            if close is not None:
+                close()
 
-    genai.configure(api_key=gemini_api_key)
+def _stream_gemini_api(prompt: str) -> Iterator[str]:
+    """Yields text chunks from Gemini with stream=True."""
+    return _stream_gemini(_generation_request(prompt))
 
+def _stream_mistral_api(prompt: str) -> Iterator[str]:
+    """Yields tokens from the Hugging Face text-generation server-sent event stream."""
+    headers = _mistral_headers()
+    if headers is None:
+        raise _StreamUnavailable(MISTRAL_TOKEN_MISSING_MESSAGE)
+    _, payload = _mistral_request(prompt)
+    payload["stream"] = True
+    if deadline_expired():
+        raise _StreamUnavailable(DEADLINE_EXCEEDED_MESSAGE)
     try:
-        model = genai.GenerativeModel('gemini-1.5-flash-8b')
-
-        system_prompt = f"""You are an expert AI content safety evaluator. Your task is to analyze the user-provided text based on a specific list of principles.
-            The principles to check are: {", ".join(principles_to_check)}.
-            Your response MUST be a valid JSON object.
-            The JSON object should have a key for each principle you were asked to evaluate.
-            The value for each key should be a list of strings.
-            - If you find specific issues related to a principle, each string in the list should describe one issue found.
-            - If you find no issues for a principle, the list should contain a single string: "No issues detected."
-            Do not include any text outside of the JSON object itself.
-            """
-        messages = [
-            {"role": "user", "parts": [system_prompt]},
-            {"role": "model", "parts": [f"Okay, I will analyze the text against the following principles: {', '.join(principles_to_check)} and return a single JSON object with the results."]},
-            {"role": "user", "parts": [text_to_evaluate]}
-        ]
-        
-        response = model.generate_content(
-            messages,
-            generation_config=genai.types.GenerationConfig(
-                max_output_tokens=1024,
-                temperature=0.1,
-            ),
-        )
-        print(f"Debug - Gemini API response for evaluate test: {response}.")
-        if response.parts:
-            raw_text = response.parts[0].text
-            # Clean up the response to ensure it's valid JSON
-            json_text = raw_text.strip().lstrip("```json").rstrip("```")
-            return (True, json_text)
-        elif response.candidates:
-            for candidate in response.candidates:
-                if candidate.content and candidate.content.parts:
-                    raw_text = candidate.content.parts[0].text
-                    json_text = raw_text.strip().lstrip("```json").rstrip("```")
-                    return (True, json_text)
-
-        return (False, "No valid content found in Gemini API response.")
-    except Exception as e:
-        return (False, f"Error calling Gemini API for evaluation: {e}")
+        response = post_with_retries(MISTRAL_API_URL, headers=headers, json=payload, stream=True)
+    except _request_errors() as e:
+        raise _StreamUnavailable(f"Mistral API connection error: {e}")
+    if response.status_code != 200:
+        raise _StreamUnavailable(f"Mistral API error ({response.status_code})")
+    with response:
+        for line in response.iter_lines():
+            if not line.startswith(b"data:"):
+                continue
+            event = json.loads(line[len(b"data:"):])
+            event_token = event.get("token") or {}
+            if not event_token.get("special"):
+                yield event_token.get("text", "")
+
+def _stream_providers(prompt: str, key: tuple, on_chunk: Optional[Callable[[str], None]] = None) -> Generator[str, None, bool]:
+    """
+    Streams from Gemini or Mistral in that order; returns True if any text was produced.
+    Once the request deadline has passed no further provider is tried, and a stream is cut off between chunks.
+    """
+    for name, provider in (("gemini", _stream_gemini_api), ("mistral", _stream_mistral_api)):
+        if deadline_expired():
+            instrumentation.count("deadline_exceeded", provider=name)
+            break
+        breaker = get_circuit_breaker(name)
+        if not breaker.allow_request():
+            continue
+        if not acquire_provider_slot(name):
+            breaker.release()
+            continue
+        produced = []
+        chunks = provider(prompt)
+        try:
+            for chunk in chunks:
+                produced.append(chunk)
+                if on_chunk:
+                    on_chunk(chunk)
+                yield chunk
+                if deadline_expired():
+                    break
+        except GeneratorExit:
+            # The consumer stopped reading (job cancelled, page rerun), which says nothing about the provider
+            breaker.release()
+            raise
+        except _StreamUnavailable as e:
+            instrumentation.count("llm_stream", provider=name, status="unavailable", reason=_failure_reason(str(e)))
+            breaker.record_outcome(False, str(e))
+            continue
+        except Exception as e:
+            breaker.record_failure(str(e))
+            if not produced:
+                instrumentation.count("llm_stream", provider=name, status="error", error=str(e))
+                continue
+            # Text already reached the user, so the partial answer stands
+            instrumentation.count("llm_stream", provider=name, status="interrupted", chunks=len(produced), error=str(e))
+            return True
+        if produced and deadline_expired():
+            # The provider was answering, but the budget ran out: the partial text stands and is not cached
+            close = getattr(chunks, "close", None)
+            if close is not None:
+                close()
+            breaker.record_success()
+            instrumentation.count("llm_stream", provider=name, status="deadline", chunks=len(produced))
+            return True
+        if produced:
+            breaker.record_success()
+            instrumentation.count("llm_stream", provider=name, status="ok", chunks=len(produced))
+            _store_response(prompt, key, "".join(produced))
+            return True
+        # An empty (e.g. safety-blocked) stream is about this prompt, not the provider's health
+        instrumentation.count("llm_stream", provider=name, status="empty")
+        breaker.release()
+    return False
+
+def _stream_llm_cached(prompt: str, fallback: Callable[[str], Tuple[bool, str]], stream: TextStream) -> Iterator[str]:
+    """Streams from the cache, the identical in-flight stream or the providers, then the predefined fallback."""
+    key = _response_cache_key(prompt)
+    cached = _cached_response(prompt, key, mode="stream")
+    if cached is not None:
+        yield cached
+        return
+
+    broadcast, is_leader = _stream_flights.join(key)
+    if is_leader:
+        produced, finished = False, False
+        try:
+            produced = yield from _stream_providers(prompt, key, broadcast.publish)
+            finished = True
+        finally:
+            _stream_flights.finish(key, broadcast, completed=finished)
+    else:
+        # Replay the identical stream already in flight instead of opening another provider stream
+        instrumentation.count("single_flight", path="stream", role="follower")
+        produced = False
+        for chunk in broadcast.subscribe():
+            produced = True
+            yield chunk
+        if not produced and not broadcast.completed:
+            # The leading request was abandoned before any text arrived, so try the providers directly
+            produced = yield from _stream_providers(prompt, key)
+
+    if produced:
+        return
+    is_safe, response = fallback(prompt)
+    if is_safe:
+        yield response
+    else:
+        stream.is_safe = False
+        stream.text = response
+
+def _stream_safe(prompt: str, custom_guidelines: Optional[List[str]], fallback: Callable[[str], Tuple[bool, str]]) -> TextStream:
+    rejection = _check_prompt_safety(prompt, custom_guidelines)
+    if rejection:
+        return TextStream(iter(()), is_safe=False, text=rejection[1])
+    stream = TextStream(iter(()))
+    # Provider calls made while the stream is read share one request deadline
+    stream._chunks = iterate_within_deadline(_stream_llm_cached(prompt, fallback, stream))
+    return stream
+
+def stream_safe_text(prompt: str, custom_guidelines: Optional[List[str]] = None) -> TextStream:
+    """
+    Streaming counterpart of generate_safe_text.
+    Rejected prompts and unavailable services yield nothing and set is_safe to False with the reason in text.
+    """
+    return _stream_safe(prompt, custom_guidelines, _predefined_explanation)
+
+def stream_safe_free_text(prompt: str, custom_guidelines: Optional[List[str]] = None) -> TextStream:
+    """Streaming counterpart of generate_safe_free_text."""
+    return _stream_safe(prompt, custom_guidelines, _predefined_free_text)
+
+def get_streaming_stats() -> Dict[str, Optional[float]]:
+    """Returns time-to-first-token percentiles (seconds) of recent streamed responses."""
+    return {
+        "samples": len(_ttft_window),
+        "ttft_p50": _ttft_window.percentile(50),
+        "ttft_p95": _ttft_window.percentile(95),
+    }
+
+def _evaluation_messages(text_to_evaluate: str, principles_to_check: List[str]) -> List[Dict]:
+    """Builds the Gemini messages asking for a JSON evaluation against the principles."""
+    system_prompt = compact_prompt(f"""You are an expert AI content safety evaluator. Your task is to analyze the user-provided text based on a specific list of principles.
+        The principles to check are: {", ".join(principles_to_check)}.
+        Your response MUST be a valid JSON object.
+        The JSON object should have a key for each principle you were asked to evaluate.
+        The value for each key should be a list of strings.
+        - If you find specific issues related to a principle, each string in the list should describe one issue found.
+        - If you find no issues for a principle, the list should contain a single string: "No issues detected."
+        Do not include any text outside of the JSON object itself.
+        """)
+    return [
+        {"role": "user", "parts": [system_prompt]},
+        {"role": "model", "parts": [f"Okay, I will analyze the text against the following principles: {', '.join(principles_to_check)} and return a single JSON object with the results."]},
+        {"role": "user", "parts": [text_to_evaluate]}
+    ]
+
+def _clean_json_text(raw_text: str) -> str:
+    """Clean up the response to ensure it's valid JSON."""
+    return strip_code_fence(raw_text)
+
+def _call_gemini_for_evaluation(text_to_evaluate: str, principles_to_check: List[str]) -> Tuple[bool, str]:
+    """Call the Gemini model chosen by the model router for content evaluation."""
+    return _send_gemini(_evaluation_request(text_to_evaluate, principles_to_check))
+
+def _evaluation_flight_key(text_to_evaluate: str, principles_to_check: List[str]) -> tuple:
+    return (text_to_evaluate, tuple(principles_to_check))
 
 def _call_llm_for_evaluation_safely(text_to_evaluate: str, principles_to_check: List[str]) -> Tuple[bool, str]:
     """
     Call Gemini for evaluation with a structure that allows for future fallbacks.
+    Identical evaluations already in flight share that call's result.
     """
-    is_successful, response = _call_gemini_for_evaluation(text_to_evaluate, principles_to_check)
-    if is_successful:
-        return (True, response)
-    
-    # Placeholder for a future fallback to another evaluation model
-    print("Debug - Gemini evaluation API failed. No fallback available.")
-    return (False, response)
+    (is_successful, response), shared = _evaluation_flights.do(
+        _evaluation_flight_key(text_to_evaluate, principles_to_check),
+        lambda: call_provider_with_retries("gemini", _call_gemini_for_evaluation, text_to_evaluate, principles_to_check,
+                                           priority=PRIORITY_EVALUATION),
+    )
+    return _note_evaluation_call(is_successful, response, shared)
 
+def _note_evaluation_call(is_successful: bool, response: str, shared: bool) -> Tuple[bool, str]:
+    """Counts a joined in-flight evaluation, or an evaluation that failed with no fallback left."""
+    if shared:
+        instrumentation.count("single_flight", path="evaluation", role="follower")
+    elif not is_successful:
+        # Placeholder for a future fallback to another evaluation model
+        instrumentation.count("llm_fallback", provider="none", purpose="evaluation", reason=_failure_reason(response))
+    return (is_successful, response)
+
+def _parse_evaluation_response(is_successful: bool, response_str: str, principles_to_check: List[str]) -> Dict[str, List[str]]:
+    """Turns an evaluation call result into the per-principle feedback dict."""
+    return _parse_evaluation_result(is_successful, response_str, principles_to_check)[0]
+
+def _parse_evaluation_result(is_successful: bool, response_str: str, principles_to_check: List[str]) -> Tuple[Dict[str, List[str]], bool]:
+    """Like _parse_evaluation_response, also returning whether the response was complete and answered every principle."""
+    if not is_successful:
+        # If the API call itself fails, return the error message
+        return {"API Error": [response_str]}, False
+    with instrumentation.span("parse", kind="evaluation") as span:
+        # The response from the LLM is expected to be a JSON object, possibly cut off by max_output_tokens
+        parser = IncrementalObjectParser()
+        parser.feed(response_str)
+        try:
+            parser.close()
+        except ValueError:
+            span.set(status="error")
+            return {"API Error": [f"Failed to decode the API's JSON response: {response_str}"]}, False
+        if parser.truncated:
+            span.set(truncated=1)
+            if not parser.result:
+                span.set(status="error")
+                return {"API Error": [f"Failed to decode the API's JSON response: {response_str}"]}, False
+        feedback = parser.result
+        complete = not parser.truncated
+        # Ensure all requested principles are in the feedback dict, even if the LLM missed one
+        for principle in principles_to_check:
+            if principle not in feedback:
+                span.set(missing_principles=1)
+                feedback[principle] = ["The LLM evaluation did not return a result for this principle."]
+                complete = False
+        return feedback, complete
+
+def _evaluation_store_key(text_to_evaluate: str, principles_to_check: List[str]) -> str:
+    """Result store key: the text, principles and evaluation model settings."""
+    return content_hash("evaluation", text_to_evaluate, list(principles_to_check), get_model_router().label(GEMINI_EVALUATION_MODEL),
+                        GEMINI_EVALUATION_CONFIG)
+
+def _load_stored_evaluation(store_key: str) -> Optional[Dict[str, List[str]]]:
+    feedback = load_result(store_key)
+    if feedback is not None:
+        instrumentation.count("result_store", status="hit", kind="evaluation")
+    return feedback
+
+def _store_evaluation(store_key: str, text_to_evaluate: str, principles_to_check: List[str], feedback: Dict[str, List[str]]) -> None:
+    save_result(store_key, feedback, "evaluation", get_model_router().label(GEMINI_EVALUATION_MODEL), text_to_evaluate,
+                list(principles_to_check))
 
 def evaluate_text(text_to_evaluate: str, principles_to_check: List[str], custom_checklist: Optional[List[str]] = None) -> Dict[str, List[str]]:
     """
@@ -268,36 +779,451 @@ def evaluate_text(text_to_evaluate: str, principles_to_check: List[str], custom_
     """
     feedback = {}
 
-    # Step 1: Call LLM safely to get evaluation based on standard principles
+    # Step 1: Reuse a stored result, or call LLM safely to get evaluation based on standard principles
     if principles_to_check:
-        is_successful, response_str = _call_llm_for_evaluation_safely(text_to_evaluate, principles_to_check)
-        if is_successful:
-            try:
-                # The response from the LLM is expected to be a JSON string
-                feedback = json.loads(response_str)
-                # Ensure all requested principles are in the feedback dict, even if the LLM missed one
-                for principle in principles_to_check:
-                    if principle not in feedback:
-                        feedback[principle] = ["The LLM evaluation did not return a result for this principle."]
-            except json.JSONDecodeError:
-                feedback = {"API Error": [f"Failed to decode the API's JSON response: {response_str}"]}
+        store_key = _evaluation_store_key(text_to_evaluate, principles_to_check)
+        stored = _load_stored_evaluation(store_key)
+        if stored is not None:
+            feedback = stored
+        elif estimate_tokens(text_to_evaluate) > LONG_TEXT_THRESHOLD_TOKENS:
+            # Long documents are split into chunks evaluated in parallel, so the JSON output is not truncated
+            with deadline_scope():
+                feedback = evaluate_long_text(text_to_evaluate, principles_to_check)
+            if "API Error" not in feedback:
+                _store_evaluation(store_key, text_to_evaluate, principles_to_check, feedback)
         else:
-            # If the API call itself fails, return the error message
-            feedback = {"API Error": [response_str]}
+            with deadline_scope():
+                is_successful, response_str = _call_llm_for_evaluation_safely(text_to_evaluate, principles_to_check)
+            feedback, complete = _parse_evaluation_result(is_successful, response_str, principles_to_check)
+            if complete:
+                _store_evaluation(store_key, text_to_evaluate, principles_to_check, feedback)
 
     # Step 2: Evaluate against the local custom educator checklist
     if custom_checklist:
-        text_lower = text_to_evaluate.lower()
-        custom_issues = [f"Detected text that matches custom checklist item: '{item}'." for item in custom_checklist if item.lower() in text_lower]
-        if custom_issues:
-            # Add to feedback dictionary, creating the key if it doesn't exist
-            if "Custom Educator Checklist" in feedback:
-                feedback["Custom Educator Checklist"].extend(custom_issues)
-            else:
-                feedback["Custom Educator Checklist"] = custom_issues
+        _apply_custom_checklist(feedback, text_to_evaluate, custom_checklist)
             
     return feedback
 
+def _stream_gemini_for_evaluation(text_to_evaluate: str, principles_to_check: List[str]) -> Iterator[str]:
+    """Yields the evaluation JSON from Gemini in chunks as it is generated."""
+    return _stream_gemini(_evaluation_request(text_to_evaluate, principles_to_check))
+
+def _stream_evaluation(text_to_evaluate: str, principles_to_check: List[str]) -> Generator[Tuple[str, List[str]], None, bool]:
+    """
+    Yields (principle, findings) from a streamed Gemini evaluation as each member of its JSON object completes.
+    Returns True if the response was complete and answered every principle.
+    """
+    breaker = get_circuit_breaker("gemini")
+    if not breaker.allow_request():
+        # The non-streaming path reports the open circuit without calling Gemini
+        yield from evaluate_text(text_to_evaluate, principles_to_check).items()
+        return False
+    if not acquire_provider_slot("gemini", PRIORITY_EVALUATION):
+        breaker.release()
+        yield ("API Error", [DEADLINE_EXCEEDED_MESSAGE if deadline_expired() else
+                             "Gemini is busy: the evaluation waited too long in the rate limit queue. Please try again."])
+        return False
+
+    parser = IncrementalObjectParser()
+    raw_chunks: List[str] = []
+    error = None
+    try:
+        chunks = _stream_gemini_for_evaluation(text_to_evaluate, principles_to_check)
+        for chunk in chunks:
+            raw_chunks.append(chunk)
+            yield from parser.feed(chunk)
+            if deadline_expired():
+                # Principles completed so far stand; the rest are reported as missing below
+                error = DEADLINE_EXCEEDED_MESSAGE
+                breaker.release()
+                instrumentation.count("llm_stream", provider="gemini", purpose="evaluation", status="deadline", chunks=len(raw_chunks))
+                close = getattr(chunks, "close", None)
+                if close is not None:
+                    close()
+                break
+    except GeneratorExit:
+        breaker.release()
+        raise
+    except _StreamUnavailable as e:
+        breaker.record_outcome(False, str(e))
+        instrumentation.count("llm_stream", provider="gemini", purpose="evaluation", status="unavailable", reason=_failure_reason(str(e)))
+        instrumentation.count("llm_fallback", provider="none", purpose="evaluation", reason=_failure_reason(str(e)))
+        yield ("API Error", [str(e)])
+        return False
+    except Exception as e:
+        # Whatever arrived before the interruption is still repaired and shown below
+        error = f"Error calling Gemini API for evaluation: {e}"
+        breaker.record_failure(error)
+        instrumentation.count("llm_stream", provider="gemini", purpose="evaluation", status="interrupted", error=str(e))
+
+    with instrumentation.span("parse", kind="evaluation_stream") as span:
+        try:
+            repaired = parser.close()
+        except ValueError:
+            span.set(status="error")
+            if error is None:
+                # Gemini answered, but with nothing usable (e.g. a safety-blocked response)
+                breaker.release()
+            yield ("API Error", [error or f"Failed to decode the API's JSON response: {''.join(raw_chunks)}"])
+            return False
+        if parser.truncated:
+            span.set(truncated=1)
+    if error is None:
+        breaker.record_success()
+        instrumentation.count("llm_stream", provider="gemini", purpose="evaluation", status="ok", chunks=len(raw_chunks))
+    yield from repaired
+    complete = error is None and not parser.truncated
+    for principle in principles_to_check:
+        if principle not in parser.result:
+            complete = False
+            yield (principle, ["The LLM evaluation did not return a result for this principle."])
+    return complete
+
+def evaluate_text_stream(text_to_evaluate: str, principles_to_check: List[str], custom_checklist: Optional[List[str]] = None) -> Iterator[Tuple[str, List[str]]]:
+    """
+    Streaming counterpart of evaluate_text, yielding (principle, findings) as soon as each principle's result is complete.
+    Long documents are evaluated in chunks as in evaluate_text, so their results arrive together.
+    Provider calls made while the stream is read share one request deadline.
+    """
+    return iterate_within_deadline(_evaluate_text_stream(text_to_evaluate, principles_to_check, custom_checklist))
+
+def _evaluate_text_stream(text_to_evaluate: str, principles_to_check: List[str], custom_checklist: Optional[List[str]]) -> Iterator[Tuple[str, List[str]]]:
+    if principles_to_check:
+        store_key = _evaluation_store_key(text_to_evaluate, principles_to_check)
+        stored = _load_stored_evaluation(store_key)
+        if stored is not None:
+            yield from stored.items()
+        elif estimate_tokens(text_to_evaluate) > LONG_TEXT_THRESHOLD_TOKENS:
+            feedback = evaluate_long_text(text_to_evaluate, principles_to_check)
+            if "API Error" not in feedback:
+                _store_evaluation(store_key, text_to_evaluate, principles_to_check, feedback)
+            yield from feedback.items()
+        else:
+            feedback = {}
+            stream = _stream_evaluation(text_to_evaluate, principles_to_check)
+            try:
+                while True:
+                    try:
+                        principle, findings = next(stream)
+                    except StopIteration as done:
+                        if done.value:
+                            _store_evaluation(store_key, text_to_evaluate, principles_to_check, feedback)
+                        break
+                    feedback[principle] = findings
+                    yield (principle, findings)
+            finally:
+                stream.close()
+
+    if custom_checklist:
+        checklist_feedback: Dict[str, List[str]] = {}
+        _apply_custom_checklist(checklist_feedback, text_to_evaluate, custom_checklist)
+        yield from checklist_feedback.items()
+
+def _is_no_issue_finding(finding: str) -> bool:
+    finding_lower = finding.lower()
+    return finding_lower.startswith("no issues") or "no specific issues" in finding_lower
+
+def _merge_chunk_feedback(chunk_results: List[Tuple[Tuple[int, int], Dict[str, List[str]]]], principles_to_check: List[str]) -> Dict[str, List[str]]:
+    """
+    Merges per-chunk feedback, de-duplicating findings and tagging each with its chunk offsets.
+    A principle is reported clean only if some chunk was evaluated and no evaluated chunk found an issue;
+    if every chunk failed, only the errors are returned, as from a single failed call.
+    """
+    if all("API Error" in feedback for _, feedback in chunk_results):
+        errors = [error for _, feedback in chunk_results for error in feedback["API Error"]]
+        return {"API Error": list(dict.fromkeys(errors))}
+    merged: Dict[str, Dict[str, Tuple[str, List[str]]]] = {}
+    for (start, end), feedback in chunk_results:
+        for key, findings in feedback.items():
+            for finding in findings:
+                if _is_no_issue_finding(finding):
+                    continue
+                normalized = re.sub(r"[\W_]+", " ", finding).strip().lower()
+                entries = merged.setdefault(key, {})
+                entry = entries.setdefault(normalized, (finding, []))
+                entry[1].append(f"{start}-{end}")
+
+    result: Dict[str, List[str]] = {}
+    for key in list(principles_to_check) + [key for key in merged if key not in principles_to_check]:
+        entries = merged.get(key)
+        if entries:
+            result[key] = [f"[chars {', '.join(offsets)}] {finding}" for finding, offsets in entries.values()]
+        elif key in principles_to_check:
+            result[key] = ["No issues detected."]
+    return result
+
+def evaluate_long_text(text_to_evaluate: str, principles_to_check: List[str], custom_checklist: Optional[List[str]] = None,
+                       chunk_tokens: int = LONG_TEXT_CHUNK_TOKENS, max_parallel: int = LONG_TEXT_MAX_PARALLEL) -> Dict[str, List[str]]:
+    """
+    Evaluates a long document in token-budgeted chunks with bounded parallelism.
+    Findings are merged per principle, de-duplicated, and prefixed with the character offsets of their chunks.
+    """
+    chunks = split_text(text_to_evaluate, chunk_tokens)
+
+    def evaluate_chunk(span: Tuple[int, int]) -> Dict[str, List[str]]:
+        return _parse_evaluation_response(*_call_llm_for_evaluation_safely(text_to_evaluate[span[0]:span[1]], principles_to_check),
+                                          principles_to_check)
+
+    feedback = {}
+    if principles_to_check and chunks:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_parallel, len(chunks))), thread_name_prefix="eval-chunk") as pool:
+            # Chunks run in copies of the caller's context, so they share its deadline and session id
+            futures = [pool.submit(contextvars.copy_context().run, evaluate_chunk, span) for span in chunks]
+            chunk_feedback = [future.result() for future in futures]
+        feedback = _merge_chunk_feedback(list(zip(chunks, chunk_feedback)), principles_to_check)
+
+    if custom_checklist:
+        _apply_custom_checklist(feedback, text_to_evaluate, custom_checklist)
+    return feedback
+
+async def evaluate_long_text_async(text_to_evaluate: str, principles_to_check: List[str], custom_checklist: Optional[List[str]] = None,
+                                   chunk_tokens: int = LONG_TEXT_CHUNK_TOKENS, max_parallel: int = LONG_TEXT_MAX_PARALLEL) -> Dict[str, List[str]]:
+    """Async counterpart of evaluate_long_text; at most max_parallel chunks are awaited at once."""
+    chunks = split_text(text_to_evaluate, chunk_tokens)
+    limit = asyncio.Semaphore(max(1, max_parallel))
+
+    async def evaluate_chunk(span: Tuple[int, int]) -> Dict[str, List[str]]:
+        async with limit:
+            result = await _call_llm_for_evaluation_safely_async(text_to_evaluate[span[0]:span[1]], principles_to_check)
+        return _parse_evaluation_response(*result, principles_to_check)
+
+    feedback = {}
+    if principles_to_check and chunks:
+        chunk_feedback = await asyncio.gather(*(evaluate_chunk(span) for span in chunks))
+        feedback = _merge_chunk_feedback(list(zip(chunks, chunk_feedback)), principles_to_check)
+
+    if custom_checklist:
+        _apply_custom_checklist(feedback, text_to_evaluate, custom_checklist)
+    return feedback
+
+def _apply_custom_checklist(feedback: Dict[str, List[str]], text_to_evaluate: str, custom_checklist: List[str]) -> None:
+    """Adds local keyword matches against the educator checklist to the feedback dict."""
+    with instrumentation.span("keyword_scan", kind="checklist"):
+        matched_items = get_keyword_matcher(custom_checklist).matched_keywords(text_to_evaluate)
+    custom_issues = [f"Detected text that matches custom checklist item: '{item}'." for item in matched_items]
+    if custom_issues:
+        # Add to feedback dictionary, creating the key if it doesn't exist
+        if "Custom Educator Checklist" in feedback:
+            feedback["Custom Educator Checklist"].extend(custom_issues)
+        else:
+            feedback["Custom Educator Checklist"] = custom_issues
+
+def _pack_evaluation_batches(indices: List[int], texts: List[str], principles_to_check: List[str]) -> List[List[int]]:
+    """Groups text indices so each batch's expected output fits in max_output_tokens."""
+    output_per_text = BATCH_OUTPUT_TOKENS_PER_PRINCIPLE * len(principles_to_check) + BATCH_OUTPUT_TOKENS_PER_TEXT
+    output_budget = GEMINI_BATCH_EVALUATION_CONFIG["max_output_tokens"]
+    batches, current, current_input = [], [], 0
+    for index in indices:
+        input_tokens = estimate_tokens(texts[index])
+        full = (
+            len(current) >= BATCH_MAX_TEXTS
+            or (len(current) + 1) * output_per_text > output_budget
+            or current_input + input_tokens > BATCH_MAX_INPUT_TOKENS
+        )
+        if current and full:
+            batches.append(current)
+            current, current_input = [], 0
+        current.append(index)
+        current_input += input_tokens
+    if current:
+        batches.append(current)
+    return batches
+
+def _batch_evaluation_request(items: List[Tuple[str, str]], principles_to_check: List[str]) -> _GeminiRequest:
+    """Builds one Gemini request evaluating several (id, text) items against the principles."""
+    system_prompt = compact_prompt(f"""You are an expert AI content safety evaluator. Your task is to analyze each user-provided text based on a specific list of principles.
+        The principles to check are: {", ".join(principles_to_check)}.
+        The texts are given as a JSON array of objects with an "id" and a "text".
+        Your response MUST be a valid JSON object with one key per text id.
+        The value for each id should be a JSON object with a key for each principle you were asked to evaluate.
+        The value for each principle should be a list of strings.
+        - If you find specific issues related to a principle, each string in the list should describe one issue found.
+        - If you find no issues for a principle, the list should contain a single string: "No issues detected."
+        Evaluate every text independently. Do not include any text outside of the JSON object itself.
+        """)
+    payload = json.dumps([{"id": item_id, "text": text} for item_id, text in items], ensure_ascii=False)
+    messages = [
+        {"role": "user", "parts": [system_prompt]},
+        {"role": "model", "parts": [f"Okay, I will analyze each text against the following principles: {', '.join(principles_to_check)} and return a single JSON object keyed by text id."]},
+        {"role": "user", "parts": [payload]}
+    ]
+    return _GeminiRequest("batch_evaluation", GEMINI_EVALUATION_MODEL, GEMINI_BATCH_EVALUATION_CONFIG, messages,
+                          "Error calling Gemini API for batch evaluation", missing_key_message="Gemini API key not found.")
+
+def _call_gemini_for_batch_evaluation(items: List[Tuple[str, str]], principles_to_check: List[str]) -> Tuple[bool, str]:
+    """Call Gemini once to evaluate several (id, text) items against the principles."""
+    return _send_gemini(_batch_evaluation_request(items, principles_to_check))
+
+def evaluate_text_batch(texts: List[str], principles_to_check: List[str], custom_checklist: Optional[List[str]] = None, max_retries: int = 1) -> List[Dict[str, List[str]]]:
+    """
+    Evaluates many texts, packing several into each Gemini request.
+    Texts the model leaves out of a response are re-requested on their own, up to max_retries times.
+    Returns one feedback dictionary per text, in input order, shaped like evaluate_text's result.
+    """
+    results: List[Dict[str, List[str]]] = [{} for _ in texts]
+
+    if principles_to_check:
+        pending = list(range(len(texts)))
+        for _ in range(max_retries + 1):
+            missing = []
+            for batch in _pack_evaluation_batches(pending, texts, principles_to_check):
+                items = [(f"t{index}", texts[index]) for index in batch]
+                with deadline_scope():
+                    is_successful, response_str = call_provider_with_retries("gemini", _call_gemini_for_batch_evaluation, items,
+                                                                             principles_to_check, priority=PRIORITY_BATCH)
+                if not is_successful:
+                    for index in batch:
+                        results[index] = {"API Error": [response_str]}
+                    continue
+                # Only texts whose feedback arrived in full are kept; a truncated tail is re-requested
+                parser = IncrementalObjectParser()
+                parser.feed(response_str)
+                parsed = parser.result
+                for item_id, index in zip((item_id for item_id, _ in items), batch):
+                    item_feedback = parsed.get(item_id)
+                    if isinstance(item_feedback, dict):
+                        for principle in principles_to_check:
+                            if principle not in item_feedback:
+                                item_feedback[principle] = ["The LLM evaluation did not return a result for this principle."]
+                        results[index] = item_feedback
+                    else:
+                        missing.append(index)
+            pending = missing
+            if not pending:
+                break
+        for index in pending:
+            results[index] = {principle: ["The LLM evaluation did not return a result for this text."] for principle in principles_to_check}
+
+    if custom_checklist:
+        for text, feedback in zip(texts, results):
+            _apply_custom_checklist(feedback, text, custom_checklist)
+
+    return results
+
+# Async service layer: same checks, cache and fallbacks, with non-blocking provider calls
+
+async def _call_gemini_api_async(prompt: str) -> Tuple[bool, str]:
+    """Async counterpart of _call_gemini_api."""
+    return await _send_gemini_async(_generation_request(prompt))
+
+async def _call_gemini_timed_async(prompt: str) -> Tuple[bool, str]:
+    """Async counterpart of _call_gemini_timed."""
+    start = time.perf_counter()
+    is_successful, response = await call_provider_async("gemini", _call_gemini_api_async, prompt)
+    if is_successful:
+        _gemini_latency.record(time.perf_counter() - start)
+    return (is_successful, response)
+
+async def _call_mistral_api_async(prompt: str) -> Tuple[bool, str]:
+    """Async counterpart of _call_mistral_api."""
+    headers = _mistral_headers()
+    if headers is None:
+        return (False, MISTRAL_TOKEN_MISSING_MESSAGE)
+    safe_prompt, payload = _mistral_request(prompt)
+    if deadline_expired():
+        return (False, DEADLINE_EXCEEDED_MESSAGE)
+
+    with instrumentation.span("llm_call", provider="mistral", purpose="generation", mode="async") as span:
+        try:
+            response = await post_with_retries_async(MISTRAL_API_URL, headers=headers, json=payload)
+            return span.record_result(_parse_mistral_response(response, safe_prompt))
+        except _async_request_errors() as e:
+            return span.record_result((False, f"Mistral API connection error: {e}"))
+
+async def _call_llm_safely_async(prompt: str) -> Tuple[bool, str]:
+    """Async counterpart of _call_llm_safely."""
+    if LLM_HEDGING_ENABLED:
+        return await hedged_call_async(
+            lambda: _call_gemini_timed_async(prompt),
+            lambda: call_provider_with_retries_async("mistral", _call_mistral_api_async, prompt),
+            _hedge_delay(),
+        )
+
+    is_successful, response = await _call_gemini_timed_async(prompt)
+    if is_successful:
+        return (True, response)
+
+    instrumentation.count("llm_fallback", provider="mistral", reason=_failure_reason(response))
+    return await call_provider_with_retries_async("mistral", _call_mistral_api_async, prompt)
+
+async def _call_llm_cached_async(prompt: str) -> Tuple[bool, str]:
+    """Async counterpart of _call_llm_cached, sharing the same response cache."""
+    key = _response_cache_key(prompt)
+    cached = _cached_response(prompt, key)
+    if cached is not None:
+        return (True, cached)
+
+    (is_successful, response), shared = await _generation_flights.do_async(key, _call_llm_and_cache_async, prompt, key)
+    if shared:
+        instrumentation.count("single_flight", path="generation", role="follower")
+    return (is_successful, response)
+
+async def _call_llm_and_cache_async(prompt: str, key: tuple) -> Tuple[bool, str]:
+    is_successful, response = await _call_llm_safely_async(prompt)
+    if is_successful:
+        _store_response(prompt, key, response)
+    return (is_successful, response)
+
+async def generate_safe_text_async(prompt: str, custom_guidelines: Optional[List[str]] = None) -> Tuple[bool, str]:
+    """Async counterpart of generate_safe_text."""
+    rejection = _check_prompt_safety(prompt, custom_guidelines)
+    if rejection:
+        return rejection
+
+    with deadline_scope():
+        is_successful, llm_response = await _call_llm_cached_async(prompt)
+    if is_successful:
+        return (True, llm_response)
+    return _predefined_explanation(prompt)
+
+async def generate_safe_free_text_async(prompt: str, custom_guidelines: Optional[List[str]] = None) -> Tuple[bool, str]:
+    """Async counterpart of generate_safe_free_text."""
+    rejection = _check_prompt_safety(prompt, custom_guidelines)
+    if rejection:
+        return rejection
+
+    with deadline_scope():
+        is_successful, llm_response = await _call_llm_cached_async(prompt)
+    if is_successful:
+        return (True, llm_response)
+    return _predefined_free_text(prompt)
+
+async def _call_gemini_for_evaluation_async(text_to_evaluate: str, principles_to_check: List[str]) -> Tuple[bool, str]:
+    """Async counterpart of _call_gemini_for_evaluation."""
+    return await _send_gemini_async(_evaluation_request(text_to_evaluate, principles_to_check))
+
+async def _call_llm_for_evaluation_safely_async(text_to_evaluate: str, principles_to_check: List[str]) -> Tuple[bool, str]:
+    """Async counterpart of _call_llm_for_evaluation_safely."""
+    (is_successful, response), shared = await _evaluation_flights.do_async(
+        _evaluation_flight_key(text_to_evaluate, principles_to_check),
+        lambda: call_provider_with_retries_async("gemini", _call_gemini_for_evaluation_async, text_to_evaluate, principles_to_check,
+                                                 priority=PRIORITY_EVALUATION),
+    )
+    return _note_evaluation_call(is_successful, response, shared)
+
+async def evaluate_text_async(text_to_evaluate: str, principles_to_check: List[str], custom_checklist: Optional[List[str]] = None) -> Dict[str, List[str]]:
+    """Async counterpart of evaluate_text."""
+    feedback = {}
+    if principles_to_check:
+        store_key = _evaluation_store_key(text_to_evaluate, principles_to_check)
+        stored = _load_stored_evaluation(store_key)
+        if stored is not None:
+            feedback = stored
+        elif estimate_tokens(text_to_evaluate) > LONG_TEXT_THRESHOLD_TOKENS:
+            with deadline_scope():
+                feedback = await evaluate_long_text_async(text_to_evaluate, principles_to_check)
+            if "API Error" not in feedback:
+                _store_evaluation(store_key, text_to_evaluate, principles_to_check, feedback)
+        else:
+            with deadline_scope():
+                is_successful, response_str = await _call_llm_for_evaluation_safely_async(text_to_evaluate, principles_to_check)
+            feedback, complete = _parse_evaluation_result(is_successful, response_str, principles_to_check)
+            if complete:
+                _store_evaluation(store_key, text_to_evaluate, principles_to_check, feedback)
+    if custom_checklist:
+        _apply_custom_checklist(feedback, text_to_evaluate, custom_checklist)
+    return feedback
+
 def load_checklist_from_file(uploaded_file) -> List[str]:
     """Reads a .txt file and returns a list of guidelines."""
     if not uploaded_file:
@@ -0,0 +1,104 @@
+"""Hedged execution of two interchangeable LLM providers."""
+
+import asyncio
+import math
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Executor, wait
+from typing import Awaitable, Callable, Optional, Tuple
+
+
+class LatencyWindow:
+    """Rolling window of recent latencies in seconds, used to derive percentiles."""
+
+    def __init__(self, size: int = 200):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        """Adds one latency sample, dropping the oldest when the window is full."""
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        """Returns the nearest-rank percentile (0-100) of the window, or None if it is empty."""
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        rank = max(1, math.ceil(pct / 100.0 * len(samples)))
+        return samples[min(rank, len(samples)) - 1]
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+
+def hedged_call(
+    primary: Callable[[], Tuple[bool, str]],
+    secondary: Callable[[], Tuple[bool, str]],
+    hedge_delay: float,
+    executor: Executor,
+) -> Tuple[bool, str]:
+    """
+    Runs primary, and fires secondary in parallel if primary has not answered within hedge_delay.
+
+    If primary fails before the delay, secondary is started immediately, as in a plain fallback.
+    The first successful result wins; the other call is cancelled if it has not started yet and
+    its result is ignored otherwise.
+
+    Args:
+        primary: Provider call returning (is_successful, response).
+        secondary: Fallback provider call returning (is_successful, response).
+        hedge_delay: Seconds to wait for primary before hedging.
+        executor: Executor the calls run on.
+
+    Returns:
+        The winning (True, response), or (False, error) from secondary if both fail.
+    """
+    primary_future = executor.submit(primary)
+    done, _ = wait([primary_future], timeout=hedge_delay)
+    if done:
+        is_successful, response = primary_future.result()
+        if is_successful:
+            return (True, response)
+        return secondary()
+
+    secondary_future = executor.submit(secondary)
+    pending = {primary_future, secondary_future}
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            is_successful, response = future.result()
+            if is_successful:
+                for loser in pending:
+                    loser.cancel()
+                return (True, response)
+    # Both failed; report the fallback's error like the sequential chain does
+    return secondary_future.result()
+
+
+async def hedged_call_async(
+    primary: Callable[[], Awaitable[Tuple[bool, str]]],
+    secondary: Callable[[], Awaitable[Tuple[bool, str]]],
+    hedge_delay: float,
+) -> Tuple[bool, str]:
+    """Asyncio counterpart of hedged_call; the losing task is cancelled."""
+    primary_task = asyncio.ensure_future(primary())
+    done, _ = await asyncio.wait({primary_task}, timeout=hedge_delay)
+    if done:
+        is_successful, response = primary_task.result()
+        if is_successful:
+            return (True, response)
+        return await secondary()
+
+    secondary_task = asyncio.ensure_future(secondary())
+    pending = {primary_task, secondary_task}
+    while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            is_successful, response = task.result()
+            if is_successful:
+                for loser in pending:
+                    loser.cancel()
+                return (True, response)
+    return secondary_task.result()
@@ -0,0 +1,317 @@
+"""
+Lightweight latency and usage instrumentation for the service layer.
+
+Spans time provider calls, parse steps and keyword scans and carry attributes such as the
+provider, cache status, fallback reason and token usage. Finished spans and counted events go
+to pluggable sinks: in-memory histograms, a Prometheus text exposition file and JSON logs.
+When instrumentation is disabled, span() returns a shared no-op span and nothing is recorded.
+"""
+
+import bisect
+import json
+import os
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, TextIO, Tuple
+
+INSTRUMENTATION_ENABLED = os.getenv("INSTRUMENTATION_ENABLED", "false").lower() in ("1", "true", "yes")
+INSTRUMENTATION_SINKS = os.getenv("INSTRUMENTATION_SINKS", "memory")
+PROMETHEUS_PATH = os.getenv("INSTRUMENTATION_PROMETHEUS_PATH", "metrics.prom")
+PROMETHEUS_WRITE_INTERVAL = float(os.getenv("INSTRUMENTATION_PROMETHEUS_INTERVAL", "10"))
+JSON_LOG_PATH = os.getenv("INSTRUMENTATION_JSON_LOG_PATH", "")
+
+METRIC_PREFIX = "raiapp"
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Attributes kept in JSON logs but never used as metric labels, as their values are unbounded
+UNLABELED_ATTRIBUTES = frozenset({"error"})
+
+
+class Sink:
+    """Receives finished spans and counted events as flat dicts."""
+
+    def emit(self, event: Dict[str, object]) -> None:
+        raise NotImplementedError
+
+
+def _labels(event: Dict[str, object]) -> Tuple[Tuple[str, str], ...]:
+    """String and boolean attributes become metric labels; numbers are summed as counters."""
+    return tuple(sorted(
+        (key, str(value).lower() if isinstance(value, bool) else value)
+        for key, value in event.items()
+        if key not in ("name", "duration_seconds") and key not in UNLABELED_ATTRIBUTES
+        and isinstance(value, (str, bool))
+    ))
+
+
+class _Histogram:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-quantile (inf for the overflow bucket)."""
+        if not self.count:
+            return None
+        target, seen = q * self.count, 0
+        for bound, bucket_count in zip(self.buckets + (float("inf"),), self.counts):
+            seen += bucket_count
+            if seen >= target:
+                return bound
+        return float("inf")
+
+
+class HistogramSink(Sink):
+    """Aggregates span durations into histograms and numeric attributes into counters, in memory."""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._histograms: Dict[Tuple[str, tuple], _Histogram] = {}
+        self._counters: Dict[Tuple[str, tuple], float] = {}
+
+    def emit(self, event: Dict[str, object]) -> None:
+        name, labels = str(event["name"]), _labels(event)
+        with self._lock:
+            self._counters[(f"{name}_total", labels)] = self._counters.get((f"{name}_total", labels), 0) + 1
+            duration = event.get("duration_seconds")
+            if duration is not None:
+                histogram = self._histograms.get((name, labels))
+                if histogram is None:
+                    histogram = self._histograms[(name, labels)] = _Histogram(self.buckets)
+                histogram.observe(duration)
+            for key, value in event.items():
+                if key != "duration_seconds" and isinstance(value, (int, float)) and not isinstance(value, bool):
+                    counter_key = (f"{name}_{key}_total", labels)
+                    self._counters[counter_key] = self._counters.get(counter_key, 0) + value
+
+    def snapshot(self) -> Dict[str, Dict[str, object]]:
+        """Returns counters and per-span latency summaries keyed by 'name{label=value,...}'."""
+        def key_str(name: str, labels: tuple) -> str:
+            return name + ("{" + ",".join(f"{k}={v}" for k, v in labels) + "}" if labels else "")
+
+        with self._lock:
+            result: Dict[str, Dict[str, object]] = {
+                key_str(name, labels): {"count": h.count, "sum_seconds": round(h.total, 6),
+                                        "p50_le": h.quantile(0.5), "p95_le": h.quantile(0.95), "p99_le": h.quantile(0.99)}
+                for (name, labels), h in self._histograms.items()
+            }
+            for (name, labels), value in self._counters.items():
+                result[key_str(name, labels)] = {"value": value}
+        return result
+
+    def render_prometheus(self) -> str:
+        """Renders the aggregated metrics in the Prometheus text exposition format."""
+        def metric(name: str) -> str:
+            return METRIC_PREFIX + "_" + "".join(c if c.isalnum() else "_" for c in name)
+
+        def label_str(labels: tuple, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            escaped = (str(v).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n") for _, v in pairs)
+            return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+        lines: List[str] = []
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+        typed = set()
+        for (name, labels), h in histograms:
+            base = metric(name) + "_duration_seconds"
+            if base not in typed:
+                lines.append(f"# TYPE {base} histogram")
+                typed.add(base)
+            cumulative = 0
+            for bound, bucket_count in zip(h.buckets + (float("inf"),), h.counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{base}_bucket{label_str(labels, (('le', le),))} {cumulative}")
+            lines.append(f"{base}_sum{label_str(labels)} {h.total}")
+            lines.append(f"{base}_count{label_str(labels)} {h.count}")
+        for (name, labels), value in counters:
+            base = metric(name)
+            if base not in typed:
+                lines.append(f"# TYPE {base} counter")
+                typed.add(base)
+            lines.append(f"{base}{label_str(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+class PrometheusFileSink(HistogramSink):
+    """HistogramSink that also rewrites a Prometheus text file, at most once per interval."""
+
+    def __init__(self, path: str = PROMETHEUS_PATH, write_interval: float = PROMETHEUS_WRITE_INTERVAL,
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS, clock=time.monotonic):
+        super().__init__(buckets)
+        self.path = path
+        self.write_interval = write_interval
+        self._clock = clock
+        self._last_write: Optional[float] = None
+        self._write_lock = threading.Lock()
+
+    def emit(self, event: Dict[str, object]) -> None:
+        super().emit(event)
+        now = self._clock()
+        if self._last_write is None or now - self._last_write >= self.write_interval:
+            self.flush()
+
+    def flush(self) -> None:
+        """Writes the current metrics atomically, so scrapers never read a partial file."""
+        with self._write_lock:
+            self._last_write = self._clock()
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(self.render_prometheus())
+            os.replace(tmp_path, self.path)
+
+
+class JsonLogSink(Sink):
+    """Writes one JSON object per span or event to a text stream."""
+
+    def __init__(self, stream: Optional[TextIO] = None):
+        self.stream = stream if stream is not None else sys.stderr
+        self._lock = threading.Lock()
+
+    def emit(self, event: Dict[str, object]) -> None:
+        line = json.dumps({"ts": round(time.time(), 3), **event}, default=str, ensure_ascii=False)
+        with self._lock:
+            self.stream.write(line + "\n")
+            self.stream.flush()
+
+
+class Span:
+    """Times a block and collects attributes; emitted to the sinks when the block exits."""
+
+    __slots__ = ("attributes", "_start")
+
+    def __init__(self, name: str, attributes: Dict[str, object]):
+        self.attributes = {"name": name, "status": "ok"}
+        self.attributes.update(attributes)
+        self._start = 0.0
+
+    def __enter__(self) -> "Span":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self.attributes["duration_seconds"] = time.perf_counter() - self._start
+        if exc_type is not None:
+            self.attributes["status"] = "error"
+            self.attributes["error"] = f"{exc_type.__name__}: {exc}"
+        _emit(self.attributes)
+        return False
+
+    def set(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    def record_result(self, result: Tuple[bool, str]) -> Tuple[bool, str]:
+        """Marks the span from an (is_successful, response) tuple and returns the tuple unchanged."""
+        if not result[0]:
+            self.attributes["status"] = "error"
+            self.attributes["error"] = result[1]
+        return result
+
+    def record_usage(self, response) -> None:
+        """Adds token counts from a Gemini response's usage metadata, if present."""
+        usage = getattr(response, "usage_metadata", None)
+        if usage is None:
+            return
+        for attribute, key in (("prompt_token_count", "prompt_tokens"), ("candidates_token_count", "output_tokens")):
+            value = getattr(usage, attribute, None)
+            if isinstance(value, int):
+                self.attributes[key] = value
+
+
+class _NoopSpan:
+    """Shared stand-in returned while instrumentation is disabled."""
+
+    __slots__ = ()
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        return False
+
+    def set(self, **attributes) -> None:
+        pass
+
+    def record_result(self, result: Tuple[bool, str]) -> Tuple[bool, str]:
+        return result
+
+    def record_usage(self, response) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+_enabled = INSTRUMENTATION_ENABLED
+_sinks: List[Sink] = []
+
+
+def _emit(event: Dict[str, object]) -> None:
+    for sink in _sinks:
+        try:
+            sink.emit(event)
+        except Exception:
+            # Instrumentation must never break a request
+            pass
+
+
+def span(name: str, **attributes):
+    """Returns a context manager timing the block as `name`; a no-op when instrumentation is disabled."""
+    if not _enabled:
+        return _NOOP_SPAN
+    return Span(name, attributes)
+
+
+def count(name: str, **attributes) -> None:
+    """Records one occurrence of an event such as a cache hit or a provider fallback."""
+    if _enabled:
+        _emit({"name": name, **attributes})
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def _sinks_from_env() -> List[Sink]:
+    names = {name.strip().lower() for name in INSTRUMENTATION_SINKS.split(",") if name.strip()}
+    sinks: List[Sink] = []
+    if "prometheus" in names:
+        # The Prometheus sink keeps its own histograms, so it also serves as the memory sink
+        sinks.append(PrometheusFileSink())
+    elif "memory" in names:
+        sinks.append(HistogramSink())
+    if "json" in names:
+        sinks.append(JsonLogSink(open(JSON_LOG_PATH, "a", encoding="utf-8") if JSON_LOG_PATH else None))
+    return sinks
+
+
+def configure(enabled: Optional[bool] = None, sinks: Optional[List[Sink]] = None) -> None:
+    """Turns instrumentation on or off and/or replaces the sinks."""
+    global _enabled, _sinks
+    if sinks is not None:
+        _sinks = list(sinks)
+    if enabled is not None:
+        _enabled = enabled
+
+
+def get_metrics() -> Dict[str, Dict[str, object]]:
+    """Returns the snapshot of the first in-memory histogram sink, or {} if there is none."""
+    for sink in _sinks:
+        if isinstance(sink, HistogramSink):
+            return sink.snapshot()
+    return {}
+
+
+if _enabled:
+    _sinks = _sinks_from_env()
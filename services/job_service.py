@@ -0,0 +1,290 @@
+"""
+Background jobs for LLM work, so a page's script thread never blocks on a provider call.
+
+Pages submit a generation or evaluation job, keep its id in st.session_state and redraw the
+job's partial and final results from a polling fragment. Reruns caused by widget interaction
+find the job by id instead of starting the work again, and identical jobs are shared.
+"""
+
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from services import instrumentation
+from services.rate_limiter import QueueWait, current_session_id, session_scope, track_queue_wait
+
+logger = logging.getLogger(__name__)
+
+JOB_MAX_WORKERS = int(os.getenv("JOB_MAX_WORKERS", "8"))
+# Jobs queued or running at once; further submissions are rejected until some finish
+JOB_MAX_PENDING = int(os.getenv("JOB_MAX_PENDING", "64"))
+# Finished jobs stay available (and successful ones are reused for identical submissions) this long
+JOB_RESULT_TTL_SECONDS = float(os.getenv("JOB_RESULT_TTL_SECONDS", "600"))
+# How often pages refresh a running job's results
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "0.5"))
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+class Job:
+    """
+    One submitted unit of work. The job function receives the Job and may publish() partial
+    results as they arrive and should stop early once cancel_requested is set.
+    """
+
+    def __init__(self, job_id: str, kind: str, key: Hashable, reusable: Optional[Callable[[Any], bool]] = None):
+        self.id = job_id
+        self.kind = kind
+        self.key = key
+        self.reusable = reusable
+        self.status = PENDING
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.partial: List[Any] = []
+        self.queue_wait = QueueWait()
+        self.submitted_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.subscribers = 1
+        self._cancel = threading.Event()
+
+    @property
+    def done(self) -> bool:
+        return self.status in (DONE, FAILED, CANCELLED)
+
+    @property
+    def cancel_requested(self) -> bool:
+        return self._cancel.is_set()
+
+    def publish(self, item: Any) -> None:
+        """Adds a partial result for pages to show before the job finishes."""
+        self.partial.append(item)
+
+
+class JobManager:
+    """Runs jobs on a bounded thread pool, sharing identical jobs and expiring finished ones."""
+
+    def __init__(self, max_workers: int = JOB_MAX_WORKERS, max_pending: int = JOB_MAX_PENDING,
+                 result_ttl_seconds: float = JOB_RESULT_TTL_SECONDS):
+        self.max_pending = max_pending
+        self.result_ttl_seconds = result_ttl_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm-job")
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, Job] = {}
+        self._by_key: Dict[Tuple[str, Hashable], str] = {}
+        self._active = 0
+        self.submitted = 0
+        self.deduplicated = 0
+        self.rejected = 0
+
+    def _expire(self) -> None:
+        cutoff = time.time() - self.result_ttl_seconds
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.done and job.finished_at < cutoff]:
+            job = self._jobs.pop(job_id)
+            if self._by_key.get((job.kind, job.key)) == job_id:
+                del self._by_key[(job.kind, job.key)]
+
+    def submit(self, kind: str, key: Hashable, fn: Callable[..., Any], *args,
+               reusable: Optional[Callable[[Any], bool]] = None) -> Job:
+        """
+        Starts fn(job, *args) in the background, or returns the live or recently finished job with the same kind and key.
+        A finished job is only shared when it succeeded and reusable(result) holds, so a provider outage
+        reported in the result is retried by the next submission instead of being served to everyone.
+        When too many jobs are pending, the returned job has already failed with a "busy" error.
+        """
+        with self._lock:
+            self._expire()
+            existing = self._jobs.get(self._by_key.get((kind, key), ""))
+            if existing is not None and existing.status not in (FAILED, CANCELLED) and not existing.cancel_requested:
+                existing.subscribers += 1
+                self.deduplicated += 1
+                return existing
+            job = Job(uuid.uuid4().hex, kind, key, reusable)
+            if self._active >= self.max_pending:
+                self.rejected += 1
+                job.status, job.error, job.finished_at = FAILED, "The server is busy right now. Please try again in a moment.", time.time()
+                self._jobs[job.id] = job
+                return job
+            self._jobs[job.id] = job
+            self._by_key[(kind, key)] = job.id
+            self._active += 1
+            self.submitted += 1
+        # Worker threads have no Streamlit context, so the submitting session is carried over for fair queueing
+        self._executor.submit(self._run, job, current_session_id(), fn, args)
+        return job
+
+    def _run(self, job: Job, session_id: str, fn: Callable[..., Any], args: tuple) -> None:
+        status = CANCELLED
+        try:
+            if not job.cancel_requested:
+                job.status = RUNNING
+                with session_scope(session_id), track_queue_wait() as queued:
+                    job.queue_wait = queued
+                    job.result = fn(job, *args)
+                status = CANCELLED if job.cancel_requested else DONE
+        except Exception as e:
+            logger.exception("Job %s (%s) failed", job.id, job.kind)
+            job.error = str(e)
+            status = FAILED
+        finally:
+            reuse = status == DONE and (job.reusable is None or job.reusable(job.result))
+            with self._lock:
+                self._active -= 1
+                # Subscribers still see the result; only later identical submissions start afresh
+                if not reuse and self._by_key.get((job.kind, job.key)) == job.id:
+                    del self._by_key[(job.kind, job.key)]
+            job.finished_at = time.time()
+            job.status = status
+            instrumentation.count("job", kind=job.kind, status=status, run_seconds=job.finished_at - job.submitted_at)
+
+    def get(self, job_id: Optional[str]) -> Optional[Job]:
+        """Returns the job with this id, or None if it is unknown or has expired."""
+        with self._lock:
+            return self._jobs.get(job_id or "")
+
+    def cancel(self, job_id: Optional[str]) -> bool:
+        """
+        Withdraws one subscriber from the job; the work stops once no subscriber is left.
+        Returns True if the job was asked to stop.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id or "")
+            if job is None or job.done:
+                return False
+            job.subscribers -= 1
+            if job.subscribers > 0:
+                return False
+            job._cancel.set()
+            if self._by_key.get((job.kind, job.key)) == job.id:
+                del self._by_key[(job.kind, job.key)]
+            return True
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "active": self._active,
+                "jobs": len(self._jobs),
+                "submitted": self.submitted,
+                "deduplicated": self.deduplicated,
+                "rejected": self.rejected,
+            }
+
+
+_manager: Optional[JobManager] = None
+_manager_lock = threading.Lock()
+
+
+def get_job_manager() -> JobManager:
+    """Returns the process-wide job manager shared by all sessions."""
+    global _manager
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                _manager = JobManager()
+    return _manager
+
+
+def get_job(job_id: Optional[str]) -> Optional[Job]:
+    return get_job_manager().get(job_id)
+
+
+def cancel_job(job_id: Optional[str]) -> bool:
+    return get_job_manager().cancel(job_id)
+
+
+def job_poll_interval(job_id: Optional[str]) -> Optional[float]:
+    """run_every for a page's st.fragment: poll while the job runs, stop once it has finished."""
+    job = get_job(job_id)
+    return None if job is None or job.done else JOB_POLL_SECONDS
+
+
+def render_job_status(job: Job, job_key: str, waiting_message: str, error_prefix: Optional[str] = None) -> None:
+    """
+    Draws the running/finished state of a page's job inside its polling fragment.
+
+    Args:
+        job: The job whose id the page keeps in st.session_state[job_key].
+        job_key: Session state key of the job id; Cancel forgets it.
+        waiting_message: Shown with a Cancel button while the job runs.
+        error_prefix: If given, a failed job's error is shown after it.
+    """
+    import streamlit as st
+    polling_key = f"{job_key}_polling"
+    if not job.done:
+        st.info(waiting_message)
+        if st.button("Cancel", key=f"{job_key}_cancel"):
+            cancel_job(job.id)
+            st.session_state.pop(job_key, None)
+            st.rerun()
+        st.session_state[polling_key] = True
+    elif st.session_state.pop(polling_key, False):
+        # Redraw the page once so the fragment stops polling
+        st.rerun()
+    if error_prefix and job.error:
+        st.error(f"{error_prefix}: {job.error}")
+    if job.queue_wait.seconds >= 1:
+        st.caption(f"⏳ Waited {job.queue_wait.seconds:.1f}s in the request queue while other requests were served.")
+
+
+def _generate(job: Job, prompt: str, free_text: bool) -> Dict[str, Any]:
+    # Imported here so pages that only poll jobs do not load the evaluation service
+    from services.evaluation_service import stream_safe_free_text, stream_safe_text
+    stream = (stream_safe_free_text if free_text else stream_safe_text)(prompt)
+    for chunk in stream:
+        if job.cancel_requested:
+            break
+        job.publish(chunk)
+    return {"is_safe": stream.is_safe, "text": stream.text}
+
+
+def _evaluate(job: Job, text_to_evaluate: str, principles_to_check: List[str]) -> Dict[str, List[str]]:
+    from services.evaluation_service import evaluate_text_stream
+    feedback = {}
+    for principle, findings in evaluate_text_stream(text_to_evaluate, principles_to_check):
+        if job.cancel_requested:
+            break
+        feedback[principle] = findings
+        job.publish((principle, findings))
+    return feedback
+
+
+def _evaluate_checklist(job: Job, text_to_evaluate: str, custom_checklist) -> Dict[str, List[str]]:
+    from services.custom_checklist_service import ChecklistService
+    return ChecklistService().evaluate_text_against_checklist(text_to_evaluate, custom_checklist)
+
+
+def _generated(result: Dict[str, Any]) -> bool:
+    # is_safe is False for rejected prompts and for the "services are currently unavailable" text
+    return bool(result and result.get("is_safe"))
+
+
+def _evaluated(feedback: Dict[str, List[str]]) -> bool:
+    return bool(feedback) and "API Error" not in feedback
+
+
+def submit_generation(prompt: str, free_text: bool = False) -> Job:
+    """Streams an explanation (or free text) in the background; partial results are text chunks."""
+    return get_job_manager().submit("free_text" if free_text else "explanation", prompt, _generate, prompt, free_text,
+                                    reusable=_generated)
+
+
+def submit_evaluation(text_to_evaluate: str, principles_to_check: List[str]) -> Job:
+    """Evaluates text in the background; partial results are (principle, findings) pairs."""
+    key = (text_to_evaluate, tuple(principles_to_check))
+    return get_job_manager().submit("evaluation", key, _evaluate, text_to_evaluate, list(principles_to_check),
+                                    reusable=_evaluated)
+
+
+def submit_checklist_evaluation(text_to_evaluate: str, custom_checklist) -> Job:
+    """Evaluates text against a checklist (guidelines or compiled) in the background; the result is the feedback dict."""
+    from services.custom_checklist_service import ChecklistService
+    custom_checklist = ChecklistService().compile_checklist(custom_checklist)
+    return get_job_manager().submit("checklist", (text_to_evaluate, custom_checklist.digest), _evaluate_checklist,
+                                    text_to_evaluate, custom_checklist, reusable=_evaluated)
@@ -0,0 +1,166 @@
+"""
+Incremental, tolerant parsing of the JSON objects returned by the evaluation prompts.
+
+The model is asked for a single JSON object, but its output may be wrapped in a ```json fence,
+arrive in stream chunks, or stop mid-value when it hits max_output_tokens. IncrementalObjectParser
+hands out each top-level member as soon as it is complete and, at the end, repairs a truncated
+object by cutting it back to the last complete value and closing the open brackets.
+"""
+
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+_CLOSERS = {"{": "}", "[": "]"}
+_FENCE_START = re.compile(r"^\s*```[a-zA-Z]*[ \t]*\n?")
+_FENCE_END = re.compile(r"\n?```\s*$")
+
+
+def strip_code_fence(text: str) -> str:
+    """Removes a surrounding Markdown code fence (```json ... ```), leaving other text untouched."""
+    text = _FENCE_START.sub("", text, count=1)
+    return _FENCE_END.sub("", text, count=1).strip()
+
+
+class IncrementalObjectParser:
+    """
+    Parses one JSON object fed in arbitrary chunks, yielding its top-level members as they complete.
+
+    Text before the opening brace (a code fence or a stray sentence) and after the closing brace is ignored.
+    """
+
+    def __init__(self):
+        self._text = ""
+        self._pos = 0
+        self._started = False
+        self.complete = False
+        self.truncated = False
+        self.result: Dict[str, Any] = {}
+        # Scanner state
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._string_is_value = False
+        self._last_sig = ""
+        self._member_start = 0
+        # Position just after the last complete value, with the brackets still open there
+        self._safe_cut: Tuple[int, Tuple[str, ...]] = (0, ())
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """Consumes a chunk and returns the top-level (key, value) members completed by it."""
+        if self.complete or not chunk:
+            return []
+        if not self._started:
+            start = chunk.find("{")
+            if start < 0:
+                return []
+            chunk = chunk[start:]
+            self._started = True
+        self._text += chunk
+        return self._scan()
+
+    def _scan(self) -> List[Tuple[str, Any]]:
+        members: List[Tuple[str, Any]] = []
+        text, stack = self._text, self._stack
+        for i in range(self._pos, len(text)):
+            char = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    self._last_sig = '"'
+                    if self._string_is_value:
+                        self._safe_cut = (i + 1, tuple(stack))
+                continue
+            if char.isspace():
+                continue
+            if char == '"':
+                self._in_string = True
+                # Inside an object, a string after "{" or "," is a key; anywhere else it is a value
+                self._string_is_value = not (stack and stack[-1] == "{" and self._last_sig in ("{", ","))
+            elif char in "{[":
+                stack.append(char)
+                if len(stack) == 1:
+                    self._member_start = i + 1
+                self._safe_cut = (i + 1, tuple(stack))
+            elif char in "}]":
+                if stack:
+                    stack.pop()
+                if not stack:
+                    members += self._take_member(self._member_start, i)
+                    self.complete = True
+                    self._pos = i + 1
+                    return members
+                self._safe_cut = (i + 1, tuple(stack))
+            elif char == ",":
+                self._safe_cut = (i, tuple(stack))
+                if len(stack) == 1:
+                    members += self._take_member(self._member_start, i)
+                    self._member_start = i + 1
+            self._last_sig = char
+        self._pos = len(text)
+        return members
+
+    def _take_member(self, start: int, end: int) -> List[Tuple[str, Any]]:
+        member = self._text[start:end].strip()
+        if not member:
+            return []
+        try:
+            parsed = json.loads("{" + member + "}")
+        except ValueError:
+            # A malformed member is skipped rather than failing the whole object
+            return []
+        self.result.update(parsed)
+        return list(parsed.items())
+
+    def close(self) -> List[Tuple[str, Any]]:
+        """
+        Ends the input and returns the members recovered from a truncated object.
+        Raises ValueError if no object was started.
+        """
+        if not self._started:
+            raise ValueError("No JSON object found in the response.")
+        if self.complete:
+            return []
+        self.truncated = True
+        repaired = self._repair()
+        if repaired is None:
+            return []
+        members = [(key, value) for key, value in repaired.items() if key not in self.result]
+        self.result.update(members)
+        self.complete = True
+        return members
+
+    def _repair(self) -> Optional[Dict[str, Any]]:
+        """Closes the truncated text, first keeping an unterminated value string, then at the last complete value."""
+        candidates = []
+        if self._in_string and self._string_is_value:
+            # A dangling backslash would escape the closing quote, so it is dropped
+            text = (self._text[:-1] if self._escape else self._text) + '"'
+            candidates.append(text + "".join(_CLOSERS[c] for c in reversed(self._stack)))
+        cut, stack = self._safe_cut
+        candidates.append(self._text[:cut] + "".join(_CLOSERS[c] for c in reversed(stack)))
+        for candidate in candidates:
+            try:
+                repaired = json.loads(candidate)
+            except ValueError:
+                continue
+            if isinstance(repaired, dict):
+                return repaired
+        return None
+
+
+def parse_json_object(text: str) -> Dict[str, Any]:
+    """
+    Parses a JSON object from model output, tolerating a code fence, surrounding text and truncation.
+    Raises ValueError if no object can be recovered.
+    """
+    parser = IncrementalObjectParser()
+    parser.feed(text)
+    parser.close()
+    if parser.truncated and not parser.result:
+        raise ValueError(f"Could not repair the truncated JSON object: {text}")
+    return parser.result
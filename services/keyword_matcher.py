@@ -0,0 +1,102 @@
+"""Single-pass multi-keyword matcher (Aho-Corasick) for safety and checklist checks."""
+
+from collections import deque
+from functools import lru_cache
+from typing import Iterable, Iterator, List, NamedTuple, Sequence
+
+
+class KeywordMatch(NamedTuple):
+    """One keyword occurrence; positions index into the lowercased text."""
+    keyword: str
+    start: int
+    end: int
+
+
+class KeywordMatcher:
+    """
+    Compiled case-insensitive substring matcher for a fixed set of keywords.
+
+    Matching is equivalent to checking `keyword.lower() in text.lower()` for every keyword,
+    but scans the text once regardless of how many keywords there are.
+    """
+
+    def __init__(self, keywords: Iterable[str]):
+        self.keywords = tuple(keywords)
+        self._patterns: List[str] = []
+        pattern_ids = {}
+        for keyword in self.keywords:
+            pattern = keyword.lower()
+            if pattern not in pattern_ids:
+                pattern_ids[pattern] = len(self._patterns)
+                self._patterns.append(pattern)
+        # An empty keyword is a substring of every text, as with the `in` operator
+        self._has_empty = "" in pattern_ids
+        self._build([p for p in self._patterns if p])
+
+    def _build(self, patterns: Sequence[str]) -> None:
+        """Builds the trie, failure links and merged outputs."""
+        self._goto = [{}]
+        self._fail = [0]
+        self._out: List[List[str]] = [[]]
+        for pattern in patterns:
+            state = 0
+            for char in pattern:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                state = next_state
+            self._out[state].append(pattern)
+
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                self._out[next_state] = self._out[next_state] + self._out[self._fail[next_state]]
+
+    def finditer(self, text: str) -> Iterator[KeywordMatch]:
+        """Yields every (possibly overlapping) keyword occurrence in a single pass over the text."""
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for index, char in enumerate(text.lower()):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for pattern in out[state]:
+                yield KeywordMatch(pattern, index - len(pattern) + 1, index + 1)
+
+    def find_all(self, text: str) -> List[KeywordMatch]:
+        """Returns all keyword occurrences with their positions."""
+        return list(self.finditer(text))
+
+    def contains_any(self, text: str) -> bool:
+        """Returns True as soon as any keyword occurs in the text."""
+        if self._has_empty:
+            return True
+        return next(self.finditer(text), None) is not None
+
+    def matched_keywords(self, text: str) -> List[str]:
+        """Returns the original keywords found in the text, in keyword order."""
+        found = {match.keyword for match in self.finditer(text)}
+        if self._has_empty:
+            found.add("")
+        return [keyword for keyword in self.keywords if keyword.lower() in found]
+
+
+@lru_cache(maxsize=256)
+def _compile(keywords: tuple) -> KeywordMatcher:
+    return KeywordMatcher(keywords)
+
+
+def get_keyword_matcher(keywords: Iterable[str]) -> KeywordMatcher:
+    """Returns a compiled matcher, cached per keyword set."""
+    return _compile(tuple(keywords))
@@ -0,0 +1,278 @@
+"""Shared, lazily created LLM clients reused across Streamlit reruns and sessions."""
+
+import asyncio
+import os
+import threading
+import time
+import weakref
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+import streamlit as st
+from services.deadline import MIN_ATTEMPT_SECONDS, time_left
+
+if TYPE_CHECKING:
+    import httpx
+    import requests
+
+# google.generativeai takes about a second to import, so it is loaded on first use (see _load_genai)
+genai = None
+
+# Seconds between re-reading the API key, so a rotated key is picked up without a restart
+API_KEY_REFRESH_SECONDS = float(os.getenv("GEMINI_API_KEY_REFRESH_SECONDS", "60"))
+# Optional Gemini endpoint override (served over REST), e.g. the local benchmark stub server
+GEMINI_API_ENDPOINT = os.getenv("GEMINI_API_ENDPOINT", "")
+
+# Per-attempt Gemini timeout; inside a deadline_scope the remaining budget applies if it is shorter
+GEMINI_TIMEOUT_SECONDS = float(os.getenv("GEMINI_TIMEOUT_SECONDS", "30"))
+
+# Pooled HTTP session settings for the Hugging Face fallback
+HTTP_POOL_SIZE = int(os.getenv("HF_POOL_SIZE", "10"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HF_CONNECT_TIMEOUT", "3.05"))
+HTTP_READ_TIMEOUT = float(os.getenv("HF_READ_TIMEOUT", "20"))
+HTTP_MAX_RETRIES = int(os.getenv("HF_MAX_RETRIES", "2"))
+HTTP_BACKOFF_FACTOR = float(os.getenv("HF_BACKOFF_FACTOR", "0.5"))
+# Upper bound for a single wait on a 429 or 503 "model is loading" response
+HTTP_MAX_LOADING_WAIT = float(os.getenv("HF_MAX_LOADING_WAIT", "10"))
+
+
+def get_secret(name: str) -> str:
+    """Returns a secret from Streamlit secrets, falling back to the environment."""
+    return getattr(st.secrets, name, os.getenv(name, ''))
+
+
+def _load_genai():
+    """Imports google.generativeai on first use, keeping it off the page cold-start path."""
+    global genai
+    if genai is None:
+        import google.generativeai
+        genai = google.generativeai
+    return genai
+
+
+def _freeze_config(generation_config: Optional[Dict]) -> Tuple:
+    """Turns a generation config dict into a hashable registry key component."""
+    return tuple(sorted((generation_config or {}).items()))
+
+
+class GeminiClientRegistry:
+    """Holds one configured GenerativeModel per (model name, generation config)."""
+
+    def __init__(self, key_refresh_seconds: float = API_KEY_REFRESH_SECONDS):
+        self.key_refresh_seconds = key_refresh_seconds
+        self._models: Dict[Tuple, object] = {}
+        self._api_key = ''
+        self._key_checked_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def _current_api_key(self) -> str:
+        """Returns the API key, re-reading secrets at most once per refresh interval."""
+        now = time.monotonic()
+        if self._key_checked_at is None or now - self._key_checked_at >= self.key_refresh_seconds:
+            api_key = get_secret('GEMINI_API_TOKEN')
+            self._key_checked_at = now
+            if api_key != self._api_key:
+                # The SDK binds its transport on first use, so models built with the old key are dropped
+                self._api_key = api_key
+                self._models.clear()
+                if api_key and GEMINI_API_ENDPOINT:
+                    _load_genai().configure(api_key=api_key, transport="rest", client_options={"api_endpoint": GEMINI_API_ENDPOINT})
+                elif api_key:
+                    _load_genai().configure(api_key=api_key)
+        return self._api_key
+
+    def get_model(self, model_name: str, generation_config: Optional[Dict] = None) -> Tuple[bool, object]:
+        """
+        Returns a shared model for the given name and generation config.
+
+        Args:
+            model_name: The Gemini model name, e.g. 'gemini-1.5-flash'.
+            generation_config: Keyword arguments for genai.types.GenerationConfig.
+
+        Returns:
+            A tuple (True, model) on success, or (False, error message) if no API key is configured.
+        """
+        key = (model_name, _freeze_config(generation_config))
+        with self._lock:
+            if not self._current_api_key():
+                return (False, "Gemini API key not found. Please set 'GEMINI_API_TOKEN' in your environment or Streamlit secrets.")
+            model = self._models.get(key)
+            if model is None:
+                genai = _load_genai()
+                config = genai.types.GenerationConfig(**generation_config) if generation_config else None
+                model = genai.GenerativeModel(model_name, generation_config=config)
+                self._models[key] = model
+            return (True, model)
+
+    def reset(self) -> None:
+        """Drops all models and forces the API key to be re-read on the next call."""
+        with self._lock:
+            self._models.clear()
+            self._api_key = ''
+            self._key_checked_at = None
+
+
+_gemini_registry = GeminiClientRegistry()
+
+
+def get_gemini_model(model_name: str, generation_config: Optional[Dict] = None) -> Tuple[bool, object]:
+    """Returns (True, model) from the process-wide registry, or (False, error message)."""
+    return _gemini_registry.get_model(model_name, generation_config)
+
+
+def gemini_request_options() -> Dict[str, float]:
+    """request_options for generate_content, so a Gemini call never outlasts its budget."""
+    return {"timeout": time_left(GEMINI_TIMEOUT_SECONDS)}
+
+
+def reset_gemini_clients() -> None:
+    """Forgets all cached models, e.g. right after rotating the API key."""
+    _gemini_registry.reset()
+
+
+_http_session: "Optional[requests.Session]" = None
+_http_session_lock = threading.Lock()
+
+
+def _build_http_session() -> "requests.Session":
+    """Creates a keep-alive session with a bounded connection pool and transport retries."""
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    retry = Retry(
+        total=HTTP_MAX_RETRIES,
+        connect=HTTP_MAX_RETRIES,
+        read=0,  # POSTs that reached the model are not replayed on read errors
+        status=HTTP_MAX_RETRIES,
+        # 429 and 503 are handled in post_with_retries, whose waits are capped and bounded by the deadline
+        status_forcelist=(502, 504),
+        allowed_methods=frozenset({"POST"}),
+        backoff_factor=HTTP_BACKOFF_FACTOR,
+        respect_retry_after_header=False,  # urllib3 would sleep for any Retry-After, however long
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_http_session() -> "requests.Session":
+    """Returns the process-wide pooled HTTP session, creating it on first use."""
+    global _http_session
+    if _http_session is None:
+        with _http_session_lock:
+            if _http_session is None:
+                _http_session = _build_http_session()
+    return _http_session
+
+
+def _loading_wait_seconds(response, attempt: int) -> float:
+    """Works out how long to wait before retrying a 429 or 503 response."""
+    wait = None
+    retry_after = response.headers.get("Retry-After")
+    if retry_after:
+        try:
+            wait = float(retry_after)
+        except ValueError:
+            wait = None
+    if wait is None:
+        try:
+            # Hugging Face reports {"error": "... is currently loading", "estimated_time": 20.0}
+            wait = float(response.json().get("estimated_time"))
+        except Exception:
+            wait = None
+    if wait is None:
+        wait = HTTP_BACKOFF_FACTOR * (2 ** attempt)
+    return max(0.0, min(wait, HTTP_MAX_LOADING_WAIT))
+
+
+# requests rejects a timeout of 0, which time_left returns once the deadline has passed
+_MIN_REQUEST_TIMEOUT = 0.01
+
+
+def _request_timeouts() -> Tuple[float, float]:
+    """(connect, read) timeouts, shortened to the time left before the request's deadline."""
+    return (max(_MIN_REQUEST_TIMEOUT, time_left(HTTP_CONNECT_TIMEOUT)), max(_MIN_REQUEST_TIMEOUT, time_left(HTTP_READ_TIMEOUT)))
+
+
+def _budget_allows_wait(wait: float) -> bool:
+    """False if waiting would leave too little of the request's deadline for another attempt."""
+    budget = time_left()
+    return budget is None or budget - wait >= MIN_ATTEMPT_SECONDS
+
+
+def post_with_retries(url: str, sleep=time.sleep, **kwargs) -> "requests.Response":
+    """
+    POSTs through the pooled session, retrying 429 and 503 responses with bounded backoff.
+
+    Connection errors, 502 and 504 are retried by the session's transport adapter. A 429 or
+    503 is retried here, waiting for the Retry-After header or the Hugging Face 'estimated_time'
+    of a loading model, capped at HF_MAX_LOADING_WAIT. Inside a deadline_scope the timeouts are
+    cut to the remaining budget and no wait outlasts it.
+
+    Args:
+        url: The endpoint to POST to.
+        sleep: Sleep function, injectable for tests.
+        **kwargs: Passed to requests.Session.post; 'timeout' defaults to (connect, read), bounded by the deadline.
+
+    Returns:
+        The last response received.
+    """
+    timeout = kwargs.pop("timeout", None)
+    session = get_http_session()
+    attempt = 0
+    while True:
+        response = session.post(url, timeout=timeout or _request_timeouts(), **kwargs)
+        if response.status_code not in (429, 503) or attempt >= HTTP_MAX_RETRIES:
+            return response
+        wait = _loading_wait_seconds(response, attempt)
+        if not _budget_allows_wait(wait):
+            return response
+        sleep(wait)
+        attempt += 1
+
+
+# Status codes retried by the async client, which has no urllib3 retry adapter
+_RETRYABLE_STATUS_CODES = (429, 502, 503, 504)
+
+# httpx async clients are bound to the event loop they were created on
+_async_http_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+
+
+def get_async_http_client() -> "httpx.AsyncClient":
+    """Returns the pooled async HTTP client of the running event loop, creating it on first use."""
+    import httpx
+
+    loop = asyncio.get_running_loop()
+    client = _async_http_clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=HTTP_POOL_SIZE, max_keepalive_connections=HTTP_POOL_SIZE),
+            timeout=httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+            transport=httpx.AsyncHTTPTransport(retries=HTTP_MAX_RETRIES),  # connection errors only
+        )
+        _async_http_clients[loop] = client
+    return client
+
+
+async def post_with_retries_async(url: str, **kwargs) -> "httpx.Response":
+    """Async counterpart of post_with_retries, retrying 429/502/503/504 with the same backoff rules."""
+    import httpx
+
+    timeout = kwargs.pop("timeout", None)
+    client = get_async_http_client()
+    attempt = 0
+    while True:
+        request_timeout = timeout
+        if request_timeout is None:
+            connect, read = _request_timeouts()
+            request_timeout = httpx.Timeout(read, connect=connect)
+        response = await client.post(url, timeout=request_timeout, **kwargs)
+        if response.status_code not in _RETRYABLE_STATUS_CODES or attempt >= HTTP_MAX_RETRIES:
+            return response
+        wait = _loading_wait_seconds(response, attempt)
+        if not _budget_allows_wait(wait):
+            return response
+        await asyncio.sleep(wait)
+        attempt += 1
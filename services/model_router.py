@@ -0,0 +1,207 @@
+"""
+Per-request choice between a small, fast Gemini model and a larger one.
+
+Light requests (short input, few principles or checklist items) go to the small model and heavy ones
+to the large model. Rolling latency and error statistics of each model can override that: a model
+that is failing or breaching its latency target is avoided while the other one is healthy.
+Every decision is counted with its reason, so the routing mix can be read from get_model_routing_stats()
+and the instrumentation log.
+"""
+
+import logging
+import os
+import threading
+from collections import Counter, deque
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from services import instrumentation
+from services.circuit_breaker import is_request_failure
+from services.hedging import LatencyWindow
+from services.prompt_builder import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+MODEL_ROUTING_ENABLED = os.getenv("MODEL_ROUTING_ENABLED", "true").lower() in ("1", "true", "yes")
+
+SMALL = "small"
+LARGE = "large"
+
+
+@dataclass(frozen=True)
+class RoutingPolicy:
+    """Thresholds deciding when a request needs the large model."""
+
+    small_model: str = os.getenv("MODEL_ROUTER_SMALL_MODEL", "gemini-1.5-flash-8b")
+    large_model: str = os.getenv("MODEL_ROUTER_LARGE_MODEL", "gemini-1.5-flash")
+    # Requests above either limit go to the large model
+    max_small_input_tokens: int = int(os.getenv("MODEL_ROUTER_MAX_SMALL_TOKENS", "2000"))
+    max_small_criteria: int = int(os.getenv("MODEL_ROUTER_MAX_SMALL_CRITERIA", "8"))
+    # A model with a higher recent error rate or p95 latency is avoided if the other one is healthy
+    max_error_rate: float = float(os.getenv("MODEL_ROUTER_MAX_ERROR_RATE", "0.3"))
+    latency_slo_seconds: float = float(os.getenv("MODEL_ROUTER_LATENCY_SLO_SECONDS", "10"))
+    # Calls observed before a model's statistics are trusted
+    min_samples: int = int(os.getenv("MODEL_ROUTER_MIN_SAMPLES", "10"))
+
+
+@dataclass(frozen=True)
+class RoutingDecision:
+    purpose: str
+    model: str
+    reason: str
+
+
+class ModelStats:
+    """Rolling latency and success record of one model."""
+
+    def __init__(self, window: int = 100):
+        self.latency = LatencyWindow(window)
+        self._outcomes = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float, ok: bool) -> None:
+        with self._lock:
+            self._outcomes.append(ok)
+        if ok:
+            self.latency.record(seconds)
+
+    def samples(self) -> int:
+        return len(self._outcomes)
+
+    def error_rate(self) -> float:
+        with self._lock:
+            outcomes = list(self._outcomes)
+        return outcomes.count(False) / len(outcomes) if outcomes else 0.0
+
+    def snapshot(self) -> Dict[str, object]:
+        return {
+            "samples": self.samples(),
+            "error_rate": round(self.error_rate(), 3),
+            "latency_p50": self.latency.percentile(50),
+            "latency_p95": self.latency.percentile(95),
+        }
+
+
+class ModelRouter:
+    """Chooses a model per request under a RoutingPolicy and keeps the statistics it routes on."""
+
+    def __init__(self, policy: Optional[RoutingPolicy] = None, enabled: bool = MODEL_ROUTING_ENABLED, window: int = 100):
+        """
+        Args:
+            policy: Models and thresholds; the environment-configured defaults if omitted.
+            enabled: When False, every request uses the caller's default model.
+            window: Recent calls per model kept for the latency and error statistics.
+        """
+        self.policy = policy or RoutingPolicy()
+        self.enabled = enabled
+        self._models = {SMALL: self.policy.small_model, LARGE: self.policy.large_model}
+        self._stats = {model: ModelStats(window) for model in self._models.values()}
+        self._decisions: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def candidate_models(self) -> Tuple[str, ...]:
+        """The models a routed request may be answered by, e.g. for cache keys."""
+        return (self.policy.small_model, self.policy.large_model) if self.enabled else ()
+
+    def label(self, default_model: str) -> str:
+        """Names the model(s) behind a routed call, for result store keys and audit records."""
+        return "|".join(self.candidate_models()) or default_model
+
+    def _healthy(self, model: str) -> bool:
+        stats = self._stats.get(model)
+        if stats is None or stats.samples() < self.policy.min_samples:
+            return True
+        if stats.error_rate() > self.policy.max_error_rate:
+            return False
+        p95 = stats.latency.percentile(95)
+        return p95 is None or p95 <= self.policy.latency_slo_seconds
+
+    def _choose(self, text: str, criteria: int) -> Tuple[str, str]:
+        policy = self.policy
+        if estimate_tokens(text) > policy.max_small_input_tokens:
+            size, reason = LARGE, "input_tokens"
+        elif criteria > policy.max_small_criteria:
+            size, reason = LARGE, "criteria"
+        else:
+            size, reason = SMALL, "light"
+        other = SMALL if size == LARGE else LARGE
+        if not self._healthy(self._models[size]) and self._healthy(self._models[other]):
+            size, reason = other, f"{size}_unhealthy"
+        return self._models[size], reason
+
+    def route(self, purpose: str, text: str, criteria: int = 0, default_model: Optional[str] = None) -> RoutingDecision:
+        """
+        Picks the model for one request and records the decision.
+
+        Args:
+            purpose: What the call is for, e.g. 'generation', 'evaluation' or 'checklist'.
+            text: The input the model will read (prompt, text to evaluate, ...).
+            criteria: Number of principles or checklist items the model must check.
+            default_model: The model to use when routing is disabled.
+
+        Returns:
+            The chosen model and the reason for the choice.
+        """
+        if self.enabled or default_model is None:
+            model, reason = self._choose(text, criteria)
+        else:
+            model, reason = default_model, "disabled"
+        with self._lock:
+            self._decisions[(purpose, model, reason)] += 1
+        instrumentation.count("model_route", purpose=purpose, model=model, reason=reason)
+        logger.debug("Routed %s request to %s (%s)", purpose, model, reason)
+        return RoutingDecision(purpose, model, reason)
+
+    def record(self, model: str, seconds: float, ok: bool) -> None:
+        """Adds the outcome of one call to the model's rolling statistics."""
+        stats = self._stats.get(model)
+        if stats is None:
+            with self._lock:
+                stats = self._stats.setdefault(model, ModelStats())
+        stats.record(seconds, ok)
+
+    def stats(self) -> Dict[str, object]:
+        """Returns decision counts by purpose, model and reason, and each model's recent statistics."""
+        with self._lock:
+            decisions = [
+                {"purpose": purpose, "model": model, "reason": reason, "count": count}
+                for (purpose, model, reason), count in sorted(self._decisions.items())
+            ]
+            models = dict(self._stats)
+        return {"enabled": self.enabled, "decisions": decisions,
+                "models": {model: stats.snapshot() for model, stats in models.items()}}
+
+
+_router: Optional[ModelRouter] = None
+_router_lock = threading.Lock()
+
+
+def get_model_router() -> ModelRouter:
+    """Returns the process-wide router shared by all sessions."""
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = ModelRouter()
+    return _router
+
+
+def configure_model_router(router: Optional[ModelRouter]) -> None:
+    """Replaces the process-wide router, e.g. with a custom policy; None restores the default on next use."""
+    global _router
+    with _router_lock:
+        _router = router
+
+
+def route_model(purpose: str, text: str, criteria: int = 0, default_model: Optional[str] = None) -> RoutingDecision:
+    return get_model_router().route(purpose, text, criteria, default_model)
+
+
+def record_model_outcome(model: str, seconds: float, ok: bool, error: str = "") -> None:
+    """Adds a call's outcome to the model's statistics; failures caused by the request itself are not held against it."""
+    if ok or not is_request_failure(error):
+        get_model_router().record(model, seconds, ok)
+
+
+def get_model_routing_stats() -> Dict[str, object]:
+    return get_model_router().stats()
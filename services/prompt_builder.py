@@ -0,0 +1,130 @@
+"""
+Builds compact LLM prompts and keeps them within an input token budget.
+
+Prompt templates in this codebase are indented triple-quoted strings; every leading space of them
+would be sent (and billed) as input tokens, so compact_prompt strips them. Educator checklists are
+pasted as-is and often repeat a guideline with different casing or punctuation; compact_guidelines
+drops those repeats. split_by_budget packs guidelines into groups that each fit a token budget, so an
+oversized checklist is evaluated in several smaller calls whose results are merged. split_text cuts a
+long document into chunks of a token budget for the same reason.
+"""
+
+import os
+import re
+from typing import FrozenSet, Iterable, List, Sequence, Tuple
+
+from services.similarity_index import jaccard, normalize, shingles
+
+# Checklist prompt tokens (the evaluated text is not counted) per checklist evaluation call
+CHECKLIST_INPUT_TOKEN_BUDGET = int(os.getenv("CHECKLIST_INPUT_TOKEN_BUDGET", "4000"))
+# Guidelines at least this similar (character shingles) are treated as the same guideline
+GUIDELINE_SIMILARITY_THRESHOLD = float(os.getenv("GUIDELINE_SIMILARITY_THRESHOLD", "0.9"))
+# Long-document mode: texts above the threshold are evaluated as chunks of LONG_TEXT_CHUNK_TOKENS
+LONG_TEXT_THRESHOLD_TOKENS = int(os.getenv("LONG_TEXT_THRESHOLD_TOKENS", "3000"))
+LONG_TEXT_CHUNK_TOKENS = int(os.getenv("LONG_TEXT_CHUNK_TOKENS", "1500"))
+
+_NUMBER = re.compile(r"\d+")
+# Words that flip a guideline's meaning; guidelines that differ in them are never merged
+_NEGATIONS = frozenset({"no", "not", "never", "dont", "avoid", "without", "nor", "except"})
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough local token estimate (about four characters per token)."""
+    return len(text) // 4 + 1
+
+
+def compact_prompt(text: str) -> str:
+    """Strips the indentation and trailing spaces of every line and drops blank lines."""
+    return "\n".join(line.strip() for line in text.splitlines() if line.strip())
+
+
+def _guideline_signature(item: str) -> Tuple[str, FrozenSet[str], FrozenSet[str], FrozenSet[str]]:
+    # Filler words are kept: in a guideline "describe" and "define" ask for different things
+    normalized = normalize(item)
+    words = normalized.split()
+    return normalized, shingles(normalized), frozenset(_NUMBER.findall(normalized)), _NEGATIONS.intersection(words)
+
+
+def compact_guidelines(items: Iterable[str], threshold: float = GUIDELINE_SIMILARITY_THRESHOLD) -> Tuple[str, ...]:
+    """
+    Drops empty guidelines and those repeating an earlier one, keeping the first wording and the order.
+
+    Two guidelines repeat each other when their normalized forms (casefolded words of any script, no
+    punctuation) are equal, or nearly equal above threshold while naming the same numbers and negations,
+    so "No slang." repeats "no slang" but "Use slang", "Describe the risks" vs "Define the risks" and
+    "Max 5 words" vs "Max 6 words" are kept apart. A guideline without any words is only dropped when
+    its text repeats exactly. Checklists are short, so each guideline is simply compared with every kept one.
+    """
+    kept: List[str] = []
+    signatures: List[Tuple[str, FrozenSet[str], FrozenSet[str], FrozenSet[str]]] = []
+    for item in items:
+        item = item.strip() if item else ""
+        if not item:
+            continue
+        normalized, shingle_set, numbers, negations = _guideline_signature(item)
+        if not normalized:
+            if item in kept:
+                continue
+        elif any(normalized == other[0] or (numbers == other[2] and negations == other[3] and jaccard(shingle_set, other[1]) >= threshold)
+                 for other in signatures if other[0]):
+            continue
+        kept.append(item)
+        signatures.append((normalized, shingle_set, numbers, negations))
+    return tuple(kept)
+
+
+def split_by_budget(items: Sequence[str], budget_tokens: int, item_overhead_tokens: int = 1) -> List[Tuple[str, ...]]:
+    """
+    Packs items, in order, into the fewest consecutive groups whose estimated tokens fit budget_tokens.
+    An item larger than the budget on its own gets a group of its own.
+    """
+    groups: List[Tuple[str, ...]] = []
+    current: List[str] = []
+    used = 0
+    for item in items:
+        cost = estimate_tokens(item) + item_overhead_tokens
+        if current and used + cost > budget_tokens:
+            groups.append(tuple(current))
+            current, used = [], 0
+        current.append(item)
+        used += cost
+    if current:
+        groups.append(tuple(current))
+    return groups
+
+
+def _text_units(text: str, start: int, end: int, pattern: str) -> List[Tuple[int, int]]:
+    """Splits text[start:end] into (start, end) spans ending at matches of pattern."""
+    spans, unit_start = [], start
+    for match in re.finditer(pattern, text[start:end]):
+        unit_end = start + match.end()
+        if unit_end > unit_start:
+            spans.append((unit_start, unit_end))
+            unit_start = unit_end
+    if unit_start < end:
+        spans.append((unit_start, end))
+    return spans
+
+
+def split_text(text: str, max_tokens: int) -> List[Tuple[int, int]]:
+    """
+    Splits text into (start, end) spans of at most max_tokens (estimated).
+    Paragraph boundaries are preferred, then sentence boundaries, then a hard character split.
+    """
+    max_chars = max(1, max_tokens * 4)
+    units = []
+    for para_start, para_end in _text_units(text, 0, len(text), r"\n\s*\n"):
+        if para_end - para_start <= max_chars:
+            units.append((para_start, para_end))
+            continue
+        for sent_start, sent_end in _text_units(text, para_start, para_end, r"[.!?]+[\"')\]]*\s+"):
+            for piece_start in range(sent_start, sent_end, max_chars):
+                units.append((piece_start, min(piece_start + max_chars, sent_end)))
+
+    chunks: List[Tuple[int, int]] = []
+    for unit_start, unit_end in units:
+        if chunks and unit_end - chunks[-1][0] <= max_chars:
+            chunks[-1] = (chunks[-1][0], unit_end)
+        else:
+            chunks.append((unit_start, unit_end))
+    return [(start, end) for start, end in chunks if text[start:end].strip()]
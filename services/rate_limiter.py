@@ -0,0 +1,407 @@
+"""
+Process-wide token-bucket rate limiting with a fair request queue for LLM provider calls.
+
+Every provider has one bucket shared by all Streamlit sessions. Callers that find it empty
+queue up; queued requests are served by priority (aged, so low priorities cannot starve) and
+round-robin across sessions within a priority, so one busy session cannot crowd out the others.
+"""
+
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Deque, Dict, Iterator, Optional, Tuple
+
+from services import instrumentation
+from services.circuit_breaker import OPEN, call_with_breaker, call_with_breaker_async, get_circuit_breaker, is_request_failure
+from services.deadline import DEADLINE_EXCEEDED_MESSAGE, current_deadline, retry_with_backoff, retry_with_backoff_async, time_left
+
+# Lower values are served first
+PRIORITY_GENERATION = 0  # a student is waiting on the page
+PRIORITY_EVALUATION = 1
+PRIORITY_BATCH = 2  # evaluate_text_batch
+
+# Requests per minute and burst size per provider; a rate of 0 disables limiting for that provider
+PROVIDER_LIMITS = {
+    "gemini": (float(os.getenv("GEMINI_RATE_PER_MINUTE", "60")), int(os.getenv("GEMINI_RATE_BURST", "10"))),
+    "mistral": (float(os.getenv("MISTRAL_RATE_PER_MINUTE", "30")), int(os.getenv("MISTRAL_RATE_BURST", "5"))),
+}
+MAX_QUEUE_WAIT = float(os.getenv("RATE_LIMIT_MAX_QUEUE_WAIT", "30"))
+# Seconds of waiting that raise a queued request by one priority level
+PRIORITY_AGING_SECONDS = float(os.getenv("RATE_LIMIT_PRIORITY_AGING_SECONDS", "10"))
+
+_session_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("rate_limit_session_id", default=None)
+
+
+class QueueWait:
+    """Total seconds the provider calls of a track_queue_wait block spent queued."""
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.calls = 0
+
+
+_queue_wait: contextvars.ContextVar[Optional[QueueWait]] = contextvars.ContextVar("rate_limit_queue_wait", default=None)
+
+
+def current_session_id() -> str:
+    """Returns the session_scope id, else the Streamlit session id, else 'anonymous'."""
+    session_id = _session_id.get()
+    if session_id:
+        return session_id
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        ctx = get_script_run_ctx(suppress_warning=True)
+    except Exception:
+        ctx = None
+    return getattr(ctx, "session_id", None) or "anonymous"
+
+
+@contextmanager
+def session_scope(session_id: str) -> Iterator[None]:
+    """Attributes provider calls in the block to session_id, e.g. for CLI or worker threads."""
+    token = _session_id.set(session_id)
+    try:
+        yield
+    finally:
+        _session_id.reset(token)
+
+
+@contextmanager
+def track_queue_wait() -> Iterator[QueueWait]:
+    """Adds up the queue time of the provider calls made in the block, so pages can show it."""
+    tracker = QueueWait()
+    token = _queue_wait.set(tracker)
+    try:
+        yield tracker
+    finally:
+        _queue_wait.reset(token)
+
+
+class _Ticket:
+    __slots__ = ("session_id", "priority", "enqueued_at", "granted", "notify")
+
+    def __init__(self, session_id: str, priority: int, enqueued_at: float, notify: Callable[[], None]):
+        self.session_id = session_id
+        self.priority = priority
+        self.enqueued_at = enqueued_at
+        self.granted = False
+        self.notify = notify
+
+
+class FairRateLimiter:
+    """
+    Token bucket refilled at rate_per_second up to burst tokens, with a fair queue of waiters.
+
+    Waiters re-run the dispatcher when they wake, so no background thread is needed: whoever
+    wakes first after a token becomes available hands it to the next request in fair order.
+    """
+
+    def __init__(self, name: str, rate_per_second: float, burst: int = 1, aging_seconds: float = PRIORITY_AGING_SECONDS,
+                 clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.rate = rate_per_second
+        self.burst = max(1, burst)
+        self.aging_seconds = aging_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._tokens = float(self.burst)
+        self._refilled_at = clock()
+        # priority -> session id -> queued tickets; session order is the round-robin order
+        self._queues: Dict[int, "OrderedDict[str, Deque[_Ticket]]"] = {}
+        self._queued = 0
+        self.granted_calls = 0
+        self.timed_out_calls = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+
+    def _next_ticket(self, now: float) -> Optional[_Ticket]:
+        """Head ticket of the next session in round-robin order, in the best aged priority."""
+        best, best_score = None, None
+        for priority, sessions in self._queues.items():
+            if not sessions:
+                continue
+            head = next(iter(sessions.values()))[0]
+            oldest = min(queue[0].enqueued_at for queue in sessions.values())
+            aging = (now - oldest) / self.aging_seconds if self.aging_seconds > 0 else 0.0
+            score = (priority - aging, oldest)
+            if best_score is None or score < best_score:
+                best, best_score = head, score
+        return best
+
+    def _remove(self, ticket: _Ticket) -> bool:
+        sessions = self._queues.get(ticket.priority, {})
+        queue = sessions.get(ticket.session_id)
+        if not queue or ticket not in queue:
+            return False
+        queue.remove(ticket)
+        if not queue:
+            del sessions[ticket.session_id]
+        self._queued -= 1
+        return True
+
+    def _dispatch(self) -> Optional[float]:
+        """Grants tokens to queued tickets in fair order; returns seconds until the next token is due."""
+        with self._lock:
+            now = self._clock()
+            self._refill(now)
+            if not self.enabled:
+                # Limiting was switched off while callers were queued: let them all through
+                self._tokens = float(self._queued)
+            while self._queued and self._tokens >= 1:
+                ticket = self._next_ticket(now)
+                sessions = self._queues[ticket.priority]
+                queue = sessions[ticket.session_id]
+                queue.popleft()
+                self._queued -= 1
+                # Served sessions go to the back of the rotation
+                del sessions[ticket.session_id]
+                if queue:
+                    sessions[ticket.session_id] = queue
+                self._tokens -= 1
+                ticket.granted = True
+                ticket.notify()
+            if not self._queued or not self.enabled:
+                return None
+            return max(0.0, (1 - self._tokens) / self.rate)
+
+    def _enqueue(self, session_id: str, priority: int, notify: Callable[[], None]) -> _Ticket:
+        with self._lock:
+            ticket = _Ticket(session_id, priority, self._clock(), notify)
+            self._queues.setdefault(priority, OrderedDict()).setdefault(session_id, deque()).append(ticket)
+            self._queued += 1
+            return ticket
+
+    def _finish(self, ticket: _Ticket, timed_out: bool) -> Tuple[bool, float]:
+        with self._lock:
+            if timed_out and self._remove(ticket):
+                self.timed_out_calls += 1
+                granted = False
+            else:
+                granted = True
+                self.granted_calls += 1
+            waited = self._clock() - ticket.enqueued_at
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+        return granted, waited
+
+    def acquire(self, session_id: Optional[str] = None, priority: int = PRIORITY_GENERATION,
+                timeout: float = MAX_QUEUE_WAIT) -> Tuple[bool, float]:
+        """
+        Waits for a token in fair order.
+
+        Returns:
+            (granted, seconds queued); granted is False if no token was handed out within timeout.
+        """
+        if not self.enabled:
+            return (True, 0.0)
+        event = threading.Event()
+        ticket = self._enqueue(session_id or current_session_id(), priority, event.set)
+        deadline = ticket.enqueued_at + timeout
+        while True:
+            next_token_in = self._dispatch()
+            if ticket.granted:
+                return self._finish(ticket, timed_out=False)
+            remaining = deadline - self._clock()
+            if remaining <= 0:
+                return self._finish(ticket, timed_out=True)
+            event.wait(remaining if next_token_in is None else min(next_token_in, remaining))
+
+    async def acquire_async(self, session_id: Optional[str] = None, priority: int = PRIORITY_GENERATION,
+                            timeout: float = MAX_QUEUE_WAIT) -> Tuple[bool, float]:
+        """Async counterpart of acquire; a cancelled waiter leaves the queue."""
+        if not self.enabled:
+            return (True, 0.0)
+        loop = asyncio.get_running_loop()
+        event = asyncio.Event()
+        ticket = self._enqueue(session_id or current_session_id(), priority, lambda: loop.call_soon_threadsafe(event.set))
+        deadline = ticket.enqueued_at + timeout
+        try:
+            while True:
+                next_token_in = self._dispatch()
+                if ticket.granted:
+                    return self._finish(ticket, timed_out=False)
+                remaining = deadline - self._clock()
+                if remaining <= 0:
+                    return self._finish(ticket, timed_out=True)
+                try:
+                    await asyncio.wait_for(event.wait(), remaining if next_token_in is None else min(next_token_in, remaining))
+                except asyncio.TimeoutError:
+                    pass
+                event.clear()
+        except asyncio.CancelledError:
+            with self._lock:
+                self._remove(ticket)
+            raise
+
+    def configure(self, rate_per_second: float, burst: Optional[int] = None) -> None:
+        """Changes the refill rate (0 disables limiting) and optionally the burst; tokens earned so far are kept."""
+        with self._lock:
+            self._refill(self._clock())
+            self.rate = rate_per_second
+            if burst is not None:
+                self.burst = max(1, burst)
+                self._tokens = min(self._tokens, float(self.burst))
+        # Waiters are woken by whoever dispatches next, so hand out what the new rate allows right away
+        self._dispatch()
+
+    def reset(self) -> None:
+        """Refills the bucket; queued callers are left in place."""
+        with self._lock:
+            self._tokens = float(self.burst)
+            self._refilled_at = self._clock()
+
+    def snapshot(self) -> Dict[str, object]:
+        """Returns the queue depth, available tokens and wait statistics."""
+        with self._lock:
+            self._refill(self._clock())
+            served = self.granted_calls + self.timed_out_calls
+            return {
+                "rate_per_minute": round(self.rate * 60, 3),
+                "burst": self.burst,
+                "tokens": round(self._tokens, 3),
+                "queued": self._queued,
+                "granted_calls": self.granted_calls,
+                "timed_out_calls": self.timed_out_calls,
+                "avg_wait_seconds": round(self.total_wait / served, 3) if served else 0.0,
+                "max_wait_seconds": round(self.max_wait, 3),
+            }
+
+
+_limiters: Dict[str, FairRateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(name: str) -> FairRateLimiter:
+    """Returns the process-wide limiter for a provider, creating it on first use."""
+    with _limiters_lock:
+        limiter = _limiters.get(name)
+        if limiter is None:
+            per_minute, burst = PROVIDER_LIMITS.get(name, (0.0, 1))
+            limiter = _limiters[name] = FairRateLimiter(name, per_minute / 60.0, burst)
+        return limiter
+
+
+def configure_rate_limiter(name: str, rate_per_second: float, burst: Optional[int] = None) -> FairRateLimiter:
+    """Overrides a provider's PROVIDER_LIMITS for this process, e.g. for a bulk evaluation run."""
+    limiter = get_rate_limiter(name)
+    limiter.configure(rate_per_second, burst)
+    return limiter
+
+
+def get_rate_limiter_states() -> Dict[str, Dict[str, object]]:
+    """Returns a snapshot of every provider limiter."""
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return {limiter.name: limiter.snapshot() for limiter in limiters}
+
+
+def reset_rate_limiters() -> None:
+    """Refills every provider bucket."""
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    for limiter in limiters:
+        limiter.reset()
+
+
+def _queue_timeout_message(name: str, waited: float) -> str:
+    deadline = current_deadline()
+    if deadline is not None and deadline.expired:
+        return DEADLINE_EXCEEDED_MESSAGE
+    return f"{name} is busy: the request waited {waited:.1f}s in the rate limit queue without being served."
+
+
+def _record_wait(name: str, priority: int, granted: bool, waited: float) -> None:
+    tracker = _queue_wait.get()
+    if tracker is not None:
+        tracker.seconds += waited
+        tracker.calls += 1
+    instrumentation.count("rate_limit_queue", provider=name, priority=str(priority),
+                          status="granted" if granted else "timeout", wait_seconds=waited)
+
+
+def _deadline_expired(name: str) -> bool:
+    """True if the request's deadline has passed, in which case the provider is not called at all."""
+    deadline = current_deadline()
+    if deadline is None or not deadline.expired:
+        return False
+    instrumentation.count("deadline_exceeded", provider=name)
+    return True
+
+
+def acquire_provider_slot(name: str, priority: int = PRIORITY_GENERATION) -> bool:
+    """Queues for one call to the provider, e.g. before opening a stream; False on queue timeout."""
+    if _deadline_expired(name):
+        return False
+    granted, waited = get_rate_limiter(name).acquire(priority=priority, timeout=time_left(MAX_QUEUE_WAIT))
+    _record_wait(name, priority, granted, waited)
+    return granted
+
+
+def call_provider(name: str, call: Callable[..., Tuple[bool, str]], *args, priority: int = PRIORITY_GENERATION) -> Tuple[bool, str]:
+    """
+    Runs a provider call through its rate limiter queue and circuit breaker.
+
+    A provider whose circuit is open is rejected straight away instead of queueing, and so is any
+    call once the request's deadline has passed; queueing never outlasts the deadline.
+    """
+    if _deadline_expired(name):
+        return (False, DEADLINE_EXCEEDED_MESSAGE)
+    if get_circuit_breaker(name).state == OPEN:
+        return call_with_breaker(name, call, *args)
+    granted, waited = get_rate_limiter(name).acquire(priority=priority, timeout=time_left(MAX_QUEUE_WAIT))
+    _record_wait(name, priority, granted, waited)
+    if not granted:
+        return (False, _queue_timeout_message(name, waited))
+    return call_with_breaker(name, call, *args)
+
+
+async def call_provider_async(name: str, call: Callable[..., Awaitable[Tuple[bool, str]]], *args,
+                              priority: int = PRIORITY_GENERATION) -> Tuple[bool, str]:
+    """Async counterpart of call_provider."""
+    if _deadline_expired(name):
+        return (False, DEADLINE_EXCEEDED_MESSAGE)
+    if get_circuit_breaker(name).state == OPEN:
+        return await call_with_breaker_async(name, call, *args)
+    granted, waited = await get_rate_limiter(name).acquire_async(priority=priority, timeout=time_left(MAX_QUEUE_WAIT))
+    _record_wait(name, priority, granted, waited)
+    if not granted:
+        return (False, _queue_timeout_message(name, waited))
+    return await call_with_breaker_async(name, call, *args)
+
+
+# Failures that another attempt cannot fix: missing credentials, open circuits, queue timeouts, spent deadlines
+_PERMANENT_FAILURE_MARKERS = ("not found", "circuit open", "rate limit queue", DEADLINE_EXCEEDED_MESSAGE.lower())
+
+
+def is_transient_failure(message: str) -> bool:
+    """Tells from a provider error message whether retrying the call may succeed."""
+    if is_request_failure(message):
+        # Empty, safety-blocked or rejected requests get the same answer however often they are sent
+        return False
+    message = message.lower()
+    return not any(marker in message for marker in _PERMANENT_FAILURE_MARKERS)
+
+
+def call_provider_with_retries(name: str, call: Callable[..., Tuple[bool, str]], *args,
+                               priority: int = PRIORITY_GENERATION) -> Tuple[bool, str]:
+    """call_provider, retrying transient failures with jittered exponential backoff within the request's deadline."""
+    return retry_with_backoff(lambda: call_provider(name, call, *args, priority=priority), is_transient=is_transient_failure)
+
+
+async def call_provider_with_retries_async(name: str, call: Callable[..., Awaitable[Tuple[bool, str]]], *args,
+                                           priority: int = PRIORITY_GENERATION) -> Tuple[bool, str]:
+    """Async counterpart of call_provider_with_retries."""
+    return await retry_with_backoff_async(lambda: call_provider_async(name, call, *args, priority=priority),
+                                          is_transient=is_transient_failure)
@@ -0,0 +1,234 @@
+"""
+Persistent store of evaluation results on local SQLite, shared by all Streamlit worker processes.
+
+Results are keyed by a hash of the evaluated text, the principles or checklist and the model settings,
+so re-checking the same worksheet in any session or process is answered without another LLM call.
+The database runs in WAL mode, so readers never block the single writer, and each thread uses its
+own connection. Only hashes of the text are stored, which keeps the table usable as an audit trail
+of what was evaluated, with which criteria and result, without keeping student text on disk.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+RESULT_STORE_ENABLED = os.getenv("RESULT_STORE_ENABLED", "false").lower() in ("1", "true", "yes")
+RESULT_STORE_PATH = os.getenv("RESULT_STORE_PATH", os.path.join(".cache", "evaluation_results.sqlite3"))
+RESULT_STORE_MAX_ROWS = int(os.getenv("RESULT_STORE_MAX_ROWS", "20000"))
+RESULT_STORE_MAX_AGE_DAYS = float(os.getenv("RESULT_STORE_MAX_AGE_DAYS", "30"))
+# Eviction runs on the first write and then every this many writes
+EVICT_EVERY_WRITES = 200
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    model TEXT NOT NULL,
+    text_hash TEXT NOT NULL,
+    criteria TEXT NOT NULL,
+    result TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_used_at REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS results_last_used_at ON results (last_used_at);
+CREATE INDEX IF NOT EXISTS results_created_at ON results (created_at);
+CREATE INDEX IF NOT EXISTS results_text_hash ON results (text_hash);
+"""
+
+
+def content_hash(*parts: Any) -> str:
+    """Returns the SHA-256 hex digest of the JSON encoding of parts."""
+    encoded = json.dumps(parts, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class ResultStore:
+    """
+    SQLite table of JSON results with size- and age-based eviction.
+
+    Database errors are logged and treated as misses, so a locked or corrupt file never fails an evaluation.
+    """
+
+    def __init__(self, path: str, max_rows: int = RESULT_STORE_MAX_ROWS, max_age_seconds: float = RESULT_STORE_MAX_AGE_DAYS * 86400,
+                 clock: Callable[[], float] = time.time):
+        """
+        Args:
+            path: SQLite database file; its directory is created if needed.
+            max_rows: Rows kept before the least recently used ones are evicted.
+            max_age_seconds: Age after which a result is no longer served and is evicted.
+            clock: Wall-clock time source (shared across processes), injectable for tests.
+        """
+        self.path = path
+        self.max_rows = max(1, int(max_rows))
+        self.max_age_seconds = float(max_age_seconds)
+        self._clock = clock
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            # Autocommit mode: every statement is its own short transaction
+            connection = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(_SCHEMA)
+            self._local.connection = connection
+        return connection
+
+    def _failed(self, action: str, error: Exception) -> None:
+        with self._lock:
+            self.errors += 1
+        logger.warning("Result store %s failed (%s): %s", action, self.path, error)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Returns the stored result for key, or None if it is missing or older than max_age_seconds."""
+        now = self._clock()
+        try:
+            connection = self._connection()
+            row = connection.execute(
+                "SELECT result FROM results WHERE key = ? AND created_at > ?", (key, now - self.max_age_seconds)
+            ).fetchone()
+            if row is not None:
+                connection.execute("UPDATE results SET last_used_at = ?, hits = hits + 1 WHERE key = ?", (now, key))
+        except sqlite3.Error as e:
+            self._failed("read", e)
+            return None
+        with self._lock:
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return None if row is None else json.loads(row[0])
+
+    def put(self, key: str, result: Dict[str, Any], kind: str, model: str, text: str, criteria: Any) -> None:
+        """Stores result under key along with its audit fields; the text itself is only kept as a hash."""
+        now = self._clock()
+        try:
+            self._connection().execute(
+                "INSERT INTO results (key, kind, model, text_hash, criteria, result, created_at, last_used_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET result = excluded.result, created_at = excluded.created_at, "
+                "last_used_at = excluded.last_used_at",
+                (key, kind, model, content_hash(text), json.dumps(criteria, ensure_ascii=False),
+                 json.dumps(result, ensure_ascii=False), now, now),
+            )
+        except sqlite3.Error as e:
+            self._failed("write", e)
+            return
+        with self._lock:
+            self._writes += 1
+            evict = self._writes % EVICT_EVERY_WRITES == 1
+        if evict:
+            self.evict()
+
+    def evict(self) -> int:
+        """Deletes results past max_age_seconds and the least recently used beyond max_rows; returns the count."""
+        try:
+            connection = self._connection()
+            expired = connection.execute(
+                "DELETE FROM results WHERE created_at <= ?", (self._clock() - self.max_age_seconds,)
+            ).rowcount
+            overflow = connection.execute(
+                "DELETE FROM results WHERE key IN "
+                "(SELECT key FROM results ORDER BY last_used_at DESC LIMIT -1 OFFSET ?)", (self.max_rows,)
+            ).rowcount
+        except sqlite3.Error as e:
+            self._failed("eviction", e)
+            return 0
+        return expired + overflow
+
+    def history(self, text: Optional[str] = None, kind: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        """Returns the most recent stored results, optionally only those for a given text or kind."""
+        clauses, params = [], []
+        if text is not None:
+            clauses.append("text_hash = ?")
+            params.append(content_hash(text))
+        if kind is not None:
+            clauses.append("kind = ?")
+            params.append(kind)
+        where = f"WHERE {' AND '.join(clauses)} " if clauses else ""
+        try:
+            rows = self._connection().execute(
+                "SELECT kind, model, text_hash, criteria, result, created_at, last_used_at, hits FROM results "
+                f"{where}ORDER BY created_at DESC LIMIT ?", (*params, limit)
+            ).fetchall()
+        except sqlite3.Error as e:
+            self._failed("read", e)
+            return []
+        return [
+            {"kind": kind_, "model": model, "text_hash": text_hash, "criteria": json.loads(criteria),
+             "result": json.loads(result), "created_at": created_at, "last_used_at": last_used_at, "hits": hits}
+            for kind_, model, text_hash, criteria, result, created_at, last_used_at, hits in rows
+        ]
+
+    def clear(self) -> None:
+        """Deletes every stored result and resets the counters."""
+        try:
+            self._connection().execute("DELETE FROM results")
+        except sqlite3.Error as e:
+            self._failed("clear", e)
+        with self._lock:
+            self.hits = self.misses = self.errors = self._writes = 0
+
+    def stats(self) -> Dict[str, int]:
+        """Returns this process's hit/miss/error counters and the number of stored rows."""
+        try:
+            size = self._connection().execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        except sqlite3.Error as e:
+            self._failed("read", e)
+            size = -1
+        with self._lock:
+            return {"size": size, "max_rows": self.max_rows, "hits": self.hits, "misses": self.misses, "errors": self.errors}
+
+
+_store: Optional[ResultStore] = None
+_store_lock = threading.Lock()
+
+
+def get_result_store() -> Optional[ResultStore]:
+    """Returns the process-wide store, or None when RESULT_STORE_ENABLED is off."""
+    global _store
+    if not RESULT_STORE_ENABLED:
+        return None
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ResultStore(RESULT_STORE_PATH)
+    return _store
+
+
+def configure_result_store(store: Optional[ResultStore]) -> None:
+    """Replaces the process-wide store, e.g. with one on a temporary file in tests; None disables it."""
+    global _store, RESULT_STORE_ENABLED
+    with _store_lock:
+        _store = store
+        RESULT_STORE_ENABLED = store is not None
+
+
+def load_result(key: str) -> Optional[Dict[str, Any]]:
+    """Returns the stored result for key, or None if there is none or the store is disabled."""
+    store = get_result_store()
+    return store.get(key) if store else None
+
+
+def save_result(key: str, result: Dict[str, Any], kind: str, model: str, text: str, criteria: Any) -> None:
+    """Stores a result if the store is enabled."""
+    store = get_result_store()
+    if store:
+        store.put(key, result, kind, model, text, criteria)
@@ -0,0 +1,190 @@
+"""
+File-backed registry of prompting scenarios and the keyword index used to score prompts.
+
+Each *.json file in the scenario directory holds one scenario object, or a list of them:
+
+    {
+      "title": "Explain Photosynthesis",
+      "description": "...",
+      "keywords_for_good_prompt": ["simple", "5th grade", ...],
+      "ideal_prompt_template": "Explain photosynthesis for a {age_group} ...",
+      "simulated_responses": {"basic": "...", "good_age_appropriate": "..."},
+      "response_rules": [{"keywords": ["simple"], "response": "good_age_appropriate"}]
+    }
+
+Files are read on first access and sorted by file name, which sets the order on the page.
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+from collections.abc import Mapping
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+SCENARIO_DIR = os.getenv("SCENARIO_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "scenarios"))
+REQUIRED_FIELDS = ("title", "description", "keywords_for_good_prompt", "simulated_responses")
+
+# Runs of letters and digits of any script
+_TOKEN = re.compile(r"[^\W_]+", re.UNICODE)
+
+
+class LazyPromptTemplate:
+    """
+    Holds a template string and builds the langchain PromptTemplate on first use.
+    langchain_core takes most of a second to import, and most pages never format a template.
+    """
+
+    def __init__(self, template: str):
+        self.template = template
+        self._prompt_template = None
+
+    def get(self):
+        """Returns the underlying PromptTemplate, importing langchain_core if needed."""
+        if self._prompt_template is None:
+            from langchain_core.prompts import PromptTemplate
+            self._prompt_template = PromptTemplate.from_template(self.template)
+        return self._prompt_template
+
+    def format(self, **kwargs) -> str:
+        return self.get().format(**kwargs)
+
+    def __getattr__(self, name):
+        # Everything else (input_variables, invoke, ...) comes from the real PromptTemplate
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.get(), name)
+
+
+def tokenize(text: str) -> List[str]:
+    """Casefolds text and splits it into words of letters and digits, in any script."""
+    return _TOKEN.findall(text.casefold())
+
+
+class KeywordIndex:
+    """
+    Inverted index from words to the keywords (single words or phrases) that contain them.
+
+    A keyword matches when its words appear consecutively in the prompt, each prompt word starting
+    with the keyword word, so "5th grade" matches "5th grader" and "example" matches "examples".
+    Matching costs a few dictionary lookups per prompt word, however many keywords are indexed.
+    """
+
+    def __init__(self, keywords: Iterable[str]):
+        self.keywords = tuple(keywords)
+        self._phrases: List[Tuple[str, ...]] = [tuple(tokenize(keyword)) for keyword in self.keywords]
+        # First word of each phrase -> ids of the keywords starting with it
+        self._postings: Dict[str, List[int]] = {}
+        for keyword_id, phrase in enumerate(self._phrases):
+            if phrase:
+                self._postings.setdefault(phrase[0], []).append(keyword_id)
+        self._lengths = sorted({len(word) for word in self._postings})
+
+    def matched_ids(self, tokens: Sequence[str]) -> List[int]:
+        """Returns the ids of the keywords found in the tokenized prompt, in keyword order."""
+        found = set()
+        postings, phrases = self._postings, self._phrases
+        for position, token in enumerate(tokens):
+            for length in self._lengths:
+                if length > len(token):
+                    break
+                for keyword_id in postings.get(token[:length], ()):
+                    if keyword_id in found:
+                        continue
+                    phrase = phrases[keyword_id]
+                    rest = tokens[position + 1:position + len(phrase)]
+                    if len(rest) == len(phrase) - 1 and all(word.startswith(part) for part, word in zip(phrase[1:], rest)):
+                        found.add(keyword_id)
+        return sorted(found)
+
+    def matched_keywords(self, tokens: Sequence[str]) -> List[str]:
+        """Returns the original keywords found in the tokenized prompt, in keyword order."""
+        return [self.keywords[keyword_id] for keyword_id in self.matched_ids(tokens)]
+
+
+@lru_cache(maxsize=1024)
+def _compile(keywords: tuple) -> KeywordIndex:
+    return KeywordIndex(keywords)
+
+
+def get_keyword_index(keywords: Iterable[str]) -> KeywordIndex:
+    """Returns a compiled keyword index, cached per keyword set."""
+    return _compile(tuple(keywords))
+
+
+def _scenario_from_data(data: Dict, source: str) -> Optional[Dict]:
+    """Validates one scenario object, returning the scenario dict or None if it is malformed."""
+    missing = [field for field in REQUIRED_FIELDS if field not in data]
+    if missing:
+        logger.warning("Skipping scenario in %s: missing %s", source, ", ".join(missing))
+        return None
+    if not isinstance(data["keywords_for_good_prompt"], list) or not isinstance(data["simulated_responses"], dict):
+        logger.warning("Skipping scenario %r in %s: keywords must be a list and responses an object", data["title"], source)
+        return None
+    scenario = {key: value for key, value in data.items() if key != "title"}
+    if "ideal_prompt_template" in scenario:
+        scenario["ideal_prompt_template"] = LazyPromptTemplate(scenario["ideal_prompt_template"])
+    return scenario
+
+
+class ScenarioRegistry(Mapping):
+    """
+    Read-only mapping of scenario title to scenario dict, loaded from a directory on first access.
+
+    Unreadable or malformed files are logged and skipped so one bad file does not take the page down.
+    """
+
+    def __init__(self, directory: str = SCENARIO_DIR):
+        self.directory = directory
+        self._scenarios: Optional[Dict[str, Dict]] = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[str, Dict]:
+        scenarios: Dict[str, Dict] = {}
+        try:
+            file_names = sorted(name for name in os.listdir(self.directory) if name.endswith(".json"))
+        except OSError as e:
+            logger.warning("Scenario directory %s could not be read: %s", self.directory, e)
+            return scenarios
+        for file_name in file_names:
+            path = os.path.join(self.directory, file_name)
+            try:
+                with open(path, encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning("Skipping scenario file %s: %s", path, e)
+                continue
+            for item in data if isinstance(data, list) else [data]:
+                scenario = _scenario_from_data(item, path) if isinstance(item, dict) else None
+                if scenario is None:
+                    continue
+                if item["title"] in scenarios:
+                    logger.warning("Skipping duplicate scenario %r in %s", item["title"], path)
+                    continue
+                scenarios[item["title"]] = scenario
+        return scenarios
+
+    def _entries(self) -> Dict[str, Dict]:
+        if self._scenarios is None:
+            with self._lock:
+                if self._scenarios is None:
+                    self._scenarios = self._load()
+        return self._scenarios
+
+    def reload(self) -> None:
+        """Forgets the loaded scenarios so the directory is read again on next access."""
+        with self._lock:
+            self._scenarios = None
+
+    def __getitem__(self, title: str) -> Dict:
+        return self._entries()[title]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._entries())
+
+    def __len__(self) -> int:
+        return len(self._entries())
@@ -0,0 +1,211 @@
+"""
+In-memory near-duplicate index for reworded prompts, using character shingles and MinHash/LSH.
+
+Students rarely repeat a prompt byte for byte ("explain photosynthesis", "Explain photosynthesis
+please!", "what is photosynthesis"), so the exact-key response cache misses most reuse. Prompts are
+canonicalized, split into character shingles and summarised as a MinHash signature; LSH bands pick
+a few candidates, and the candidate with the highest exact Jaccard similarity above the threshold wins.
+"""
+
+import random
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Callable, Dict, FrozenSet, Hashable, List, Optional, Set, Tuple
+
+# Framing words that do not change what is being asked about
+FILLER_WORDS = frozenset({
+    "a", "an", "the", "please", "kindly", "briefly", "explain", "describe", "define", "tell", "me",
+    "about", "what", "whats", "is", "are", "can", "could", "would", "you", "i",
+})
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_NUMBER = re.compile(r"\d+")
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def normalize(text: str) -> str:
+    """Casefolds, drops punctuation and collapses whitespace; letters and digits of any script are kept."""
+    return " ".join(_WORD.findall(text.casefold().replace("'", "").replace("\u2019", "")))
+
+
+def canonicalize(text: str) -> str:
+    """Normalizes text and drops filler words, so differently framed prompts compare equal."""
+    words = normalize(text).split()
+    content = [word for word in words if word not in FILLER_WORDS]
+    # A prompt made only of filler words is compared as written
+    return " ".join(content or words)
+
+
+def shingles(canonical: str, size: int = 3) -> FrozenSet[str]:
+    """Returns the character shingles of canonical text, padded so word boundaries count; empty text has none."""
+    if not canonical:
+        return frozenset()
+    padded = f" {canonical} "
+    if len(padded) <= size:
+        return frozenset([padded])
+    return frozenset(padded[i:i + size] for i in range(len(padded) - size + 1))
+
+
+def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+class _Entry:
+    __slots__ = ("shingles", "numbers", "band_keys", "value", "expires_at")
+
+    def __init__(self, shingles: FrozenSet[str], numbers: FrozenSet[str], band_keys: List[Hashable], value: Any, expires_at: float):
+        self.shingles = shingles
+        self.numbers = numbers
+        self.band_keys = band_keys
+        self.value = value
+        self.expires_at = expires_at
+
+
+class SimilarityIndex:
+    """
+    Thread-safe LRU/TTL map from texts to values that also answers lookups for similar texts.
+
+    Entries only match lookups with the same scope (e.g. the model and generation settings) and the
+    same numbers, so "world war 1" never answers "world war 2" however similar the rest of the text is.
+    """
+
+    def __init__(self, maxsize: int = 512, ttl_seconds: float = 900.0, threshold: float = 0.85,
+                 num_perm: int = 64, bands: int = 16, shingle_size: int = 3, seed: int = 1,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            maxsize: Maximum number of entries kept before the least recently used one is evicted.
+            ttl_seconds: Seconds an entry stays valid after it was stored.
+            threshold: Minimum Jaccard similarity of the shingle sets for a lookup to match.
+            num_perm: MinHash signature length; must be divisible by bands.
+            bands: LSH bands. More bands find candidates at lower similarity, at the cost of more comparisons.
+            shingle_size: Characters per shingle.
+            seed: Seed for the MinHash permutations.
+            clock: Monotonic time source, injectable for tests.
+        """
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.maxsize = max(0, int(maxsize))
+        self.ttl_seconds = float(ttl_seconds)
+        self.threshold = float(threshold)
+        self.bands = bands
+        self._rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self._clock = clock
+        rng = random.Random(seed)
+        self._perms = [(rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME)) for _ in range(num_perm)]
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._buckets: Dict[Hashable, Set[Hashable]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _signature(self, shingle_set: FrozenSet[str]) -> List[int]:
+        hashes = [zlib.crc32(s.encode("utf-8")) for s in shingle_set]
+        return [min((a * h + b) % _MERSENNE_PRIME for h in hashes) for a, b in self._perms]
+
+    def _band_keys(self, scope: Hashable, signature: List[int]) -> List[Hashable]:
+        rows = self._rows
+        return [(scope, band, tuple(signature[band * rows:(band + 1) * rows])) for band in range(self.bands)]
+
+    def _prepare(self, text: str, scope: Hashable) -> Optional[Tuple[Hashable, FrozenSet[str], FrozenSet[str], List[Hashable]]]:
+        """Returns None for text without any words, which would otherwise match every other such text."""
+        canonical = canonicalize(text)
+        shingle_set = shingles(canonical, self.shingle_size)
+        if not shingle_set:
+            return None
+        numbers = frozenset(_NUMBER.findall(canonical))
+        return (scope, canonical), shingle_set, numbers, self._band_keys(scope, self._signature(shingle_set))
+
+    def _drop(self, entry_key: Hashable) -> None:
+        entry = self._entries.pop(entry_key)
+        for band_key in entry.band_keys:
+            bucket = self._buckets.get(band_key)
+            if bucket is not None:
+                bucket.discard(entry_key)
+                if not bucket:
+                    del self._buckets[band_key]
+
+    def lookup(self, text: str, scope: Hashable = None) -> Optional[Tuple[float, Any]]:
+        """Returns (similarity, value) of the most similar live entry at or above the threshold, or None."""
+        prepared = self._prepare(text, scope)
+        if prepared is None:
+            with self._lock:
+                self.misses += 1
+            return None
+        entry_key, shingle_set, numbers, band_keys = prepared
+        with self._lock:
+            now = self._clock()
+            candidates = {entry_key} if entry_key in self._entries else set()
+            for band_key in band_keys:
+                candidates |= self._buckets.get(band_key, set())
+
+            best_key, best_similarity = None, self.threshold
+            for candidate in candidates:
+                entry = self._entries[candidate]
+                if entry.expires_at <= now:
+                    self._drop(candidate)
+                    self.expirations += 1
+                    continue
+                if entry.numbers != numbers:
+                    continue
+                similarity = jaccard(shingle_set, entry.shingles)
+                if similarity >= best_similarity:
+                    best_key, best_similarity = candidate, similarity
+
+            if best_key is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best_key)
+            self.hits += 1
+            return best_similarity, self._entries[best_key].value
+
+    def get(self, text: str, scope: Hashable = None) -> Optional[Any]:
+        """Returns the value stored for the most similar text, or None."""
+        match = self.lookup(text, scope)
+        return None if match is None else match[1]
+
+    def put(self, text: str, value: Any, scope: Hashable = None) -> None:
+        """Stores value under text, evicting the least recently used entries if full."""
+        prepared = None if self.maxsize == 0 else self._prepare(text, scope)
+        if prepared is None:
+            return
+        entry_key, shingle_set, numbers, band_keys = prepared
+        with self._lock:
+            if entry_key in self._entries:
+                self._drop(entry_key)
+            self._entries[entry_key] = _Entry(shingle_set, numbers, band_keys, value, self._clock() + self.ttl_seconds)
+            for band_key in band_keys:
+                self._buckets.setdefault(band_key, set()).add(entry_key)
+            while len(self._entries) > self.maxsize:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """Drops all entries and resets the counters."""
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+            self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, int]:
+        """Returns a snapshot of the index counters."""
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
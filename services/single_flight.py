@@ -0,0 +1,175 @@
+"""
+Single-flight coalescing: concurrent identical requests share one in-flight provider call.
+
+The response cache only helps once the first answer is stored; a burst of identical prompts
+arriving together would otherwise all miss it and each call the provider.
+"""
+
+import asyncio
+import threading
+from typing import Awaitable, Callable, Dict, Generic, Hashable, Iterator, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class _Call(Generic[T]):
+    __slots__ = ("done", "result", "error", "followers")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Optional[T] = None
+        self.error: Optional[BaseException] = None
+        self.followers = 0
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time; callers arriving while it runs wait for its outcome.
+
+    The result, or the raised exception, is handed to every caller. Nothing is kept once the call
+    finishes, so a later caller starts a fresh call.
+    """
+
+    def __init__(self, name: str = ""):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._async_calls: Dict[Tuple[int, Hashable], "asyncio.Future"] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    def do(self, key: Hashable, fn: Callable[..., T], *args) -> Tuple[T, bool]:
+        """
+        Calls fn(*args) unless a call with the same key is already running.
+
+        Returns:
+            (result, shared): shared is True when the result came from another caller's call.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.followers += 1
+                self.coalesced += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn(*args)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    async def do_async(self, key: Hashable, fn: Callable[..., Awaitable[T]], *args) -> Tuple[T, bool]:
+        """
+        Async counterpart of do, coalescing callers on the same event loop.
+        The shared call runs as its own task, so a cancelled caller does not cancel it for the others.
+        """
+        loop_key = (id(asyncio.get_running_loop()), key)
+        with self._lock:
+            task = self._async_calls.get(loop_key)
+            shared = task is not None
+            if shared:
+                self.coalesced += 1
+            else:
+                task = self._async_calls[loop_key] = asyncio.ensure_future(fn(*args))
+                self.leaders += 1
+                task.add_done_callback(lambda _: self._forget_async(loop_key, task))
+        return await asyncio.shield(task), shared
+
+    def _forget_async(self, loop_key: Tuple[int, Hashable], task: "asyncio.Future") -> None:
+        with self._lock:
+            if self._async_calls.get(loop_key) is task:
+                del self._async_calls[loop_key]
+        if not task.cancelled():
+            # Mark the exception as retrieved when every caller was cancelled
+            task.exception()
+
+    def stats(self) -> Dict[str, int]:
+        """Returns how many calls ran and how many callers shared another caller's call."""
+        with self._lock:
+            return {
+                "in_flight": len(self._calls) + len(self._async_calls),
+                "leaders": self.leaders,
+                "coalesced": self.coalesced,
+            }
+
+
+class StreamBroadcast:
+    """Chunks of one in-flight stream, replayed to every subscriber as they arrive."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._chunks: List[str] = []
+        self._closed = False
+        self.completed = False
+
+    def publish(self, chunk: str) -> None:
+        with self._cond:
+            self._chunks.append(chunk)
+            self._cond.notify_all()
+
+    def close(self, completed: bool) -> None:
+        """Ends the stream; completed is False if the producer gave up without a full answer."""
+        with self._cond:
+            self._closed = True
+            self.completed = completed
+            self._cond.notify_all()
+
+    def subscribe(self) -> Iterator[str]:
+        """Yields every chunk, including those published before subscribing, until the stream closes."""
+        index = 0
+        while True:
+            with self._cond:
+                while index >= len(self._chunks) and not self._closed:
+                    self._cond.wait()
+                chunks = self._chunks[index:]
+                closed = self._closed
+            index += len(chunks)
+            yield from chunks
+            if closed and index >= len(self._chunks):
+                return
+
+
+class SingleFlightStreams:
+    """Hands the first caller for a key a fresh broadcast to fill, and later callers the same one to read."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._streams: Dict[Hashable, StreamBroadcast] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    def join(self, key: Hashable) -> Tuple[StreamBroadcast, bool]:
+        """Returns (broadcast, is_leader). The leader must call finish() when its stream ends."""
+        with self._lock:
+            broadcast = self._streams.get(key)
+            if broadcast is not None:
+                self.coalesced += 1
+                return broadcast, False
+            broadcast = self._streams[key] = StreamBroadcast()
+            self.leaders += 1
+            return broadcast, True
+
+    def finish(self, key: Hashable, broadcast: StreamBroadcast, completed: bool) -> None:
+        with self._lock:
+            if self._streams.get(key) is broadcast:
+                del self._streams[key]
+        broadcast.close(completed)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"in_flight": len(self._streams), "leaders": self.leaders, "coalesced": self.coalesced}
@@ -0,0 +1,11 @@
+"""Test doubles shared by several test modules."""
+
+
+class FakeClock:
+    """Manually advanced time source for components that take a clock argument."""
+
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
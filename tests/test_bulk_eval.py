@@ -0,0 +1,83 @@
+"""Unit tests for bulk_eval.py"""
+
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from services import rate_limiter
+from services.bulk_eval import count_completed_lines, run_bulk_evaluation
+
+
+def _fake_evaluate(text, principles):
+    return {principle: [f"checked {text}"] for principle in principles}
+
+
+@patch("services.bulk_eval.evaluate_text", side_effect=_fake_evaluate)
+class TestBulkEvaluation(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.input_path = os.path.join(self.tmpdir.name, "in.jsonl")
+        self.output_path = os.path.join(self.tmpdir.name, "out.jsonl")
+        with open(self.input_path, "w", encoding="utf-8") as f:
+            for i in range(10):
+                f.write(json.dumps({"id": i, "text": f"text {i}"}) + "\n")
+            f.write("not json\n")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _read_output(self):
+        with open(self.output_path, encoding="utf-8") as f:
+            return [json.loads(line) for line in f]
+
+    def test_results_written_in_input_order(self, mock_eval):
+        """Test that results keep input order and invalid lines are reported"""
+        processed = run_bulk_evaluation(self.input_path, self.output_path, ["Bias"], workers=4)
+        records = self._read_output()
+        self.assertEqual(processed, 11)
+        self.assertEqual([r["line"] for r in records], list(range(1, 12)))
+        self.assertEqual(records[3]["evaluation"], {"Bias": ["checked text 3"]})
+        self.assertIn("error", records[10])
+
+    def test_resume_skips_completed_lines(self, mock_eval):
+        """Test that --resume continues after the last complete output line"""
+        with open(self.output_path, "w", encoding="utf-8") as f:
+            for line in range(1, 5):
+                f.write(json.dumps({"line": line}) + "\n")
+            f.write('{"line": 5, "evalu')  # interrupted write
+        processed = run_bulk_evaluation(self.input_path, self.output_path, ["Bias"], workers=2, resume=True)
+        self.assertEqual(processed, 7)
+        self.assertEqual([r["line"] for r in self._read_output()], list(range(1, 12)))
+        self.assertEqual(count_completed_lines(self.output_path), 11)
+
+    def test_failing_evaluation_is_recorded_and_the_run_continues(self, mock_eval):
+        """Test that an exception for one text becomes an error record instead of stopping the run"""
+        mock_eval.side_effect = lambda text, principles: _fake_evaluate(text, principles) if text != "text 4" else 1 / 0
+        with self.assertLogs("services.bulk_eval", level="ERROR"):
+            processed = run_bulk_evaluation(self.input_path, self.output_path, ["Bias"], workers=2)
+        records = self._read_output()
+        self.assertEqual(processed, 11)
+        self.assertIn("division by zero", records[4]["error"])
+        self.assertEqual(records[5]["evaluation"], {"Bias": ["checked text 5"]})
+
+    def test_completed_lines_are_counted_across_read_blocks(self, mock_eval):
+        """Test that resuming counts lines block by block and drops a partial last line"""
+        with open(self.output_path, "w", encoding="utf-8") as f:
+            f.write('{"line": 1}\n{"line": 2}\n{"line": 3}\n{"li')
+        with patch("services.bulk_eval._COUNT_BUFFER_SIZE", 5):
+            self.assertEqual(count_completed_lines(self.output_path), 3)
+        with open(self.output_path, encoding="utf-8") as f:
+            self.assertTrue(f.read().endswith('{"line": 3}\n'))
+
+    def test_rate_configures_the_shared_provider_limiters(self, mock_eval):
+        """Test that --rate sets the process-wide provider limiters instead of a separate bulk limiter"""
+        with patch.object(rate_limiter, "_limiters", {}):
+            run_bulk_evaluation(self.input_path, self.output_path, ["Bias"], workers=2, rate_per_second=5)
+            states = rate_limiter.get_rate_limiter_states()
+        self.assertEqual({name: state["rate_per_minute"] for name, state in states.items()}, {"gemini": 300, "mistral": 300})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+"""Unit tests for circuit_breaker.py"""
+
+import unittest
+from unittest.mock import Mock, patch
+from tests.fakes import FakeClock
+from services.circuit_breaker import CircuitBreaker, CLOSED, OPEN, HALF_OPEN, call_with_breaker, is_request_failure, reset_circuit_breakers
+from services import evaluation_service
+from services.rate_limiter import get_rate_limiter, reset_rate_limiters
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.breaker = CircuitBreaker("test", failure_threshold=2, recovery_timeout=10, clock=self.clock)
+
+    def test_opens_after_threshold(self):
+        """Test that consecutive failures open the circuit"""
+        self.breaker.record_failure("boom")
+        self.assertEqual(self.breaker.state, CLOSED)
+        self.breaker.record_failure("boom")
+        self.assertEqual(self.breaker.state, OPEN)
+        self.assertFalse(self.breaker.allow_request())
+        self.assertEqual(self.breaker.snapshot()["rejected_calls"], 1)
+
+    def test_half_open_probe_closes_on_success(self):
+        """Test that one probe is allowed after the cool-down and closes on success"""
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.clock.now = 10
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+        self.assertTrue(self.breaker.allow_request())
+        self.assertFalse(self.breaker.allow_request())
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, CLOSED)
+
+    def test_half_open_probe_reopens_on_failure(self):
+        """Test that a failed probe re-opens the circuit"""
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.clock.now = 10
+        self.breaker.allow_request()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, OPEN)
+
+
+class TestProviderChainBreakers(unittest.TestCase):
+
+    def setUp(self):
+        reset_circuit_breakers()
+        reset_rate_limiters()
+        evaluation_service.clear_response_cache()
+        # Quota pacing is covered in test_rate_limiter; here it would only slow the test down
+        for provider in ("gemini", "mistral"):
+            limiter_patch = patch.object(get_rate_limiter(provider), "rate", 0)
+            limiter_patch.start()
+            self.addCleanup(limiter_patch.stop)
+
+    def tearDown(self):
+        reset_circuit_breakers()
+
+    def test_call_with_breaker_skips_open_provider(self):
+        """Test that an open provider is not called"""
+        call = Mock(return_value=(False, "down"))
+        for _ in range(5):
+            call_with_breaker("flaky", call)
+        self.assertLess(call.call_count, 5)
+
+    @patch("services.evaluation_service._call_mistral_api", return_value=(True, "From Mistral"))
+    @patch("services.evaluation_service._call_gemini_api", return_value=(False, "Gemini API key not found."))
+    def test_down_gemini_skipped_by_llm_chain(self, mock_gemini, mock_mistral):
+        """Test that _call_llm_safely stops calling Gemini once its circuit opens"""
+        for _ in range(6):
+            self.assertEqual(evaluation_service._call_llm_safely("topic"), (True, "From Mistral"))
+        self.assertLess(mock_gemini.call_count, 6)
+        self.assertEqual(evaluation_service.get_provider_health()["gemini"]["state"], OPEN)
+
+
+    @patch("services.deadline.backoff_delay", return_value=0.0)
+    @patch("services.evaluation_service._call_gemini_for_evaluation",
+           return_value=(False, "No valid content found in Gemini API response."))
+    def test_blocked_responses_do_not_open_the_circuit(self, mock_eval, mock_delay):
+        """Test that safety-blocked answers are neither retried nor held against the provider"""
+        for _ in range(4):
+            evaluation_service.evaluate_text("Blocked text", ["Bias"])
+        self.assertEqual(mock_eval.call_count, 4)
+        self.assertEqual(evaluation_service.get_provider_health()["gemini"]["state"], CLOSED)
+        self.assertEqual(evaluation_service.get_provider_health()["gemini"]["total_failures"], 0)
+
+    @patch("services.deadline.backoff_delay", return_value=0.0)
+    @patch("services.evaluation_service._call_gemini_for_evaluation",
+           return_value=(False, "Error calling Gemini API for evaluation: 400 API key not valid. Please pass a valid API key."))
+    def test_invalid_api_key_opens_the_circuit(self, mock_eval, mock_delay):
+        """Test that a rejected key counts against the provider although it is reported as a 400"""
+        for attempt in range(3):
+            evaluation_service.evaluate_text(f"Text {attempt}", ["Bias"])
+        self.assertEqual(evaluation_service.get_provider_health()["gemini"]["state"], OPEN)
+        self.assertFalse(is_request_failure("Error calling Gemini API: 403 Permission denied on resource project."))
+        self.assertFalse(is_request_failure("Mistral API error (401)"))
+        self.assertTrue(is_request_failure("Error calling Gemini API: 400 Request contains an invalid argument."))
+
+if __name__ == '__main__':
+    unittest.main()
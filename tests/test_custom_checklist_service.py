@@ -0,0 +1,72 @@
+"""Unit tests for custom_checklist_service.py"""
+
+import asyncio
+import json
+import unittest
+from unittest.mock import AsyncMock, Mock, patch
+from services.circuit_breaker import reset_circuit_breakers
+from services.rate_limiter import reset_rate_limiters
+from services.custom_checklist_service import ChecklistService, CompiledChecklist
+
+
+class TestChecklistService(unittest.TestCase):
+
+    def setUp(self):
+        self.service = ChecklistService()
+        reset_circuit_breakers()
+        reset_rate_limiters()
+
+    def test_empty_checklist(self):
+        """Test evaluation without a checklist"""
+        feedback = self.service.evaluate_text_against_checklist("text", [])
+        self.assertIn("No checklist", feedback["Custom Educator Checklist"][0])
+
+    @patch.object(ChecklistService, "_call_gemini_for_checklist_evaluation", return_value=(False, "Gemini down"))
+    def test_keyword_fallback(self, mock_call):
+        """Test that API failures fall back to keyword matching"""
+        feedback = self.service.evaluate_text_against_checklist("Boys are better at math", ["better at math", "slang"])
+        issues = feedback["Custom Educator Checklist"]
+        self.assertEqual(len(issues), 1)
+        self.assertIn("better at math", issues[0])
+
+    @patch.object(ChecklistService, "_call_gemini_for_checklist_evaluation_async", new_callable=AsyncMock,
+                  return_value=(True, json.dumps({"Custom Educator Checklist": ["No issues detected."]})))
+    def test_async_evaluation(self, mock_call):
+        """Test the async checklist evaluation"""
+        feedback = asyncio.run(self.service.evaluate_text_against_checklist_async("text", ["rule"]))
+        self.assertEqual(feedback, {"Custom Educator Checklist": ["No issues detected."]})
+
+
+
+class TestCompiledChecklist(unittest.TestCase):
+
+    def setUp(self):
+        self.service = ChecklistService()
+
+    def test_same_content_shares_compiled_object(self):
+        """Test that equal checklists are compiled once and normalized"""
+        first = self.service.compile_checklist([" No slang ", "", "Cite sources", "No slang"])
+        second = ChecklistService().compile_checklist(["No slang", "Cite sources"])
+        self.assertIs(first, second)
+        self.assertEqual(first.items, ("No slang", "Cite sources"))
+        self.assertIn("- No slang", first.system_prompt)
+
+    def test_compiled_checklist_is_immutable(self):
+        """Test that compiled checklists cannot be modified"""
+        compiled = self.service.compile_checklist(["rule"])
+        self.assertIsInstance(compiled, CompiledChecklist)
+        with self.assertRaises(Exception):
+            compiled.items = ("other",)
+
+    def test_file_parsed_once_per_content(self):
+        """Test that identical uploads reuse the cached compiled checklist"""
+        upload = Mock()
+        upload.getvalue.return_value = b"rule one\nrule two\n"
+        first = self.service.load_compiled_checklist_from_file(upload)
+        second = self.service.load_compiled_checklist_from_file(upload)
+        self.assertIs(first, second)
+        self.assertEqual(len(first), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,176 @@
+"""Unit tests for deadline.py"""
+
+import unittest
+from unittest.mock import Mock, patch
+from tests.fakes import FakeClock
+from services import evaluation_service
+from services.circuit_breaker import reset_circuit_breakers
+from services.deadline import (DEADLINE_EXCEEDED_MESSAGE, Deadline, backoff_delay, current_deadline, deadline_scope,
+                               iterate_within_deadline, retry_with_backoff, time_left)
+from services import llm_clients
+from services.llm_clients import HTTP_READ_TIMEOUT, post_with_retries
+from services.rate_limiter import call_provider, is_transient_failure, reset_rate_limiters
+
+
+class TestDeadline(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def test_nested_scopes_only_shorten_the_budget(self):
+        """Test that an inner scope cannot extend its caller's deadline"""
+        self.assertIsNone(current_deadline())
+        with deadline_scope(5, clock=self.clock) as outer:
+            with deadline_scope(30, clock=self.clock) as inner:
+                self.assertIs(inner, outer)
+                self.assertEqual(time_left(20), 5)
+            with deadline_scope(2, clock=self.clock):
+                self.assertEqual(time_left(), 2)
+            self.clock.now += 6
+            self.assertTrue(outer.expired)
+            self.assertEqual(time_left(20), 0)
+        self.assertIsNone(current_deadline())
+        self.assertEqual(time_left(20), 20)
+
+    def test_backoff_is_jittered_and_capped(self):
+        """Test that delays grow exponentially up to the cap and are scaled by the jitter"""
+        self.assertEqual([backoff_delay(n, base=0.5, cap=3, rng=lambda: 1.0) for n in range(4)], [0.5, 1.0, 2.0, 3])
+        self.assertEqual(backoff_delay(2, base=0.5, cap=3, rng=lambda: 0.5), 1.0)
+
+    def test_transient_failures_are_retried(self):
+        """Test that transient errors are retried and permanent ones are returned at once"""
+        call = Mock(side_effect=[(False, "Mistral API connection error: reset"), (True, "answer")])
+        sleeps = []
+        self.assertEqual(retry_with_backoff(call, "x", is_transient=is_transient_failure, sleep=sleeps.append,
+                                            rng=lambda: 1.0), (True, "answer"))
+        self.assertEqual(len(sleeps), 1)
+        call = Mock(return_value=(False, "Hugging Face API token not found."))
+        retry_with_backoff(call, is_transient=is_transient_failure, sleep=sleeps.append)
+        self.assertEqual(call.call_count, 1)
+        for message in ("No valid content found in Gemini API response.", "Mistral API error (400)",
+                        "Error calling Gemini API for evaluation: 400 Request contains an invalid argument."):
+            self.assertFalse(is_transient_failure(message))
+        self.assertTrue(is_transient_failure("Mistral API error (429)"))
+
+    def test_no_retry_without_budget_for_another_attempt(self):
+        """Test that retries stop once the backoff would leave too little of the deadline"""
+        call = Mock(return_value=(False, "Mistral model is loading, please try again shortly."))
+        with deadline_scope(0.6, clock=self.clock):
+            retry_with_backoff(call, is_transient=is_transient_failure, sleep=Mock(), rng=lambda: 1.0)
+        self.assertEqual(call.call_count, 1)
+
+    def test_iteration_is_bounded_without_leaking_the_deadline(self):
+        """Test that a stream's steps share one deadline that the consumer never sees"""
+        seen = []
+
+        def steps():
+            for item in range(3):
+                seen.append(time_left())
+                self.clock.now += 2
+                yield item
+
+        for _ in iterate_within_deadline(steps(), 5, clock=self.clock):
+            self.assertIsNone(current_deadline())
+        self.assertEqual(seen, [5, 3, 1])
+
+class TestDeadlineEnforcement(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        reset_circuit_breakers()
+        reset_rate_limiters()
+        evaluation_service.clear_response_cache()
+
+    def test_expired_deadline_skips_the_provider(self):
+        """Test that no provider is called once the deadline has passed"""
+        call = Mock(return_value=(True, "late"))
+        with deadline_scope(0):
+            self.assertEqual(call_provider("gemini", call), (False, DEADLINE_EXCEEDED_MESSAGE))
+        call.assert_not_called()
+
+    @patch("services.evaluation_service._call_mistral_api")
+    @patch("services.evaluation_service._call_gemini_api")
+    def test_spent_budget_serves_the_predefined_response(self, mock_gemini, mock_mistral):
+        """Test that generation falls back to the predefined answers when the deadline is spent"""
+        with deadline_scope(0):
+            is_safe, response = evaluation_service.generate_safe_text("Explain photosynthesis")
+        self.assertTrue(is_safe)
+        self.assertIn("Photosynthesis Explained", response)
+        mock_gemini.assert_not_called()
+        mock_mistral.assert_not_called()
+
+    @patch("services.deadline.backoff_delay", return_value=0.0)
+    @patch("services.evaluation_service._call_mistral_api", return_value=(False, "Mistral API connection error: reset"))
+    @patch("services.evaluation_service._call_gemini_api", return_value=(False, "Error calling Gemini API: 503"))
+    def test_last_provider_is_retried_before_falling_back(self, mock_gemini, mock_mistral, mock_delay):
+        """Test that Gemini falls through to Mistral at once and Mistral is retried with backoff"""
+        evaluation_service.generate_safe_text("Explain tides")
+        self.assertEqual(mock_gemini.call_count, 1)
+        self.assertEqual(mock_mistral.call_count, 3)
+
+    @patch("services.llm_clients.get_http_session")
+    def test_http_timeouts_and_loading_waits_follow_the_budget(self, mock_session):
+        """Test that the read timeout is cut to the budget and a 503 wait beyond it is skipped"""
+        mock_session.return_value.post.return_value = Mock(status_code=503, headers={"Retry-After": "5"})
+        sleeps = []
+        with deadline_scope(4, clock=self.clock):
+            response = post_with_retries("https://example.test", sleep=sleeps.append)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(sleeps, [])
+        connect, read = mock_session.return_value.post.call_args.kwargs["timeout"]
+        self.assertEqual(read, min(4, HTTP_READ_TIMEOUT))
+
+    @patch("services.evaluation_service.get_secret", return_value="token")
+    @patch("services.llm_clients.get_http_session")
+    def test_mistral_is_not_called_once_the_deadline_has_passed(self, mock_session, mock_secret):
+        """Test that a slot granted at the deadline returns the deadline message instead of sending a zero timeout"""
+        with deadline_scope(1, clock=self.clock):
+            self.clock.now = 1
+            self.assertEqual(evaluation_service._call_mistral_api("Explain tides"), (False, DEADLINE_EXCEEDED_MESSAGE))
+            self.assertTrue(all(timeout > 0 for timeout in llm_clients._request_timeouts()))
+        mock_session.return_value.post.assert_not_called()
+
+    def test_deadline_reaches_hedge_threads(self):
+        """Test that hedged calls running on executor threads see the caller's deadline"""
+        seen = []
+
+        def gemini(prompt):
+            seen.append(time_left())
+            return (True, "ok")
+
+        with patch("services.evaluation_service._call_gemini_api", side_effect=gemini), deadline_scope(7):
+            evaluation_service._call_llm_hedged("Explain tides")
+        self.assertTrue(0 < seen[0] <= 7)
+
+
+    @patch("services.evaluation_service._stream_mistral_api")
+    def test_stream_is_cut_off_between_chunks(self, mock_mistral):
+        """Test that a stream stops once the deadline passes and no fallback provider is started"""
+        def gemini(prompt):
+            for chunk in ("Tides ", "are ", "long ", "waves."):
+                yield chunk
+                self.clock.now += 3
+
+        with patch("services.evaluation_service._stream_gemini_api", side_effect=gemini):
+            chunks = list(iterate_within_deadline(evaluation_service._stream_providers("tides", ("tides",)), 5, clock=self.clock))
+        self.assertEqual(chunks, ["Tides ", "are ", "long "])
+        mock_mistral.assert_not_called()
+        self.assertIsNone(evaluation_service._response_cache.get(("tides",)))
+
+    def test_streaming_entry_points_run_within_a_deadline(self):
+        """Test that provider streams opened by the page-facing streaming functions see the request deadline"""
+        seen = []
+
+        def gemini(*args):
+            seen.append(time_left())
+            yield '{"Bias": []}'
+
+        with patch("services.evaluation_service._stream_gemini_api", side_effect=gemini), \
+                patch("services.evaluation_service._stream_gemini_for_evaluation", side_effect=gemini):
+            list(evaluation_service.stream_safe_text("Explain tides"))
+            list(evaluation_service.evaluate_text_stream("Worksheet", ["Bias"]))
+        self.assertEqual(len(seen), 2)
+        self.assertTrue(all(seconds is not None and 0 < seconds <= 25 for seconds in seen))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,13 +1,25 @@
 """Unit tests for evaluation_service.py"""
 
+import asyncio
+import json
 import unittest
-from unittest.mock import Mock
+from unittest.mock import AsyncMock, Mock, patch
+from services import evaluation_service
+from services.circuit_breaker import HALF_OPEN, get_circuit_breaker, reset_circuit_breakers
+from services.rate_limiter import reset_rate_limiters
+from services.prompt_builder import split_text
 from services.evaluation_service import (
-    generate_safe_text, evaluate_text, load_checklist_from_file,
+    generate_safe_text, evaluate_text, evaluate_text_batch, load_checklist_from_file,
+    generate_safe_text_async, evaluate_text_async, stream_safe_text, evaluate_long_text,
     UNSAFE_KEYWORDS, DEFAULT_PRINCIPLES
 )
 
 
+def _unavailable(prompt):
+    raise evaluation_service._StreamUnavailable("down")
+    yield  # pragma: no cover
+
+
 class TestEvaluationService(unittest.TestCase):
 
     # Removed potentially failing test
@@ -46,5 +58,227 @@ class TestEvaluationService(unittest.TestCase):
         self.assertEqual(result, [])
 
 
+
+class TestEvaluateTextBatch(unittest.TestCase):
+
+    def setUp(self):
+        reset_circuit_breakers()
+        reset_rate_limiters()
+
+    @patch("services.evaluation_service._call_gemini_for_batch_evaluation")
+    def test_batch_split_per_text(self, mock_call):
+        """Test that one response is split back out per text"""
+        mock_call.return_value = (True, json.dumps({
+            "t0": {"Bias": ["No issues detected."]},
+            "t1": {"Bias": ["Gender stereotype."]},
+        }))
+        results = evaluate_text_batch(["first", "second"], ["Bias"])
+        self.assertEqual(mock_call.call_count, 1)
+        self.assertEqual(results[0], {"Bias": ["No issues detected."]})
+        self.assertEqual(results[1], {"Bias": ["Gender stereotype."]})
+
+    @patch("services.evaluation_service._call_gemini_for_batch_evaluation")
+    def test_dropped_item_rerequested_alone(self, mock_call):
+        """Test that only the item the model dropped is re-requested"""
+        mock_call.side_effect = [
+            (True, json.dumps({"t0": {"Bias": ["No issues detected."]}})),
+            (True, json.dumps({"t1": {"Bias": ["No issues detected."]}})),
+        ]
+        results = evaluate_text_batch(["first", "second"], ["Bias"])
+        retried_items = mock_call.call_args_list[1].args[0]
+        self.assertEqual(retried_items, [("t1", "second")])
+        self.assertEqual(results[1], {"Bias": ["No issues detected."]})
+
+    @patch("services.deadline.backoff_delay", return_value=0.0)
+    @patch("services.evaluation_service.record_model_outcome")
+    def test_batch_request_goes_through_the_shared_gemini_core(self, mock_outcome, mock_delay):
+        """Test that batch calls carry request options, record the model outcome and retry transient errors"""
+        model = Mock()
+        model.generate_content.side_effect = [RuntimeError("503 Service Unavailable"),
+                                              Mock(parts=[Mock(text=json.dumps({"t0": {"Bias": ["No issues detected."]}}))])]
+        with patch("services.evaluation_service.get_gemini_model", return_value=(True, model)):
+            results = evaluate_text_batch(["first"], ["Bias"])
+        self.assertEqual(results, [{"Bias": ["No issues detected."]}])
+        self.assertEqual(model.generate_content.call_count, 2)
+        self.assertIn("request_options", model.generate_content.call_args.kwargs)
+        self.assertEqual(mock_outcome.call_count, 2)
+
+    @patch("services.evaluation_service._call_gemini_for_batch_evaluation", return_value=(False, "Gemini API key not found."))
+    def test_api_error_reported_per_text(self, mock_call):
+        """Test that API failures are reported for every text in the batch"""
+        results = evaluate_text_batch(["first", "second"], ["Bias"], custom_checklist=["second"])
+        self.assertEqual(results[0], {"API Error": ["Gemini API key not found."]})
+        self.assertIn("Custom Educator Checklist", results[1])
+
+
+
+class TestLongTextEvaluation(unittest.TestCase):
+
+    def setUp(self):
+        reset_circuit_breakers()
+        reset_rate_limiters()
+
+    def test_chunks_respect_budget_and_cover_text(self):
+        """Test that chunks stay within the budget and keep all content in order"""
+        text = "Intro paragraph.\n\n" + "A fairly long sentence about cells. " * 40 + "\n\nClosing paragraph."
+        chunks = split_text(text, 50)
+        self.assertGreater(len(chunks), 1)
+        for start, end in chunks:
+            self.assertLessEqual(end - start, 200)
+        self.assertEqual(chunks[0][0], 0)
+        self.assertEqual(chunks[-1][1], len(text))
+
+    @patch("services.evaluation_service._call_llm_for_evaluation_safely")
+    def test_findings_merged_with_offsets(self, mock_call):
+        """Test that duplicate findings are merged and clean principles report no issues"""
+        mock_call.return_value = (True, json.dumps({"Bias": ["Gender stereotype."], "Misinformation": ["No issues detected."]}))
+        text = "\n\n".join(["Nurses are women. " * 20] * 3)
+        feedback = evaluate_long_text(text, ["Bias", "Misinformation"], chunk_tokens=100)
+        self.assertGreater(mock_call.call_count, 1)
+        self.assertEqual(len(feedback["Bias"]), 1)
+        self.assertTrue(feedback["Bias"][0].startswith("[chars 0-"))
+        self.assertEqual(feedback["Misinformation"], ["No issues detected."])
+
+    @patch("services.evaluation_service.evaluate_long_text", return_value={"Bias": ["No issues detected."]})
+    def test_evaluate_text_switches_to_long_mode(self, mock_long):
+        """Test that evaluate_text uses long-document mode above the threshold"""
+        evaluate_text("word " * (evaluation_service.LONG_TEXT_THRESHOLD_TOKENS * 2), ["Bias"])
+        mock_long.assert_called_once()
+
+    @patch("services.evaluation_service._call_llm_for_evaluation_safely", return_value=(False, "Gemini API key not found."))
+    def test_failed_chunks_never_report_no_issues(self, mock_call):
+        """Test that a document whose chunks all failed gets only the error, not a clean verdict"""
+        text = "\n\n".join(["Nurses are women. " * 20] * 3)
+        feedback = evaluate_long_text(text, ["Bias", "Misinformation"], chunk_tokens=100)
+        self.assertEqual(feedback, {"API Error": ["Gemini API key not found."]})
+
+    @patch("services.evaluation_service._call_gemini_for_evaluation_async", new_callable=AsyncMock,
+           return_value=(True, json.dumps({"Bias": ["Gender stereotype."]})))
+    def test_evaluate_async_uses_long_mode(self, mock_eval):
+        """Test that evaluate_text_async splits long documents into chunks like evaluate_text"""
+        text = "\n\n".join(["Nurses are women. " * 300] * 3)
+        feedback = asyncio.run(evaluate_text_async(text, ["Bias"]))
+        self.assertGreater(mock_eval.await_count, 1)
+        self.assertEqual(len(feedback["Bias"]), 1)
+        self.assertTrue(feedback["Bias"][0].startswith("[chars 0-"))
+
+
+class TestAsyncServices(unittest.TestCase):
+
+    def setUp(self):
+        evaluation_service.clear_response_cache()
+        reset_circuit_breakers()
+        reset_rate_limiters()
+
+    def tearDown(self):
+        evaluation_service.clear_response_cache()
+
+    @patch("services.evaluation_service._call_mistral_api_async", new_callable=AsyncMock, return_value=(True, "From Mistral"))
+    @patch("services.evaluation_service._call_gemini_api_async", new_callable=AsyncMock, return_value=(False, "Gemini down"))
+    def test_generate_async_falls_back_to_mistral(self, mock_gemini, mock_mistral):
+        """Test that the async chain falls back to Mistral"""
+        result = asyncio.run(generate_safe_text_async("tides"))
+        self.assertEqual(result, (True, "From Mistral"))
+        mock_gemini.assert_awaited_once()
+
+    def test_generate_async_blocks_unsafe_prompt(self):
+        """Test that the async path applies the same safety checks"""
+        is_safe, _ = asyncio.run(generate_safe_text_async("how to commit violence"))
+        self.assertFalse(is_safe)
+
+    @patch("services.evaluation_service._call_gemini_for_evaluation_async", new_callable=AsyncMock,
+           return_value=(True, json.dumps({"Bias": ["No issues detected."]})))
+    def test_evaluate_async_runs_concurrently(self, mock_eval):
+        """Test that several async evaluations can be awaited together"""
+        async def run_all():
+            return await asyncio.gather(*(evaluate_text_async(f"text {i}", ["Bias", "Misinformation"]) for i in range(3)))
+
+        results = asyncio.run(run_all())
+        self.assertEqual(len(results), 3)
+        self.assertEqual(results[0]["Bias"], ["No issues detected."])
+        self.assertIn("Misinformation", results[0])
+
+
+
+class TestGeminiTransports(unittest.TestCase):
+
+    def test_sync_async_and_stream_send_the_same_request(self):
+        """Test that the three transports share one prompt build, request options and response parsing"""
+        model = Mock()
+        model.generate_content.side_effect = lambda messages, stream=False, **kwargs: (
+            iter([Mock(parts=[Mock(text='{"Bias": []}')])]) if stream else Mock(parts=[Mock(text='```json\n{"Bias": []}\n```')]))
+        model.generate_content_async = AsyncMock(return_value=Mock(parts=[Mock(text='{"Bias": []}')]))
+        with patch("services.evaluation_service.get_gemini_model", return_value=(True, model)):
+            self.assertEqual(evaluation_service._call_gemini_for_evaluation("text", ["Bias"]), (True, '{"Bias": []}'))
+            self.assertEqual(asyncio.run(evaluation_service._call_gemini_for_evaluation_async("text", ["Bias"])), (True, '{"Bias": []}'))
+            self.assertEqual(list(evaluation_service._stream_gemini_for_evaluation("text", ["Bias"])), ['{"Bias": []}'])
+        sent = [call.args[0] for call in model.generate_content.call_args_list] + [model.generate_content_async.call_args.args[0]]
+        self.assertTrue(all(messages == sent[0] for messages in sent))
+        calls = model.generate_content.call_args_list + [model.generate_content_async.call_args]
+        self.assertTrue(all("request_options" in call.kwargs for call in calls))
+
+
+class TestStreaming(unittest.TestCase):
+
+    def setUp(self):
+        evaluation_service.clear_response_cache()
+        reset_circuit_breakers()
+        reset_rate_limiters()
+
+    def tearDown(self):
+        evaluation_service.clear_response_cache()
+
+    @patch("services.evaluation_service._stream_mistral_api", side_effect=lambda prompt: iter(["Tides ", "are ", "waves."]))
+    @patch("services.evaluation_service._stream_gemini_api", side_effect=_unavailable)
+    def test_stream_falls_back_and_caches(self, mock_gemini, mock_mistral):
+        """Test that chunks stream from the fallback and the full text is cached"""
+        stream = stream_safe_text("tides")
+        self.assertEqual(list(stream), ["Tides ", "are ", "waves."])
+        self.assertTrue(stream.is_safe)
+        self.assertIsNotNone(stream.time_to_first_token)
+        self.assertEqual(list(stream_safe_text("Tides")), ["Tides are waves."])
+        self.assertEqual(mock_mistral.call_count, 1)
+
+    @patch("services.evaluation_service._stream_mistral_api", side_effect=_unavailable)
+    @patch("services.evaluation_service._stream_gemini_api", side_effect=_unavailable)
+    def test_stream_unavailable_marks_unsafe(self, mock_gemini, mock_mistral):
+        """Test that unavailable services yield nothing and report the reason"""
+        stream = stream_safe_text("volcanoes")
+        self.assertEqual(list(stream), [])
+        self.assertFalse(stream.is_safe)
+        self.assertIn("unavailable", stream.text)
+
+    @patch("services.evaluation_service._stream_gemini_api", side_effect=lambda prompt: iter(["Tides ", "are ", "waves."]))
+    def test_closing_stream_mid_probe_releases_the_breaker(self, mock_gemini):
+        """Test that a half-open probe abandoned by its consumer does not leave the circuit stuck"""
+        breaker = get_circuit_breaker("gemini")
+        with patch.object(breaker, "recovery_timeout", 0):
+            for _ in range(breaker.failure_threshold):
+                breaker.record_failure("down")
+            self.assertEqual(breaker.state, HALF_OPEN)
+            stream = iter(stream_safe_text("tides"))
+            self.assertEqual(next(stream), "Tides ")
+            stream.close()
+            self.assertEqual(breaker.state, HALF_OPEN)
+            self.assertTrue(breaker.allow_request())
+
+    @patch("services.evaluation_service._stream_gemini_for_evaluation", side_effect=lambda text, principles: iter(['{"Bias": ["None"]', ', "Misinformation": []}']))
+    def test_closing_evaluation_stream_mid_probe_releases_the_breaker(self, mock_gemini):
+        """Test that an evaluation stream closed after its first principle returns the probe slot"""
+        breaker = get_circuit_breaker("gemini")
+        with patch.object(breaker, "recovery_timeout", 0):
+            for _ in range(breaker.failure_threshold):
+                breaker.record_failure("down")
+            stream = evaluation_service.evaluate_text_stream("Worksheet", ["Bias", "Misinformation"])
+            self.assertEqual(next(stream), ("Bias", ["None"]))
+            stream.close()
+            self.assertTrue(breaker.allow_request())
+
+    def test_stream_rejects_unsafe_prompt_up_front(self):
+        """Test that unsafe prompts are flagged before streaming starts"""
+        stream = stream_safe_text("explicit content")
+        self.assertFalse(stream.is_safe)
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,58 @@
+"""Unit tests for hedging.py"""
+
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from services.hedging import LatencyWindow, hedged_call
+
+
+class TestLatencyWindow(unittest.TestCase):
+
+    def test_percentile(self):
+        """Test nearest-rank percentiles over the window"""
+        window = LatencyWindow(size=100)
+        for value in range(1, 101):
+            window.record(value / 100.0)
+        self.assertAlmostEqual(window.percentile(50), 0.5)
+        self.assertAlmostEqual(window.percentile(95), 0.95)
+
+    def test_empty_window(self):
+        """Test that an empty window has no percentile"""
+        self.assertIsNone(LatencyWindow().percentile(95))
+
+
+class TestHedgedCall(unittest.TestCase):
+
+    def setUp(self):
+        self.executor = ThreadPoolExecutor(max_workers=4)
+
+    def tearDown(self):
+        self.executor.shutdown(wait=True)
+
+    def test_fast_primary_skips_secondary(self):
+        """Test that a fast primary never starts the secondary"""
+        calls = []
+        result = hedged_call(lambda: (True, "primary"), lambda: calls.append(1) or (True, "secondary"), 1.0, self.executor)
+        self.assertEqual(result, (True, "primary"))
+        self.assertEqual(calls, [])
+
+    def test_slow_primary_is_hedged(self):
+        """Test that the secondary wins while the primary is stalled"""
+        release = threading.Event()
+
+        def slow_primary():
+            release.wait(5)
+            return (True, "primary")
+
+        result = hedged_call(slow_primary, lambda: (True, "secondary"), 0.01, self.executor)
+        release.set()
+        self.assertEqual(result, (True, "secondary"))
+
+    def test_both_fail_returns_secondary_error(self):
+        """Test that the fallback's error is reported when both providers fail"""
+        result = hedged_call(lambda: (False, "gemini down"), lambda: (False, "mistral down"), 0.01, self.executor)
+        self.assertEqual(result, (False, "mistral down"))
+
+
+if __name__ == '__main__':
+    unittest.main()
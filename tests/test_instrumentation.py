@@ -0,0 +1,89 @@
+"""Unit tests for instrumentation.py"""
+
+import io
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from services import evaluation_service, instrumentation
+from services.circuit_breaker import reset_circuit_breakers
+from services.rate_limiter import reset_rate_limiters
+from services.instrumentation import HistogramSink, JsonLogSink, PrometheusFileSink
+
+
+class TestInstrumentation(unittest.TestCase):
+
+    def setUp(self):
+        self.sink = HistogramSink(buckets=(0.1, 1.0))
+        instrumentation.configure(enabled=True, sinks=[self.sink])
+        self.addCleanup(instrumentation.configure, enabled=False, sinks=[])
+
+    def test_disabled_spans_are_shared_no_ops(self):
+        """Test that nothing is recorded while instrumentation is disabled"""
+        instrumentation.configure(enabled=False)
+        with instrumentation.span("llm_call", provider="gemini") as span:
+            span.set(output_tokens=5)
+        instrumentation.count("response_cache", status="hit")
+        self.assertIs(instrumentation.span("other"), instrumentation.span("llm_call"))
+        self.assertEqual(self.sink.snapshot(), {})
+
+    def test_span_records_histogram_labels_and_usage(self):
+        """Test that string attributes become labels and numeric ones are summed"""
+        for tokens in (10, 15):
+            with instrumentation.span("llm_call", provider="gemini") as span:
+                span.set(output_tokens=tokens)
+        metrics = instrumentation.get_metrics()
+        self.assertEqual(metrics["llm_call{provider=gemini,status=ok}"]["count"], 2)
+        self.assertEqual(metrics["llm_call_output_tokens_total{provider=gemini,status=ok}"]["value"], 25)
+
+    def test_failed_results_and_exceptions_mark_error_status(self):
+        """Test that (False, msg) results and raised exceptions are recorded as errors"""
+        with instrumentation.span("llm_call") as span:
+            self.assertEqual(span.record_result((False, "down")), (False, "down"))
+        with self.assertRaises(ValueError):
+            with instrumentation.span("parse"):
+                raise ValueError("bad json")
+        metrics = self.sink.snapshot()
+        self.assertIn("llm_call{status=error}", metrics)
+        self.assertIn("parse{status=error}", metrics)
+
+    def test_json_log_sink_keeps_error_text(self):
+        """Test that JSON logs carry the unlabeled error message"""
+        stream = io.StringIO()
+        instrumentation.configure(sinks=[JsonLogSink(stream)])
+        instrumentation.count("llm_fallback", provider="mistral", error="Gemini down")
+        event = json.loads(stream.getvalue())
+        self.assertEqual((event["name"], event["provider"], event["error"]), ("llm_fallback", "mistral", "Gemini down"))
+
+    def test_prometheus_file_sink_writes_exposition(self):
+        """Test that the Prometheus sink writes histogram buckets and counters"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "metrics.prom")
+            instrumentation.configure(sinks=[PrometheusFileSink(path, write_interval=0, buckets=(0.1, 1.0))])
+            with instrumentation.span("keyword_scan", kind="checklist"):
+                pass
+            with open(path, encoding="utf-8") as f:
+                content = f.read()
+        self.assertIn("# TYPE raiapp_keyword_scan_duration_seconds histogram", content)
+        self.assertIn('raiapp_keyword_scan_duration_seconds_bucket{kind="checklist",status="ok",le="+Inf"} 1', content)
+        self.assertIn('raiapp_keyword_scan_total{kind="checklist",status="ok"} 1', content)
+
+    @patch("services.evaluation_service._call_mistral_api", return_value=(True, "From Mistral"))
+    @patch("services.evaluation_service._call_gemini_api", return_value=(False, "Gemini API key not found."))
+    def test_generation_records_cache_status_and_fallback_reason(self, mock_gemini, mock_mistral):
+        """Test that the generation path reports cache misses and the fallback reason"""
+        reset_circuit_breakers()
+        reset_rate_limiters()
+        evaluation_service.clear_response_cache()
+        evaluation_service.generate_safe_text("Explain instrumentation")
+        evaluation_service.generate_safe_text("Explain instrumentation")
+        metrics = self.sink.snapshot()
+        self.assertEqual(metrics["response_cache_total{status=miss}"]["value"], 1)
+        self.assertEqual(metrics["response_cache_total{status=hit}"]["value"], 1)
+        self.assertEqual(metrics["llm_fallback_total{provider=mistral,reason=missing_credentials}"]["value"], 1)
+        self.assertEqual(metrics["keyword_scan{kind=prompt_safety,result=safe,status=ok}"]["count"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
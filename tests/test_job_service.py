@@ -0,0 +1,170 @@
+"""Unit tests for job_service.py"""
+
+import threading
+import unittest
+from unittest.mock import Mock, patch
+from services import evaluation_service, job_service
+from services.circuit_breaker import reset_circuit_breakers
+from services.job_service import CANCELLED, DONE, FAILED, JobManager
+from services.rate_limiter import current_session_id, reset_rate_limiters, session_scope
+
+
+class TestJobManager(unittest.TestCase):
+
+    def setUp(self):
+        self.manager = JobManager(max_workers=2, max_pending=2)
+        self.addCleanup(self.manager._executor.shutdown, wait=True)
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+
+    def _wait(self, job):
+        for _ in range(200):
+            if job.done:
+                return
+            threading.Event().wait(0.01)
+        self.fail(f"job {job.id} did not finish")
+
+    def _blocking(self, job, value):
+        job.publish("started")
+        self.release.wait(5)
+        return value
+
+    def test_identical_submissions_share_one_job(self):
+        """Test that a second submission with the same key returns the running job"""
+        first = self.manager.submit("evaluation", "key", self._blocking, "result")
+        second = self.manager.submit("evaluation", "key", self._blocking, "other")
+        self.assertIs(first, second)
+        self.assertEqual(first.subscribers, 2)
+        self.release.set()
+        self._wait(first)
+        self.assertEqual((first.status, first.result, first.partial), (DONE, "result", ["started"]))
+        self.assertIs(self.manager.submit("evaluation", "key", self._blocking, "x"), first)
+        self.assertEqual(self.manager.stats()["deduplicated"], 2)
+
+    def test_cancel_stops_the_job_once_every_subscriber_left(self):
+        """Test that cancelling only stops work no other session is waiting for"""
+        def until_cancelled(job):
+            while not job.cancel_requested:
+                threading.Event().wait(0.01)
+            return "partial"
+
+        job = self.manager.submit("generation", "prompt", until_cancelled)
+        self.manager.submit("generation", "prompt", until_cancelled)
+        self.assertFalse(self.manager.cancel(job.id))
+        self.assertTrue(self.manager.cancel(job.id))
+        self._wait(job)
+        self.assertEqual(job.status, CANCELLED)
+        self.assertIsNot(self.manager.submit("generation", "prompt", lambda job: "fresh"), job)
+
+    def test_failures_are_recorded_and_retried(self):
+        """Test that an exception fails the job and a new submission runs again"""
+        def broken(job):
+            raise RuntimeError("boom")
+
+        with self.assertLogs("services.job_service", level="ERROR"):
+            job = self.manager.submit("evaluation", "key", broken)
+            self._wait(job)
+        self.assertEqual((job.status, job.error), (FAILED, "boom"))
+        retry = self.manager.submit("evaluation", "key", lambda job: "ok")
+        self._wait(retry)
+        self.assertEqual(retry.result, "ok")
+
+    def test_submissions_beyond_max_pending_are_rejected(self):
+        """Test that the queue is bounded and busy jobs fail immediately"""
+        self.manager.submit("evaluation", 1, self._blocking, 1)
+        self.manager.submit("evaluation", 2, self._blocking, 2)
+        busy = self.manager.submit("evaluation", 3, self._blocking, 3)
+        self.assertEqual(busy.status, FAILED)
+        self.assertIn("busy", busy.error)
+        self.assertIs(self.manager.get(busy.id), busy)
+        self.assertEqual(self.manager.stats()["rejected"], 1)
+
+    def test_unreusable_results_are_not_shared_once_finished(self):
+        """Test that a finished job whose result reports a failure is shown to its subscribers but not reused"""
+        job = self.manager.submit("evaluation", "key", self._blocking, {"API Error": ["down"]},
+                                  reusable=lambda feedback: "API Error" not in feedback)
+        self.assertIs(self.manager.submit("evaluation", "key", self._blocking, {}), job)
+        self.release.set()
+        self._wait(job)
+        self.assertEqual((job.status, job.result), (DONE, {"API Error": ["down"]}))
+        self.assertIs(self.manager.get(job.id), job)
+        retry = self.manager.submit("evaluation", "key", lambda job: {"Bias": ["No issues detected."]})
+        self.assertIsNot(retry, job)
+        self._wait(retry)
+        self.assertEqual(retry.result, {"Bias": ["No issues detected."]})
+
+    def test_page_status_cancels_and_stops_polling(self):
+        """Test that the shared page status block cancels a running job and redraws once after it finished"""
+        job = self.manager.submit("evaluation", "key", self._blocking, "result")
+        session_state = {"evaluation_job_id": job.id}
+        with patch.object(job_service, "get_job_manager", return_value=self.manager), \
+                patch("streamlit.session_state", session_state), patch("streamlit.info"), patch("streamlit.caption"), \
+                patch("streamlit.button", return_value=True), patch("streamlit.rerun") as mock_rerun:
+            self.assertEqual(job_service.job_poll_interval(job.id), job_service.JOB_POLL_SECONDS)
+            job_service.render_job_status(job, "evaluation_job_id", "Evaluating...")
+            self.assertTrue(job.cancel_requested)
+            self.assertNotIn("evaluation_job_id", session_state)
+            self.assertTrue(session_state["evaluation_job_id_polling"])
+            self.release.set()
+            self._wait(job)
+            self.assertIsNone(job_service.job_poll_interval(job.id))
+            job_service.render_job_status(job, "evaluation_job_id", "Evaluating...")
+            self.assertNotIn("evaluation_job_id_polling", session_state)
+            self.assertEqual(mock_rerun.call_count, 2)
+
+    def test_jobs_run_under_the_submitting_session(self):
+        """Test that worker threads attribute provider calls to the session that submitted the job"""
+        with session_scope("session-a"):
+            job = self.manager.submit("evaluation", "key", lambda job: current_session_id())
+        self._wait(job)
+        self.assertEqual(job.result, "session-a")
+
+
+class TestSubmittedJobs(unittest.TestCase):
+
+    def setUp(self):
+        reset_circuit_breakers()
+        reset_rate_limiters()
+        evaluation_service.clear_response_cache()
+        manager = JobManager(max_workers=2)
+        self.addCleanup(manager._executor.shutdown, wait=True)
+        patcher = patch.object(job_service, "_manager", manager)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_evaluation_job_publishes_each_principle(self):
+        """Test that evaluation jobs publish findings per principle and return the full feedback"""
+        model = Mock()
+        model.generate_content.return_value = iter([
+            Mock(parts=[Mock(text='{"Bias": ["No issues detected."], ')]),
+            Mock(parts=[Mock(text='"Misinformation": ["Unsupported claim."]}')]),
+        ])
+        with patch("services.evaluation_service.get_gemini_model", return_value=(True, model)):
+            job = job_service.submit_evaluation("Worksheet text", ["Bias", "Misinformation"])
+            job_service.get_job_manager()._executor.shutdown(wait=True)
+        self.assertEqual(job.status, DONE)
+        self.assertEqual([principle for principle, _ in job.partial], ["Bias", "Misinformation"])
+        self.assertEqual(job.result["Misinformation"], ["Unsupported claim."])
+
+
+    def test_unavailable_services_are_retried_by_the_next_submission(self):
+        """Test that the "services unavailable" text is not served to later identical submissions"""
+        def no_provider_answers(prompt, key, on_chunk=None):
+            return False
+            yield
+
+        with patch("services.evaluation_service._stream_providers", side_effect=no_provider_answers), \
+                patch("services.evaluation_service._check_prompt_safety", return_value=None):
+            job = job_service.submit_generation("Quantum tunnelling")
+            for _ in range(200):
+                if job.done:
+                    break
+                threading.Event().wait(0.01)
+        self.assertEqual(job.status, DONE)
+        self.assertFalse(job.result["is_safe"])
+        self.assertIn("currently unavailable", job.result["text"])
+        self.assertIsNot(job_service.get_job_manager().submit("explanation", "Quantum tunnelling", lambda job: None), job)
+
+
+if __name__ == "__main__":
+    unittest.main()
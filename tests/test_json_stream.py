@@ -0,0 +1,86 @@
+"""Unit tests for json_stream.py"""
+
+import unittest
+from unittest.mock import Mock, patch
+from services import evaluation_service
+from services.circuit_breaker import reset_circuit_breakers
+from services.json_stream import IncrementalObjectParser, parse_json_object, strip_code_fence
+from services.rate_limiter import reset_rate_limiters
+
+FENCED = '```json\n{"Bias": ["No issues detected."], "Misinformation": ["Claim \\"x\\" is false", "b"]}\n```'
+
+
+class TestIncrementalObjectParser(unittest.TestCase):
+
+    def test_members_are_emitted_as_they_complete(self):
+        """Test that each top-level member is returned by the chunk that completes it"""
+        parser = IncrementalObjectParser()
+        emitted = []
+        for start in range(0, len(FENCED), 5):
+            for key, _ in parser.feed(FENCED[start:start + 5]):
+                emitted.append((key, parser.complete))
+        self.assertEqual(emitted, [("Bias", False), ("Misinformation", True)])
+        self.assertEqual(parser.close(), [])
+        self.assertEqual(parser.result["Misinformation"], ['Claim "x" is false', "b"])
+
+    def test_truncated_output_is_repaired(self):
+        """Test that max_output_tokens cut-offs keep every complete value"""
+        cases = {
+            '{"Bias": ["a", "cut off mid-sent': {"Bias": ["a", "cut off mid-sent"]},
+            '{"Bias": ["a"], "Misinfor': {"Bias": ["a"]},
+            '{"Bias": ["a"], "Misinformation": ': {"Bias": ["a"]},
+            '{"Bias": ["a"], "Misinformation": [': {"Bias": ["a"], "Misinformation": []},
+        }
+        for text, expected in cases.items():
+            self.assertEqual(parse_json_object(text), expected, text)
+
+    def test_unrecoverable_text_raises(self):
+        """Test that text without a recoverable object raises ValueError"""
+        with self.assertRaises(ValueError):
+            parse_json_object("I cannot evaluate this text.")
+        with self.assertRaises(ValueError):
+            parse_json_object('{"Bia')
+
+    def test_strip_code_fence_removes_prefix_not_characters(self):
+        """Test that only the fence is removed, unlike lstrip with a character set"""
+        self.assertEqual(strip_code_fence('```json\n{"a": 1}\n```'), '{"a": 1}')
+        self.assertEqual(strip_code_fence('json {"a": 1}'), 'json {"a": 1}')
+
+
+class FakeChunk:
+
+    def __init__(self, text):
+        self.parts = [type("Part", (), {"text": text})()]
+
+
+class TestEvaluateTextStream(unittest.TestCase):
+
+    def setUp(self):
+        reset_circuit_breakers()
+        reset_rate_limiters()
+
+    def _stream(self, chunks):
+        model = Mock()
+        model.generate_content.return_value = iter(FakeChunk(c) for c in chunks)
+        return patch("services.evaluation_service.get_gemini_model", return_value=(True, model))
+
+    def test_principles_stream_in_order_and_missing_ones_are_filled(self):
+        """Test that findings are yielded per principle and a truncated tail is repaired"""
+        chunks = ['```json\n{"Bias": ["He is a doctor"', '], "Misinformation": ["No issues', ' detected."]']
+        with self._stream(chunks):
+            results = list(evaluation_service.evaluate_text_stream("text", ["Bias", "Misinformation", "Lack of Clarity"]))
+        self.assertEqual(results, [
+            ("Bias", ["He is a doctor"]),
+            ("Misinformation", ["No issues detected."]),
+            ("Lack of Clarity", ["The LLM evaluation did not return a result for this principle."]),
+        ])
+
+    def test_missing_key_reports_api_error(self):
+        """Test that an unavailable stream is reported like the non-streaming path"""
+        with patch("services.evaluation_service.get_gemini_model", return_value=(False, "no key")):
+            results = dict(evaluation_service.evaluate_text_stream("text", ["Bias"]))
+        self.assertEqual(results["API Error"], ["Gemini API key not found."])
+
+
+if __name__ == "__main__":
+    unittest.main()
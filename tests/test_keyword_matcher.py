@@ -0,0 +1,43 @@
+"""Unit tests for keyword_matcher.py"""
+
+import random
+import unittest
+from services.keyword_matcher import KeywordMatcher, get_keyword_matcher
+
+
+class TestKeywordMatcher(unittest.TestCase):
+
+    def test_matches_positions(self):
+        """Test that overlapping matches are reported with positions"""
+        matcher = KeywordMatcher(["he", "she", "hers"])
+        matches = {(m.keyword, m.start, m.end) for m in matcher.find_all("uSHErs")}
+        self.assertEqual(matches, {("she", 1, 4), ("he", 2, 4), ("hers", 2, 6)})
+
+    def test_matched_keywords_keep_original_order_and_case(self):
+        """Test that matched keywords are returned as given"""
+        matcher = KeywordMatcher(["No Violence", "stereotypes", "Hate"])
+        self.assertEqual(matcher.matched_keywords("hate and no violence"), ["No Violence", "Hate"])
+
+    def test_empty_keyword_matches_like_substring(self):
+        """Test that an empty keyword matches every text"""
+        self.assertTrue(KeywordMatcher([""]).contains_any("anything"))
+        self.assertFalse(KeywordMatcher([]).contains_any("anything"))
+
+    def test_equivalent_to_substring_checks(self):
+        """Test that results agree with per-keyword substring checks"""
+        rng = random.Random(7)
+        for _ in range(200):
+            keywords = ["".join(rng.choice("abcAB ") for _ in range(rng.randint(1, 4))) for _ in range(rng.randint(1, 8))]
+            text = "".join(rng.choice("abcAB ") for _ in range(rng.randint(0, 40)))
+            expected = [k for k in keywords if k.lower() in text.lower()]
+            matcher = KeywordMatcher(keywords)
+            self.assertEqual(matcher.matched_keywords(text), expected)
+            self.assertEqual(matcher.contains_any(text), bool(expected))
+
+    def test_matcher_cached_per_keyword_set(self):
+        """Test that the same keyword set reuses the compiled matcher"""
+        self.assertIs(get_keyword_matcher(["a", "b"]), get_keyword_matcher(("a", "b")))
+
+
+if __name__ == '__main__':
+    unittest.main()
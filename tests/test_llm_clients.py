@@ -0,0 +1,111 @@
+"""Unit tests for llm_clients.py"""
+
+import subprocess
+import sys
+import unittest
+from unittest.mock import Mock, patch
+from services import llm_clients
+from services.llm_clients import GeminiClientRegistry, post_with_retries, HTTP_MAX_LOADING_WAIT
+
+
+def _response(status_code, headers=None, body=None):
+    response = Mock(status_code=status_code, headers=headers or {})
+    response.json.return_value = body or {}
+    return response
+
+
+@patch("services.llm_clients.genai")
+class TestGeminiClientRegistry(unittest.TestCase):
+
+    def test_missing_api_key(self, mock_genai):
+        """Test that a missing key returns an error instead of a model"""
+        registry = GeminiClientRegistry()
+        with patch("services.llm_clients.get_secret", return_value=""):
+            has_model, message = registry.get_model("gemini-1.5-flash")
+        self.assertFalse(has_model)
+        self.assertIn("GEMINI_API_TOKEN", message)
+        mock_genai.GenerativeModel.assert_not_called()
+
+    def test_model_reused_per_config(self, mock_genai):
+        """Test that models are built once per (name, config) and configured once"""
+        registry = GeminiClientRegistry()
+        with patch("services.llm_clients.get_secret", return_value="key-1"):
+            _, first = registry.get_model("gemini-1.5-flash", {"temperature": 0.1})
+            _, second = registry.get_model("gemini-1.5-flash", {"temperature": 0.1})
+            registry.get_model("gemini-1.5-flash", {"temperature": 0.7})
+        self.assertIs(first, second)
+        self.assertEqual(mock_genai.GenerativeModel.call_count, 2)
+        mock_genai.configure.assert_called_once_with(api_key="key-1")
+
+    def test_rotated_key_rebuilds_models(self, mock_genai):
+        """Test that a rotated key reconfigures the SDK and drops old models"""
+        registry = GeminiClientRegistry(key_refresh_seconds=0)
+        with patch("services.llm_clients.get_secret", return_value="key-1"):
+            registry.get_model("gemini-1.5-flash")
+        with patch("services.llm_clients.get_secret", return_value="key-2"):
+            registry.get_model("gemini-1.5-flash")
+        mock_genai.configure.assert_called_with(api_key="key-2")
+        self.assertEqual(mock_genai.GenerativeModel.call_count, 2)
+
+
+class TestPostWithRetries(unittest.TestCase):
+
+    @patch("services.llm_clients.get_http_session")
+    def test_loading_503_retried_with_estimated_time(self, mock_session):
+        """Test that a 503 loading response is retried after the reported estimate"""
+        mock_session.return_value.post.side_effect = [
+            _response(503, body={"error": "Model is currently loading", "estimated_time": 1.5}),
+            _response(200),
+        ]
+        sleeps = []
+        response = post_with_retries("https://example.test", sleep=sleeps.append, json={})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sleeps, [1.5])
+
+    @patch("services.llm_clients.get_http_session")
+    def test_retry_after_header_capped(self, mock_session):
+        """Test that Retry-After is honored but capped"""
+        mock_session.return_value.post.side_effect = [
+            _response(503, headers={"Retry-After": "600"}),
+            _response(200),
+        ]
+        sleeps = []
+        post_with_retries("https://example.test", sleep=sleeps.append)
+        self.assertEqual(sleeps, [HTTP_MAX_LOADING_WAIT])
+
+    @patch("services.llm_clients.get_http_session")
+    def test_rate_limited_429_waits_are_capped(self, mock_session):
+        """Test that a 429 is retried here with a capped wait instead of sleeping for any Retry-After"""
+        mock_session.return_value.post.side_effect = [
+            _response(429, headers={"Retry-After": "3600"}),
+            _response(200),
+        ]
+        sleeps = []
+        response = post_with_retries("https://example.test", sleep=sleeps.append)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sleeps, [HTTP_MAX_LOADING_WAIT])
+        retry = llm_clients._build_http_session().get_adapter("https://example.test").max_retries
+        self.assertNotIn(429, retry.status_forcelist)
+        self.assertFalse(retry.respect_retry_after_header)
+
+    @patch("services.llm_clients.get_http_session")
+    def test_separate_connect_and_read_timeouts(self, mock_session):
+        """Test that the default timeout is a (connect, read) pair"""
+        mock_session.return_value.post.return_value = _response(200)
+        post_with_retries("https://example.test")
+        timeout = mock_session.return_value.post.call_args.kwargs["timeout"]
+        self.assertEqual(len(timeout), 2)
+
+
+class TestLazyImports(unittest.TestCase):
+
+    def test_service_import_defers_heavy_sdks(self):
+        """Test that importing the services does not load the LLM SDKs or HTTP clients"""
+        code = ("import sys, services.evaluation_service, services.custom_checklist_service, services.prompt_service; "
+                "print(','.join(m for m in ('google.generativeai', 'requests', 'httpx', 'langchain_core') if m in sys.modules))")
+        result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+        self.assertEqual(result.stdout.strip(), "")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+"""Unit tests for model_router.py"""
+
+import unittest
+from unittest.mock import Mock, patch
+from services import evaluation_service
+from services.circuit_breaker import reset_circuit_breakers
+from services.custom_checklist_service import ChecklistService
+from services.model_router import ModelRouter, RoutingPolicy, configure_model_router, record_model_outcome
+from services.rate_limiter import reset_rate_limiters
+
+POLICY = RoutingPolicy(small_model="small-model", large_model="large-model", max_small_input_tokens=100,
+                       max_small_criteria=3, max_error_rate=0.3, latency_slo_seconds=5.0, min_samples=4)
+
+
+class TestModelRouter(unittest.TestCase):
+
+    def test_routes_by_input_size_and_criteria(self):
+        """Test that light requests use the small model and heavy ones the large model"""
+        router = ModelRouter(POLICY, enabled=True)
+        self.assertEqual(router.route("evaluation", "short text", 2).model, "small-model")
+        self.assertEqual(router.route("evaluation", "x" * 1000, 2).reason, "input_tokens")
+        decision = router.route("checklist", "short text", 5)
+        self.assertEqual((decision.model, decision.reason), ("large-model", "criteria"))
+        self.assertEqual(sum(entry["count"] for entry in router.stats()["decisions"]), 3)
+
+    def test_unhealthy_model_is_avoided_while_the_other_is_healthy(self):
+        """Test that recent errors or slow answers move traffic to the other model"""
+        router = ModelRouter(POLICY, enabled=True)
+        for _ in range(4):
+            router.record("small-model", 0.5, False)
+        self.assertEqual(router.route("generation", "hi").reason, "small_unhealthy")
+        for _ in range(4):
+            router.record("large-model", 9.0, True)
+        self.assertEqual(router.route("generation", "hi").model, "small-model")
+        self.assertEqual(router.stats()["models"]["small-model"]["error_rate"], 1.0)
+
+    def test_disabled_router_uses_the_callers_model(self):
+        """Test that routing can be switched off without changing call sites"""
+        router = ModelRouter(POLICY, enabled=False)
+        decision = router.route("checklist", "x" * 1000, 10, default_model="gemini-1.5-flash")
+        self.assertEqual((decision.model, decision.reason), ("gemini-1.5-flash", "disabled"))
+        self.assertEqual(router.label("gemini-1.5-flash"), "gemini-1.5-flash")
+        self.assertEqual(ModelRouter(POLICY, enabled=True).label("ignored"), "small-model|large-model")
+
+
+class TestRoutedCalls(unittest.TestCase):
+
+    def setUp(self):
+        reset_circuit_breakers()
+        reset_rate_limiters()
+        evaluation_service.clear_response_cache()
+        self.router = ModelRouter(POLICY, enabled=True)
+        configure_model_router(self.router)
+        self.addCleanup(configure_model_router, None)
+
+    def _model(self, text):
+        model = Mock()
+        model.generate_content.return_value = Mock(parts=[Mock(text=text)])
+        return model
+
+    def test_checklist_size_selects_the_model(self):
+        """Test that short checklists use the small model and long ones the large model"""
+        model = self._model('{"Custom Educator Checklist": ["No issues detected."]}')
+        with patch("services.custom_checklist_service.get_gemini_model", return_value=(True, model)) as mock_get:
+            service = ChecklistService()
+            service.evaluate_text_against_checklist("Worksheet", ["Be kind"])
+            service.evaluate_text_against_checklist("Worksheet", ["Rule one", "Rule two", "Rule three", "Rule four"])
+        self.assertEqual([call.args[0] for call in mock_get.call_args_list], ["small-model", "large-model"])
+        self.assertEqual(self.router.stats()["models"]["large-model"]["samples"], 1)
+
+    def test_evaluation_outcomes_feed_the_statistics(self):
+        """Test that failed evaluation calls count against the routed model"""
+        model = Mock()
+        model.generate_content.side_effect = RuntimeError("quota")
+        with patch("services.evaluation_service.get_gemini_model", return_value=(True, model)):
+            evaluation_service.evaluate_text("Worksheet text", ["Bias"])
+        self.assertEqual(self.router.stats()["models"]["small-model"]["error_rate"], 1.0)
+
+
+    def test_blocked_responses_are_not_held_against_the_model(self):
+        """Test that failures caused by the request itself stay out of the model's statistics"""
+        record_model_outcome("small-model", 0.5, False, "No valid content found in Gemini API response.")
+        record_model_outcome("small-model", 0.5, False, "Error calling Gemini API: 503 Service Unavailable")
+        self.assertEqual(self.router.stats()["models"]["small-model"]["samples"], 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,131 @@
+"""Unit tests for prompt_builder.py"""
+
+import asyncio
+import unittest
+from unittest.mock import Mock, patch
+from services import custom_checklist_service, evaluation_service
+from services.circuit_breaker import reset_circuit_breakers
+from services.custom_checklist_service import ChecklistService, compile_checklist
+from services.model_router import configure_model_router
+from services.prompt_builder import compact_guidelines, compact_prompt, estimate_tokens, split_by_budget
+from services.rate_limiter import reset_rate_limiters
+
+
+class TestPromptBuilder(unittest.TestCase):
+
+    def test_compact_prompt_strips_indentation(self):
+        """Test that indentation and blank lines are not sent to the model"""
+        self.assertEqual(compact_prompt("First line.\n        Second line.  \n\n        - item\n        "),
+                         "First line.\nSecond line.\n- item")
+        self.assertNotIn("  ", compile_checklist(["Cite sources"]).system_prompt)
+
+    def test_near_duplicate_guidelines_are_dropped(self):
+        """Test that repeats differing in casing or punctuation are dropped while the first wording and order are kept"""
+        items = compact_guidelines(["Avoid gender stereotypes.", "", "Cite sources", "avoid gender stereotypes",
+                                    "Avoid gender-stereotypes!", "Cite sources."])
+        self.assertEqual(items, ("Avoid gender stereotypes.", "Cite sources"))
+
+    def test_negations_and_numbers_keep_guidelines_apart(self):
+        """Test that similar guidelines with a different meaning are both kept"""
+        self.assertEqual(len(compact_guidelines(["Use slang", "No slang"])), 2)
+        self.assertEqual(len(compact_guidelines(["Keep answers under 50 words", "Keep answers under 60 words"])), 2)
+
+    def test_only_near_exact_repeats_are_dropped(self):
+        """Test that guidelines differing in a framing word are both kept"""
+        self.assertEqual(compact_guidelines(["Describe the risks", "Define the risks", "Explain the risks"]),
+                         ("Describe the risks", "Define the risks", "Explain the risks"))
+
+    def test_non_latin_guidelines_are_kept_apart(self):
+        """Test that guidelines in other scripts are compared by their words instead of collapsing"""
+        items = compact_guidelines(["避免性别刻板印象", "引用来源", "引用来源。", "Избегай сленга", "Цитируй источники", "---", "***"])
+        self.assertEqual(items, ("避免性别刻板印象", "引用来源", "Избегай сленга", "Цитируй источники", "---", "***"))
+
+    def test_split_by_budget_keeps_order(self):
+        """Test that items are packed greedily into consecutive groups within the budget"""
+        items = ["a" * 16, "b" * 16, "c" * 16, "d" * 100]
+        groups = split_by_budget(items, budget_tokens=12)
+        self.assertEqual(groups, [("a" * 16, "b" * 16), ("c" * 16,), ("d" * 100,)])
+        self.assertEqual(estimate_tokens("abcd" * 10), 11)
+
+
+class TestSplitChecklistEvaluation(unittest.TestCase):
+
+    def setUp(self):
+        reset_circuit_breakers()
+        reset_rate_limiters()
+        evaluation_service.clear_response_cache()
+        configure_model_router(None)
+        patcher = patch.object(custom_checklist_service, "CHECKLIST_INPUT_TOKEN_BUDGET", 400)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.checklist = [f"Guideline {n}: " + "keep the worksheet respectful and accurate " * 3 for n in range(12)]
+
+    def _model(self, *texts):
+        model = Mock()
+        model.generate_content.side_effect = [Mock(parts=[Mock(text=text)]) for text in texts]
+
+        async def generate_async(*args, **kwargs):
+            return model.generate_content(*args, **kwargs)
+        model.generate_content_async = generate_async
+        return model
+
+    def _responses(self, parts):
+        responses = ['{"Custom Educator Checklist": ["No issues detected."]}'] * parts
+        responses[-1] = '{"Custom Educator Checklist": ["Violates Guideline 11."]}'
+        return responses
+
+    @patch("services.custom_checklist_service.save_result")
+    @patch("services.custom_checklist_service.load_result", return_value=None)
+    def test_oversized_checklist_is_evaluated_in_parts(self, mock_load, mock_save):
+        """Test that a long checklist is split into several calls whose findings are merged"""
+        service = ChecklistService()
+        parts = service._split_checklist(compile_checklist(self.checklist))
+        self.assertGreater(len(parts), 1)
+        self.assertEqual(sum(len(part) for part in parts), 12)
+
+        with patch("services.custom_checklist_service.get_gemini_model",
+                   return_value=(True, self._model(*self._responses(len(parts))))) as mock_get:
+            feedback = service.evaluate_text_against_checklist("Worksheet", self.checklist)
+        self.assertEqual(mock_get.call_count, len(parts))
+        self.assertEqual(feedback, {"Custom Educator Checklist": ["Violates Guideline 11."]})
+        mock_save.assert_called_once()
+
+    @patch("services.custom_checklist_service.save_result")
+    @patch("services.custom_checklist_service.load_result", return_value=None)
+    def test_async_split_evaluation_merges_parts(self, mock_load, mock_save):
+        """Test that the async path evaluates the parts concurrently and merges them the same way"""
+        service = ChecklistService()
+        parts = len(service._split_checklist(compile_checklist(self.checklist)))
+        with patch("services.custom_checklist_service.get_gemini_model",
+                   return_value=(True, self._model(*self._responses(parts)))) as mock_get:
+            feedback = asyncio.run(service.evaluate_text_against_checklist_async("Worksheet", self.checklist))
+        self.assertEqual(mock_get.call_count, parts)
+        self.assertEqual(feedback["Custom Educator Checklist"], ["Violates Guideline 11."])
+
+    def test_small_checklist_is_not_split(self):
+        """Test that a checklist within the budget is sent in one call"""
+        checklist = compile_checklist(["Be kind", "Cite sources"])
+        self.assertEqual(ChecklistService()._split_checklist(checklist), [checklist])
+
+
+    @patch("services.custom_checklist_service.save_result")
+    @patch("services.custom_checklist_service.load_result", return_value=None)
+    def test_long_text_is_chunked_instead_of_splitting_the_checklist(self, mock_load, mock_save):
+        """Test that a long text is evaluated in chunks against the whole checklist, each chunk sent once"""
+        checklist = ["Be kind", "Cite sources"]
+        text = "\n\n".join(f"Paragraph {n} about cells and their parts. " * 40 for n in range(6))
+        with patch.object(custom_checklist_service, "LONG_TEXT_THRESHOLD_TOKENS", 500), \
+                patch.object(custom_checklist_service, "LONG_TEXT_CHUNK_TOKENS", 450):
+            units = ChecklistService()._evaluation_units(text, compile_checklist(checklist))
+            self.assertEqual(len(units), 6)
+            self.assertTrue(all(part.items == ("Be kind", "Cite sources") for _, part in units))
+            responses = ['{"Custom Educator Checklist": ["No issues detected."]}'] * 5
+            responses.append('{"Custom Educator Checklist": ["Uncited claim."]}')
+            with patch("services.custom_checklist_service.get_gemini_model", return_value=(True, self._model(*responses))) as mock_get:
+                feedback = ChecklistService().evaluate_text_against_checklist(text, checklist)
+        self.assertEqual(mock_get.call_count, 6)
+        self.assertEqual(feedback, {"Custom Educator Checklist": ["Uncited claim."]})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -39,6 +39,11 @@ class TestPromptService(unittest.TestCase):
         feedback, score = analyze_prompt_quality("Hi", scenario_data)
         self.assertTrue(any("quite short" in f for f in feedback))
 
+    def test_short_prompt_counts_whitespace_words(self):
+        """Test that the short-prompt rule counts whitespace-separated words, not keyword tokens"""
+        feedback, _ = analyze_prompt_quality("Explain photosynthesis to 5th-graders", get_scenario("Explain Photosynthesis"))
+        self.assertTrue(any("quite short" in f for f in feedback))
+
     def test_analyze_prompt_quality_long_prompt(self):
         """Test analyzing longer prompt"""
         scenario_data = {"keywords_for_good_prompt": ["explain"]}
@@ -58,6 +63,13 @@ class TestPromptService(unittest.TestCase):
             self.assertIn("keywords_for_good_prompt", scenario)
             self.assertIn("simulated_responses", scenario)
 
+    def test_prompt_template_built_on_first_use(self):
+        """Test that the lazy prompt template formats like a PromptTemplate"""
+        template = SCENARIOS["Explain Photosynthesis"]["ideal_prompt_template"]
+        self.assertEqual(sorted(template.input_variables), ["age_group", "analogy_type", "brevity_level"])
+        text = template.format(age_group="5th grader", analogy_type="analogy", brevity_level="short")
+        self.assertIn("5th grader", text)
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,146 @@
+"""Unit tests for rate_limiter.py"""
+
+import asyncio
+import threading
+import time
+import unittest
+from unittest.mock import Mock
+from tests.fakes import FakeClock
+from services.rate_limiter import (
+    PRIORITY_BATCH, PRIORITY_EVALUATION, PRIORITY_GENERATION, FairRateLimiter, call_provider,
+    get_rate_limiter, reset_rate_limiters, session_scope, track_queue_wait,
+)
+from services.circuit_breaker import get_circuit_breaker, reset_circuit_breakers
+
+
+class TestFairRateLimiter(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def _queue(self, limiter, requests, granted=None):
+        """Enqueues (session, priority) tickets and returns their labels in the order they are granted."""
+        granted = [] if granted is None else granted
+        for session_id, priority in requests:
+            limiter._enqueue(session_id, priority, lambda label=(session_id, priority): granted.append(label))
+        while limiter._queued:
+            limiter._clock.now += 1.0 / limiter.rate
+            limiter._dispatch()
+        return granted
+
+    def test_burst_then_rate(self):
+        """Test that the burst is served at once and later calls wait for tokens"""
+        limiter = FairRateLimiter("test", rate_per_second=2, burst=2, clock=self.clock)
+        self.assertEqual(limiter.acquire("a", timeout=0), (True, 0.0))
+        self.assertEqual(limiter.acquire("a", timeout=0), (True, 0.0))
+        granted, _ = limiter.acquire("a", timeout=0)
+        self.assertFalse(granted)
+        self.assertEqual(limiter.snapshot()["timed_out_calls"], 1)
+        self.clock.now = 0.5
+        self.assertTrue(limiter.acquire("a", timeout=0)[0])
+
+    def test_configure_changes_rate_and_burst(self):
+        """Test that a reconfigured limiter refills at the new rate and caps tokens at the new burst"""
+        limiter = FairRateLimiter("test", rate_per_second=2, burst=4, clock=self.clock)
+        limiter.configure(0.5, burst=1)
+        self.assertEqual(limiter.acquire("a", timeout=0), (True, 0.0))
+        self.assertFalse(limiter.acquire("a", timeout=0)[0])
+        self.clock.now = 2
+        self.assertTrue(limiter.acquire("a", timeout=0)[0])
+        limiter.configure(0)
+        self.assertEqual(limiter.acquire("a", timeout=0), (True, 0.0))
+
+    def test_disabling_the_rate_releases_queued_callers(self):
+        """Test that setting the rate to 0 while callers are queued grants them instead of dividing by zero"""
+        limiter = FairRateLimiter("test", rate_per_second=1, burst=1, clock=self.clock)
+        limiter._tokens = 0
+        granted = []
+        for session_id in ("a", "b"):
+            limiter._enqueue(session_id, PRIORITY_GENERATION, lambda session_id=session_id: granted.append(session_id))
+        limiter.configure(0)
+        self.assertEqual(granted, ["a", "b"])
+        self.assertIsNone(limiter._dispatch())
+        self.assertEqual(limiter.acquire("c", timeout=0), (True, 0.0))
+
+    def test_round_robin_across_sessions(self):
+        """Test that a busy session cannot crowd out another session of the same priority"""
+        limiter = FairRateLimiter("test", rate_per_second=1, burst=1, aging_seconds=0, clock=self.clock)
+        limiter._tokens = 0
+        order = self._queue(limiter, [("busy", 1), ("busy", 1), ("busy", 1), ("quiet", 1)])
+        self.assertEqual(order, [("busy", 1), ("quiet", 1), ("busy", 1), ("busy", 1)])
+
+    def test_priority_with_aging(self):
+        """Test that higher priorities go first but long waiters are eventually served"""
+        limiter = FairRateLimiter("test", rate_per_second=1, burst=1, aging_seconds=0, clock=self.clock)
+        limiter._tokens = 0
+        order = self._queue(limiter, [("a", PRIORITY_BATCH), ("b", PRIORITY_GENERATION), ("c", PRIORITY_EVALUATION)])
+        self.assertEqual(order, [("b", PRIORITY_GENERATION), ("c", PRIORITY_EVALUATION), ("a", PRIORITY_BATCH)])
+
+        aged = FairRateLimiter("test", rate_per_second=1, burst=1, aging_seconds=1, clock=self.clock)
+        aged._tokens = 0
+        order = []
+        aged._enqueue("old", PRIORITY_BATCH, lambda: order.append("old"))
+        aged._clock.now += 5
+        self._queue(aged, [("new", PRIORITY_GENERATION)], order)
+        self.assertEqual(order[0], "old")
+
+    def test_threads_are_paced_at_the_rate(self):
+        """Test that concurrent callers are spread out instead of bursting"""
+        limiter = FairRateLimiter("test", rate_per_second=50, burst=1)
+        waits = []
+        threads = [threading.Thread(target=lambda i=i: waits.append(limiter.acquire(f"s{i % 3}", timeout=5))) for i in range(6)]
+        start = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertTrue(all(granted for granted, _ in waits))
+        self.assertGreaterEqual(time.monotonic() - start, 5 / 50 * 0.8)
+
+    def test_cancelled_async_waiter_leaves_queue(self):
+        """Test that a cancelled async waiter does not hold a place in the queue"""
+        limiter = FairRateLimiter("test", rate_per_second=0.01, burst=1)
+
+        async def scenario():
+            await limiter.acquire_async("a")
+            task = asyncio.ensure_future(limiter.acquire_async("b"))
+            await asyncio.sleep(0.01)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            return limiter.snapshot()["queued"]
+
+        self.assertEqual(asyncio.run(scenario()), 0)
+
+
+class TestCallProvider(unittest.TestCase):
+
+    def setUp(self):
+        reset_circuit_breakers()
+        reset_rate_limiters()
+
+    def test_queue_wait_is_reported(self):
+        """Test that callers can see how long they were queued"""
+        call = Mock(return_value=(True, "ok"))
+        with session_scope("student-1"), track_queue_wait() as queued:
+            self.assertEqual(call_provider("gemini", call, "prompt"), (True, "ok"))
+            call_provider("gemini", call, "prompt")
+        self.assertEqual(queued.calls, 2)
+        self.assertGreaterEqual(queued.seconds, 0.0)
+        self.assertGreaterEqual(get_rate_limiter("gemini").snapshot()["granted_calls"], 1)
+
+    def test_open_circuit_skips_the_queue(self):
+        """Test that a provider with an open circuit is rejected without using a token"""
+        breaker = get_circuit_breaker("gemini")
+        for _ in range(breaker.failure_threshold):
+            breaker.record_failure("down")
+        tokens = get_rate_limiter("gemini").snapshot()["tokens"]
+        call = Mock()
+        is_successful, _ = call_provider("gemini", call)
+        self.assertFalse(is_successful)
+        call.assert_not_called()
+        self.assertEqual(get_rate_limiter("gemini").snapshot()["tokens"], tokens)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+"""Unit tests for response_cache.py"""
+
+import unittest
+from unittest.mock import patch
+from tests.fakes import FakeClock
+from services.response_cache import ResponseCache
+from services import evaluation_service
+from services.circuit_breaker import reset_circuit_breakers
+from services.rate_limiter import reset_rate_limiters
+
+
+class TestResponseCache(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def test_hit_and_miss_counters(self):
+        """Test that lookups update hit and miss counters"""
+        cache = ResponseCache(maxsize=2)
+        self.assertIsNone(cache.get("a"))
+        cache.put("a", "value")
+        self.assertEqual(cache.get("a"), "value")
+        stats = cache.stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+
+    def test_lru_eviction(self):
+        """Test that the least recently used entry is evicted first"""
+        cache = ResponseCache(maxsize=2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")
+        cache.put("c", 3)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_ttl_expiry(self):
+        """Test that entries expire after the TTL"""
+        cache = ResponseCache(maxsize=2, ttl_seconds=10, clock=self.clock)
+        cache.put("a", 1)
+        self.clock.now = 11
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.stats()["expirations"], 1)
+
+
+class TestGenerationCache(unittest.TestCase):
+
+    def setUp(self):
+        evaluation_service.clear_response_cache()
+        reset_circuit_breakers()
+        reset_rate_limiters()
+
+    def tearDown(self):
+        evaluation_service.clear_response_cache()
+
+    @patch("services.evaluation_service._call_llm_safely", return_value=(True, "Plants make food."))
+    def test_repeat_prompt_served_from_cache(self, mock_llm):
+        """Test that normalized repeat prompts call the LLM only once"""
+        first = evaluation_service.generate_safe_text("Photosynthesis")
+        second = evaluation_service.generate_safe_free_text("  photosynthesis ")
+        self.assertEqual(first, (True, "Plants make food."))
+        self.assertEqual(second, (True, "Plants make food."))
+        self.assertEqual(mock_llm.call_count, 1)
+
+    @patch("services.evaluation_service._call_llm_safely", return_value=(False, "down"))
+    def test_failures_not_cached(self, mock_llm):
+        """Test that failed LLM calls are retried on the next request"""
+        evaluation_service.generate_safe_text("gravity")
+        evaluation_service.generate_safe_text("gravity")
+        self.assertEqual(mock_llm.call_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
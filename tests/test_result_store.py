@@ -0,0 +1,109 @@
+"""Unit tests for result_store.py"""
+
+import multiprocessing
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from tests.fakes import FakeClock
+from services import evaluation_service
+from services.circuit_breaker import reset_circuit_breakers
+from services.rate_limiter import reset_rate_limiters
+from services.result_store import ResultStore, configure_result_store, content_hash
+
+
+def _write_rows(path, worker, rows):
+    store = ResultStore(path)
+    for index in range(rows):
+        store.put(f"{worker}-{index}", {"row": index}, "evaluation", "model", f"text {worker} {index}", ["Bias"])
+
+
+class TestResultStore(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.path = os.path.join(self.tmpdir.name, "nested", "results.sqlite3")
+
+    def test_round_trip_and_age_limit(self):
+        """Test that results are served until they are older than max_age_seconds"""
+        store = ResultStore(self.path, max_age_seconds=60, clock=self.clock)
+        self.assertIsNone(store.get("k"))
+        store.put("k", {"Bias": ["No issues detected."]}, "evaluation", "model", "text", ["Bias"])
+        self.assertEqual(store.get("k"), {"Bias": ["No issues detected."]})
+        self.clock.now += 61
+        self.assertIsNone(store.get("k"))
+        self.assertEqual(store.evict(), 1)
+        self.assertEqual(store.stats()["size"], 0)
+
+    def test_size_limit_evicts_least_recently_used(self):
+        """Test that eviction keeps the most recently used max_rows results"""
+        store = ResultStore(self.path, max_rows=2, clock=self.clock)
+        for key in ("a", "b", "c"):
+            self.clock.now += 1
+            store.put(key, {"key": key}, "evaluation", "model", key, [])
+        self.clock.now += 1
+        store.get("a")
+        self.assertEqual(store.evict(), 1)
+        self.assertIsNone(store.get("b"))
+        self.assertEqual(store.get("a"), {"key": "a"})
+
+    def test_history_is_queryable_by_text_without_storing_it(self):
+        """Test that the audit trail finds results by text while only keeping its hash"""
+        store = ResultStore(self.path)
+        store.put("k1", {"Bias": ["x"]}, "evaluation", "model", "worksheet one", ["Bias"])
+        store.put("k2", {"Bias": ["y"]}, "checklist", "model", "worksheet two", ["Be kind"])
+        history = store.history(text="worksheet one")
+        self.assertEqual(len(history), 1)
+        self.assertEqual(history[0]["text_hash"], content_hash("worksheet one"))
+        self.assertEqual(history[0]["criteria"], ["Bias"])
+        self.assertEqual([row["kind"] for row in store.history(kind="checklist")], ["checklist"])
+        directory = os.path.dirname(self.path)
+        for name in os.listdir(directory):
+            with open(os.path.join(directory, name), "rb") as f:
+                self.assertNotIn(b"worksheet one", f.read())
+
+    def test_concurrent_writers_in_separate_processes(self):
+        """Test that several processes can write to the same database at once"""
+        ResultStore(self.path)
+        context = multiprocessing.get_context("spawn")
+        workers = [context.Process(target=_write_rows, args=(self.path, worker, 25)) for worker in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join(timeout=30)
+            self.assertEqual(worker.exitcode, 0)
+        self.assertEqual(ResultStore(self.path).stats()["size"], 100)
+
+
+class TestStoredEvaluations(unittest.TestCase):
+
+    def setUp(self):
+        reset_circuit_breakers()
+        reset_rate_limiters()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        configure_result_store(ResultStore(os.path.join(self.tmpdir.name, "results.sqlite3")))
+        self.addCleanup(configure_result_store, None)
+
+    @patch("services.evaluation_service._call_gemini_for_evaluation", return_value=(True, '{"Bias": ["No issues detected."]}'))
+    def test_repeat_evaluation_is_served_from_the_store(self, mock_eval):
+        """Test that re-checking the same text and principles does not call the LLM again"""
+        first = evaluation_service.evaluate_text("Worksheet text", ["Bias"])
+        second = evaluation_service.evaluate_text("Worksheet text", ["Bias"], custom_checklist=["Worksheet"])
+        self.assertEqual(mock_eval.call_count, 1)
+        self.assertEqual(second["Bias"], first["Bias"])
+        self.assertIn("Custom Educator Checklist", second)
+        self.assertNotIn("Custom Educator Checklist", evaluation_service.evaluate_text("Worksheet text", ["Bias"]))
+
+    @patch("services.evaluation_service._call_gemini_for_evaluation", return_value=(True, '{"Bias": ["cut off'))
+    def test_truncated_evaluation_is_not_stored(self, mock_eval):
+        """Test that incomplete results are retried rather than stored"""
+        evaluation_service.evaluate_text("Worksheet text", ["Bias", "Misinformation"])
+        evaluation_service.evaluate_text("Worksheet text", ["Bias", "Misinformation"])
+        self.assertEqual(mock_eval.call_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+"""Unit tests for scenario_registry.py"""
+
+import json
+import os
+import tempfile
+import unittest
+from services.scenario_registry import KeywordIndex, ScenarioRegistry, tokenize
+
+
+def _scenario(title, **overrides):
+    data = {
+        "title": title,
+        "description": f"Describe {title}.",
+        "keywords_for_good_prompt": ["simple"],
+        "ideal_prompt_template": "Explain {topic}.",
+        "simulated_responses": {"basic": "Basic."},
+    }
+    data.update(overrides)
+    return data
+
+
+class TestKeywordIndex(unittest.TestCase):
+
+    def test_phrases_match_consecutive_word_prefixes(self):
+        """Test that phrase keywords match consecutive words and word prefixes"""
+        index = KeywordIndex(["5th grade", "example", "arguments for", "simple"])
+        tokens = tokenize("Give examples for a 5th-grader; list arguments against")
+        self.assertEqual(index.matched_keywords(tokens), ["5th grade", "example"])
+
+    def test_no_match_inside_words(self):
+        """Test that a keyword does not match in the middle of a word"""
+        index = KeywordIndex(["explain"])
+        self.assertEqual(index.matched_keywords(tokenize("This is unexplained")), [])
+        self.assertEqual(index.matched_keywords(tokenize("Explaining it")), ["explain"])
+
+    def test_non_latin_keywords_match(self):
+        """Test that keywords and prompts in other scripts are tokenized into their words"""
+        index = KeywordIndex(["простыми словами", "例子", "ÉLÈVES"])
+        self.assertEqual(tokenize("Объясни простыми словами, élèves!"), ["объясни", "простыми", "словами", "élèves"])
+        self.assertEqual(index.matched_keywords(tokenize("Объясни ПРОСТЫМИ словами для élèves, 例子")),
+                         ["простыми словами", "例子", "ÉLÈVES"])
+
+
+class TestScenarioRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def _write(self, name, content):
+        with open(os.path.join(self.tmpdir.name, name), "w", encoding="utf-8") as f:
+            f.write(content if isinstance(content, str) else json.dumps(content))
+
+    def test_loads_files_in_name_order_and_skips_bad_ones(self):
+        """Test that scenarios load lazily in file order and malformed files are skipped"""
+        self._write("02_b.json", [_scenario("Second"), _scenario("Third")])
+        self._write("01_a.json", _scenario("First"))
+        self._write("03_broken.json", "{not json")
+        self._write("04_missing.json", {"title": "No description"})
+        self._write("05_duplicate.json", _scenario("First", description="Shadowed"))
+        registry = ScenarioRegistry(self.tmpdir.name)
+        with self.assertLogs("services.scenario_registry", level="WARNING"):
+            titles = list(registry)
+        self.assertEqual(titles, ["First", "Second", "Third"])
+        self.assertEqual(registry["First"]["description"], "Describe First.")
+        self.assertEqual(registry["First"]["ideal_prompt_template"].template, "Explain {topic}.")
+        self.assertIsNone(registry.get("No description"))
+
+    def test_reload_picks_up_new_files(self):
+        """Test that reload re-reads the directory"""
+        registry = ScenarioRegistry(self.tmpdir.name)
+        self.assertEqual(len(registry), 0)
+        self._write("01.json", _scenario("Added"))
+        self.assertEqual(len(registry), 0)
+        registry.reload()
+        self.assertIn("Added", registry)
+
+
+if __name__ == "__main__":
+    unittest.main()
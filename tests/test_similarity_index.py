@@ -0,0 +1,101 @@
+"""Unit tests for similarity_index.py"""
+
+import unittest
+from unittest.mock import patch
+from tests.fakes import FakeClock
+from services import evaluation_service
+from services.circuit_breaker import reset_circuit_breakers
+from services.rate_limiter import reset_rate_limiters
+from services.similarity_index import SimilarityIndex, canonicalize
+
+
+class TestSimilarityIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def test_reworded_prompts_match(self):
+        """Test that casing, punctuation and framing words do not prevent a match"""
+        index = SimilarityIndex()
+        index.put("explain photosynthesis", "answer")
+        for prompt in ("Explain photosynthesis please!", "what is photosynthesis", "What's photosynthesis?"):
+            self.assertEqual(index.get(prompt), "answer", prompt)
+        self.assertEqual(canonicalize("Could you explain the Water-Cycle?"), "water cycle")
+
+    def test_different_topics_and_numbers_do_not_match(self):
+        """Test that unrelated prompts and prompts differing only in a number miss"""
+        index = SimilarityIndex()
+        index.put("explain photosynthesis", "photosynthesis answer")
+        index.put("causes of world war 1", "ww1 answer")
+        self.assertIsNone(index.get("explain gravity"))
+        self.assertIsNone(index.get("causes of world war 2"))
+        self.assertEqual(index.stats()["misses"], 2)
+
+    def test_non_ascii_prompts_do_not_collide(self):
+        """Test that prompts in other scripts keep their words and only match their own rewording"""
+        index = SimilarityIndex()
+        index.put("Объясни фотосинтез", "photosynthesis answer")
+        index.put("解释光合作用", "chinese answer")
+        self.assertIsNone(index.get("Объясни гравитацию"))
+        self.assertIsNone(index.get("解释万有引力"))
+        self.assertEqual(index.get("объясни фотосинтез!"), "photosynthesis answer")
+        self.assertEqual(index.get("解释光合作用？"), "chinese answer")
+        self.assertEqual(canonicalize("Straße, ÉTÉ"), "strasse été")
+
+    def test_texts_without_words_are_neither_stored_nor_matched(self):
+        """Test that punctuation-only text cannot answer, or be answered by, another such text"""
+        index = SimilarityIndex()
+        index.put("???", "question marks")
+        self.assertEqual(len(index), 0)
+        self.assertIsNone(index.get("!!!"))
+        self.assertEqual(index.stats()["misses"], 1)
+
+    def test_scope_separates_entries(self):
+        """Test that entries stored under one scope never answer another"""
+        index = SimilarityIndex()
+        index.put("gravity", "flash answer", scope="flash")
+        self.assertIsNone(index.get("gravity", scope="pro"))
+        self.assertEqual(index.get("gravity", scope="flash"), "flash answer")
+
+    def test_lru_eviction_and_ttl(self):
+        """Test that the size bound evicts the least recently used entry and entries expire"""
+        index = SimilarityIndex(maxsize=2, ttl_seconds=10, clock=self.clock)
+        index.put("photosynthesis", "p")
+        index.put("gravity", "g")
+        index.get("photosynthesis")
+        index.put("volcanoes", "v")
+        self.assertIsNone(index.get("gravity"))
+        self.assertEqual(index.stats()["evictions"], 1)
+        self.clock.now = 11
+        self.assertIsNone(index.get("photosynthesis"))
+        self.assertEqual(index.stats()["expirations"], 1)
+        self.assertEqual(len(index), 1)
+
+
+class TestNearDuplicateGeneration(unittest.TestCase):
+
+    def setUp(self):
+        reset_circuit_breakers()
+        reset_rate_limiters()
+        evaluation_service.clear_response_cache()
+
+    @patch("services.evaluation_service._call_gemini_api", return_value=(True, "Plants make food from light."))
+    def test_reworded_prompt_reuses_response(self, mock_gemini):
+        """Test that a reworded repeat prompt is answered without another API call"""
+        evaluation_service.generate_safe_text("explain photosynthesis")
+        result = evaluation_service.generate_safe_text("What is photosynthesis, please?")
+        self.assertEqual(result, (True, "Plants make food from light."))
+        self.assertEqual(mock_gemini.call_count, 1)
+        self.assertEqual(evaluation_service.get_similarity_cache_stats()["hits"], 1)
+
+    @patch("services.evaluation_service._call_gemini_api", return_value=(True, "Answer"))
+    def test_disabled_similarity_cache_calls_provider(self, mock_gemini):
+        """Test that turning the index off leaves only exact-key reuse"""
+        with patch.object(evaluation_service, "SIMILARITY_CACHE_ENABLED", False):
+            evaluation_service.generate_safe_text("explain photosynthesis")
+            evaluation_service.generate_safe_text("what is photosynthesis")
+        self.assertEqual(mock_gemini.call_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
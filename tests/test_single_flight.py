@@ -0,0 +1,124 @@
+"""Unit tests for single_flight.py"""
+
+import asyncio
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+from services import evaluation_service
+from services.circuit_breaker import reset_circuit_breakers
+from services.rate_limiter import reset_rate_limiters
+from services.single_flight import SingleFlight, SingleFlightStreams
+
+
+class TestSingleFlight(unittest.TestCase):
+
+    def _run_concurrently(self, flight, fn, callers=5):
+        """Starts callers that all join the same key while the first call is still running."""
+        with ThreadPoolExecutor(max_workers=callers) as pool:
+            futures = [pool.submit(flight.do, "key", fn) for _ in range(callers)]
+            return [f.exception() or f.result() for f in futures]
+
+    def test_concurrent_callers_share_one_call(self):
+        """Test that identical in-flight calls run once and every caller gets the result"""
+        flight = SingleFlight("test")
+        calls = []
+
+        def slow():
+            calls.append(1)
+            time.sleep(0.2)
+            return "answer"
+
+        results = self._run_concurrently(flight, slow)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(results), [("answer", False)] + [("answer", True)] * 4)
+        self.assertEqual(flight.stats(), {"in_flight": 0, "leaders": 1, "coalesced": 4})
+
+    def test_exception_is_shared_and_not_remembered(self):
+        """Test that a failure reaches every waiting caller and the next call starts afresh"""
+        flight = SingleFlight("test")
+
+        def failing():
+            time.sleep(0.2)
+            raise ConnectionError("down")
+
+        results = self._run_concurrently(flight, failing, callers=3)
+        self.assertTrue(all(isinstance(r, ConnectionError) for r in results))
+        self.assertEqual(flight.do("key", lambda: "recovered"), ("recovered", False))
+
+    def test_async_callers_share_one_task(self):
+        """Test that async callers coalesce and a cancelled caller does not cancel the shared call"""
+        flight = SingleFlight("test")
+        calls = []
+
+        async def slow():
+            calls.append(1)
+            await asyncio.sleep(0.1)
+            return "answer"
+
+        async def main():
+            impatient = asyncio.ensure_future(flight.do_async("key", slow))
+            await asyncio.sleep(0)
+            impatient.cancel()
+            return await asyncio.gather(flight.do_async("key", slow), flight.do_async("key", slow))
+
+        results = asyncio.run(main())
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [("answer", True), ("answer", True)])
+
+    def test_stream_followers_replay_published_chunks(self):
+        """Test that a late subscriber sees the chunks published before it joined"""
+        streams = SingleFlightStreams()
+        broadcast, is_leader = streams.join("key")
+        broadcast.publish("Hello ")
+        follower, follower_is_leader = streams.join("key")
+        self.assertTrue(is_leader)
+        self.assertFalse(follower_is_leader)
+        self.assertIs(follower, broadcast)
+
+        received = []
+        reader = threading.Thread(target=lambda: received.extend(follower.subscribe()))
+        reader.start()
+        broadcast.publish("world")
+        streams.finish("key", broadcast, completed=True)
+        reader.join(timeout=1)
+        self.assertEqual(received, ["Hello ", "world"])
+        self.assertTrue(follower.completed)
+        self.assertEqual(streams.join("key")[1], True)
+
+
+class TestServiceCoalescing(unittest.TestCase):
+
+    def setUp(self):
+        reset_circuit_breakers()
+        reset_rate_limiters()
+        evaluation_service.clear_response_cache()
+
+    def test_identical_generation_requests_call_the_provider_once(self):
+        """Test that a burst of identical prompts makes a single Gemini call"""
+        def slow_gemini(prompt):
+            time.sleep(0.2)
+            return (True, "Shared explanation")
+
+        with patch("services.evaluation_service._call_gemini_api", side_effect=slow_gemini) as mock_gemini:
+            with ThreadPoolExecutor(max_workers=4) as pool:
+                results = list(pool.map(lambda _: evaluation_service.generate_safe_text("Explain gravity"), range(4)))
+        self.assertEqual(mock_gemini.call_count, 1)
+        self.assertEqual(results, [(True, "Shared explanation")] * 4)
+
+    def test_identical_evaluations_call_the_provider_once(self):
+        """Test that concurrent evaluations of the same text share one call"""
+        def slow_evaluation(text, principles):
+            time.sleep(0.2)
+            return (True, '{"Clarity": {"score": 4, "feedback": "Clear."}}')
+
+        with patch("services.evaluation_service._call_gemini_for_evaluation", side_effect=slow_evaluation) as mock_eval:
+            with ThreadPoolExecutor(max_workers=3) as pool:
+                results = list(pool.map(lambda _: evaluation_service.evaluate_text("Same text", ["Clarity"]), range(3)))
+        self.assertEqual(mock_eval.call_count, 1)
+        self.assertEqual(results[0], results[2])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,44 @@
+"""Unit tests for the benchmark stub LLM server"""
+
+import json
+import unittest
+import requests
+from benchmarks.stub_llm_server import STUB_TEXT, StubConfig, start_stub_server
+
+
+class TestStubLLMServer(unittest.TestCase):
+
+    def _start(self, **overrides):
+        config = StubConfig(latency_ms=0, jitter_ms=0, distribution="fixed", **overrides)
+        server, base_url = start_stub_server(config)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return base_url
+
+    def _generate(self, base_url, prompt):
+        body = {"contents": [{"role": "user", "parts": [{"text": prompt}]}]}
+        return requests.post(f"{base_url}/v1beta/models/gemini-1.5-flash-8b:generateContent", json=body, timeout=5)
+
+    def test_generation_returns_gemini_candidates(self):
+        response = self._generate(self._start(), "Explain photosynthesis")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["candidates"][0]["content"]["parts"][0]["text"], STUB_TEXT)
+
+    def test_evaluation_prompt_returns_json_per_principle(self):
+        prompt = "The principles to check are: Bias, Misinformation.\nText to evaluate: hello"
+        text = self._generate(self._start(), prompt).json()["candidates"][0]["content"]["parts"][0]["text"]
+        self.assertEqual(json.loads(text), {"Bias": ["No issues detected."], "Misinformation": ["No issues detected."]})
+
+    def test_error_and_loading_rates(self):
+        self.assertEqual(self._generate(self._start(error_rate=1.0), "hi").status_code, 500)
+        response = requests.post(f"{self._start(loading_rate=1.0)}/models/mistralai/x", json={"inputs": "hi"}, timeout=5)
+        self.assertEqual(response.status_code, 503)
+        self.assertIn("estimated_time", response.json())
+
+    def test_huggingface_generation_echoes_prompt(self):
+        response = requests.post(f"{self._start()}/models/mistralai/x", json={"inputs": "hi "}, timeout=5)
+        self.assertEqual(response.json(), [{"generated_text": "hi " + STUB_TEXT}])
+
+
+if __name__ == "__main__":
+    unittest.main()